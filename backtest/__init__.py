@@ -0,0 +1,6 @@
+from .walk_forward import run_backtest, baseline_prices, settle_bets, summarise
+
+__all__ = ['run_backtest',
+           'baseline_prices',
+           'settle_bets',
+           'summarise']
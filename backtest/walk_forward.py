@@ -0,0 +1,355 @@
+"""
+Walk-forward backtest of the ratings and the bet selection of calc_server. The game history is cut into blocks of
+refit_days; at the start of each block ModelA is refitted on the games before it, and the block is then walked
+through in steps of step_days, pricing every game of a step with the ratings as of the start of the step before
+applying its results with the OnlineRatingUpdater. The games of every step are priced and selected against in a
+single vectorised pass at the end, and the blocks are independent so they can be walked in parallel
+
+The bets are selected against recorded exchange prices. Without them the prices come from a baseline model
+independent of ModelA (see baseline_prices), and the P&L is only a check of the ratings against that baseline
+"""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from calc_server.bet_calculator import return_bet_sizes
+from calc_server.bet_selector import select_actions
+from calc_server.probability_calcs import calc_game_win_prob
+from model import tuning
+from model.evaluation import played_best_of
+from model.online import OnlineRatingUpdater
+
+# The columns of the prices the selector is run against
+PRICE_COLUMNS = ['p1_LIVE_best_BACK', 'p1_LIVE_best_LAY', 'p2_LIVE_best_BACK', 'p2_LIVE_best_LAY']
+
+# The columns of the closing prices, used for the closing line value when they are recorded
+CLOSE_COLUMNS = ['p1_CLOSE', 'p2_CLOSE']
+
+DEFAULT_CONFIG = {'decay_factor': 1 / 725,
+                  'l2_prior': 0.0,
+                  'game_date_filter': '2008-01-01',
+                  'minimum_games_filter': 25}
+
+
+def date_blocks(first_day, last_day, refit_days):
+    """
+    Cuts the days from first_day up to last_day into consecutive blocks of refit_days
+
+    Returns
+    -------
+    blocks : list of tuple of int
+        The (start, end) day of each block, with the end day not included in the block
+    """
+    return [(start, min(start + refit_days, last_day)) for start in range(first_day, last_day, refit_days)]
+
+
+def walk_block(games, block_start, block_end, step_days, config, fit_kwargs, rating_variance=0.05,
+               daily_drift=1e-4):
+    """
+    Walks through the games of a block. ModelA is fitted on the games before the block, then for each step the
+    ratings of the players of every game in the step are recorded before the results of the step are applied
+
+    Parameters
+    ----------
+    games : dict of str:np.Array
+        The game arrays of model.tuning, in date order
+    block_start : int
+        The first day of the block, as days since 1970-01-01
+    block_end : int
+        The day after the last day of the block
+    step_days : int
+        The number of days in each step
+    config : dict
+        The configuration of the fit, with 'decay_factor', 'l2_prior', 'game_date_filter' and
+        'minimum_games_filter' keys
+    fit_kwargs : dict
+        Passed on to ModelA.fit_model
+    rating_variance : float
+        Passed on to the OnlineRatingUpdater
+    daily_drift : float
+        Passed on to the OnlineRatingUpdater
+
+    Returns
+    -------
+    positions : np.Array
+        The position in the game arrays of each game in the block
+    pre_game_ratings : np.Array
+        Array of shape (len(positions), 5), the rating and rating variance of player one and player two before each
+        game, NaN for players without a rating, and the covariance of the two ratings in the fit, NaN for pairs with
+        a player outside the fit
+    """
+    from model.modelA import ModelA
+
+    player_df, game_df = tuning.training_set(games, block_start, config)
+    snooker_model = ModelA(game_df, player_df, decay_factor=config['decay_factor'], l2_prior=config['l2_prior'],
+                           as_of=pd.to_datetime(block_start, unit='D'))
+    snooker_model.ratings_path = None
+    snooker_model.fit_model(callback=lambda *args: False, **fit_kwargs)
+
+    updater = OnlineRatingUpdater(snooker_model.optimised_ratings, last_game_id=-1, rating_variance=rating_variance,
+                                  daily_drift=daily_drift)
+
+    positions = np.flatnonzero((games['day'] >= block_start) & (games['day'] < block_end))
+    step = (games['day'][positions] - block_start) // step_days
+    step_bounds = np.flatnonzero(np.diff(step)) + 1
+
+    pre_game_ratings = np.full((len(positions), 5), np.nan)
+    pre_game_ratings[:, 4] = snooker_model.rating_pair_covariance(games['player_one_id'][positions].tolist(),
+                                                                  games['player_two_id'][positions].tolist())
+    for step_positions in np.split(np.arange(len(positions)), step_bounds):
+        if len(step_positions) == 0:
+            continue
+        game_positions = positions[step_positions]
+        p1_ids = games['player_one_id'][game_positions].tolist()
+        p2_ids = games['player_two_id'][game_positions].tolist()
+
+        pre_game_ratings[step_positions, :4] = [(updater.ratings.get(p1_id, np.nan),
+                                                 updater.variances.get(p1_id, np.nan),
+                                                 updater.ratings.get(p2_id, np.nan),
+                                                 updater.variances.get(p2_id, np.nan))
+                                                for p1_id, p2_id in zip(p1_ids, p2_ids)]
+
+        for p1_id, p2_id, p1_frames, p2_frames, day in zip(p1_ids, p2_ids,
+                                                           games['player_one_frames'][game_positions].tolist(),
+                                                           games['player_two_frames'][game_positions].tolist(),
+                                                           games['day'][game_positions].tolist()):
+            updater.update_game(p1_id, p2_id, p1_frames, p2_frames, pd.to_datetime(day, unit='D'))
+
+    return positions, pre_game_ratings
+
+
+def walk_shared_block(*args, **kwargs):
+    """
+    walk_block on the game arrays shared with a worker process by model.tuning.load_shared_games
+    """
+    return walk_block(tuning.SHARED_GAMES, *args, **kwargs)
+
+
+def baseline_prices(played_df, priced_df, spread=0.02, prior_frames=20):
+    """
+    Generates exchange prices for games without recorded prices from a baseline model which shares nothing with
+    ModelA, so the P&L against them is the edge of the ratings over the baseline rather than over noise added to
+    the ratings' own prices. Each player's strength is the share of frames they won in every game before the day of
+    the game, shrunk towards a half by prior_frames frames, and the two shares are combined into a frame win
+    probability with the log5 formula, a (1 - b) / (a (1 - b) + b (1 - a)). The best back and lay prices sit spread
+    apart around the baseline's GW prob. No closing prices are generated
+
+    Parameters
+    ----------
+    played_df : pandas.DataFrame
+        Every played game, indexed by game ID with the date, player IDs and frames, the history of the baseline
+    priced_df : pandas.DataFrame
+        The priced games, indexed by game ID with a 'best_of' column
+    spread : float
+        The difference between the implied probabilities of the best lay and best back prices
+    prior_frames : float
+        The number of frames, half of them won, added to every player's record
+
+    Returns
+    -------
+    price_df : pandas.DataFrame
+        The PRICE_COLUMNS of each game, with the index of priced_df
+    """
+    n_games = len(played_df)
+    day = (pd.to_datetime(played_df['date']) - pd.Timestamp(0)).dt.days.to_numpy()
+    p1_frames = played_df['player_one_frames'].to_numpy(dtype=np.float64)
+    p2_frames = played_df['player_two_frames'].to_numpy(dtype=np.float64)
+
+    # one row per player per game, and the frames each player won and played before each day
+    player_game_df = pd.DataFrame({'player_id': np.concatenate([played_df['player_one_id'], played_df['player_two_id']]),
+                                   'day': np.tile(day, 2),
+                                   'won': np.concatenate([p1_frames, p2_frames]),
+                                   'played': np.tile(p1_frames + p2_frames, 2)})
+    daily_df = player_game_df.groupby(['player_id', 'day'])[['won', 'played']].sum()
+    before_df = daily_df.groupby(level='player_id').cumsum() - daily_df
+    before_df = before_df.reindex(pd.MultiIndex.from_frame(player_game_df[['player_id', 'day']]))
+
+    frame_share = (before_df['won'].to_numpy() + prior_frames / 2) / (before_df['played'].to_numpy() + prior_frames)
+    frame_share = pd.DataFrame({'p1': frame_share[:n_games], 'p2': frame_share[n_games:]},
+                               index=played_df.index).reindex(priced_df.index)
+
+    p1_share, p2_share = frame_share['p1'].to_numpy(), frame_share['p2'].to_numpy()
+    p1_frame_win_prob = p1_share * (1 - p2_share) / (p1_share * (1 - p2_share) + p2_share * (1 - p1_share))
+    market_prob = calc_game_win_prob(p1_frame_win_prob, priced_df['best_of'].to_numpy())
+
+    def to_odds(prob):
+        return 1. / np.clip(prob, 1e-3, 1 / 1.01)
+
+    return pd.DataFrame({'p1_LIVE_best_BACK': to_odds(market_prob + spread / 2),
+                         'p1_LIVE_best_LAY': to_odds(market_prob - spread / 2),
+                         'p2_LIVE_best_BACK': to_odds(1 - market_prob + spread / 2),
+                         'p2_LIVE_best_LAY': to_odds(1 - market_prob - spread / 2)}, index=priced_df.index)
+
+
+def settle_bets(bet_df, commission):
+    """
+    Settles the selected bets against the results. Backs are for a unit stake and lays for a unit liability, to
+    match the EV of select_actions, and commission is paid on winnings
+
+    Parameters
+    ----------
+    bet_df : pandas.DataFrame
+        The games with an action, with the PRICE_COLUMNS, an 'ACTIONS' column and the frames won by each player.
+        If it has the CLOSE_COLUMNS the closing line value of each bet is also returned
+    commission : float
+        The exchange commission on winnings
+
+    Returns
+    -------
+    bet_df : pandas.DataFrame
+        bet_df with the 'stake', 'liability', 'pnl' and 'clv' of each bet
+    """
+    action = bet_df['ACTIONS'].to_numpy()
+    p1_won = (bet_df['player_one_frames'] > bet_df['player_two_frames']).to_numpy()
+    is_lay = np.char.startswith(action.astype(str), 'LAY')
+    on_p1 = np.char.endswith(action.astype(str), 'P1')
+
+    back_odds = np.where(on_p1, bet_df['p1_LIVE_best_BACK'], bet_df['p2_LIVE_best_BACK'])
+    lay_odds = np.where(on_p1, bet_df['p1_LIVE_best_LAY'], bet_df['p2_LIVE_best_LAY'])
+    odds = np.where(is_lay, lay_odds, back_odds)
+
+    # the stake is the amount matched, the liability what is lost if the bet loses
+    stake = np.where(is_lay, 1. / (odds - 1), 1.)
+    liability = np.ones(len(bet_df))
+    profit_if_won = np.where(is_lay, stake, odds - 1)
+    bet_won = np.where(is_lay, p1_won != on_p1, p1_won == on_p1)
+
+    bet_df = bet_df.assign(stake=stake, liability=liability,
+                           pnl=np.where(bet_won, profit_if_won * (1 - commission), -liability))
+
+    if set(CLOSE_COLUMNS).issubset(bet_df.columns):
+        close_odds = np.where(on_p1, bet_df['p1_CLOSE'], bet_df['p2_CLOSE'])
+        # a back beats the close at longer odds, a lay at shorter odds
+        bet_df['clv'] = np.where(is_lay, close_odds / odds, odds / close_odds) - 1
+    else:
+        bet_df['clv'] = np.nan
+
+    return bet_df
+
+
+def summarise(bet_df, freq='M'):
+    """
+    Aggregates the settled bets by period
+
+    Parameters
+    ----------
+    bet_df : pandas.DataFrame
+        The settled bets, with a 'date' column
+    freq : str
+        The pandas frequency of the periods
+
+    Returns
+    -------
+    summary_df : pandas.DataFrame
+        The number of bets, turnover (total stake matched), total liability, P&L, return on liability, mean CLV
+        and cumulative P&L of each period
+    """
+    summary_df = bet_df.groupby(pd.Grouper(key='date', freq=freq)).agg(bets=('pnl', 'size'), turnover=('stake', 'sum'),
+                                                                        liability=('liability', 'sum'),
+                                                                        pnl=('pnl', 'sum'), clv=('clv', 'mean'))
+    summary_df['roi'] = summary_df['pnl'] / summary_df['liability']
+    summary_df['cumulative_pnl'] = summary_df['pnl'].cumsum()
+
+    return summary_df
+
+
+def run_backtest(game_df, start_date, end_date=None, step_days=7, refit_days=91, ev=0.03, commission=0.05,
+                 uncertainty_z=1.0, prices_df=None, config=None, fit_kwargs=None, processes=1):
+    """
+    Runs the walk-forward backtest of generate_bets over the games between two dates
+
+    Parameters
+    ----------
+    game_df : pandas.DataFrame
+        Every game, indexed by game ID with the columns of the game table, e.g. from database_engine.read_game()
+    start_date : str or pandas.Timestamp
+        The date of the first game to bet on
+    end_date : str or pandas.Timestamp, optional
+        The date after the last game to bet on, defaults to after the latest game
+    step_days : int
+        The number of days between rating updates
+    refit_days : int
+        The number of days between refits of ModelA
+    ev : float
+        The EV each bet must achieve, as in generate_bets
+    commission : float
+        The exchange commission on winnings
+    uncertainty_z : float
+        The number of standard deviations of rating uncertainty added to the EV each bet must achieve
+    prices_df : pandas.DataFrame, optional
+        Recorded prices indexed by game ID, with the PRICE_COLUMNS and optionally the CLOSE_COLUMNS. Defaults to
+        baseline_prices, against which the result is a check of the ratings against a baseline model, not a backtest
+        of what generate_bets would have earned
+    config : dict, optional
+        The configuration of the fits, as in model.tuning. Defaults to DEFAULT_CONFIG
+    fit_kwargs : dict, optional
+        Passed on to ModelA.fit_model. Defaults to model.tuning.DEFAULT_FIT_KWARGS
+    processes : int
+        The number of worker processes walking the blocks, 1 walks them in this process
+
+    Returns
+    -------
+    bet_df : pandas.DataFrame
+        Every priced game with its action, the 'price_source' of its prices ('recorded' or 'baseline'), and the
+        stake, P&L and CLV of the games bet on
+    summary_df : pandas.DataFrame
+        The bets aggregated by month, see summarise
+    """
+    config = DEFAULT_CONFIG if config is None else config
+    fit_kwargs = tuning.DEFAULT_FIT_KWARGS if fit_kwargs is None else fit_kwargs
+
+    played_df = game_df.dropna(subset=['date', 'player_one_frames', 'player_two_frames']).sort_values('date',
+                                                                                                     kind='stable')
+    games = tuning.game_df_to_arrays(played_df)
+
+    last_day = int(games['day'].max()) + 1 if end_date is None else tuning.to_day(end_date)
+    blocks = date_blocks(tuning.to_day(start_date), last_day, refit_days)
+    block_args = [(block_start, block_end, step_days, config, fit_kwargs) for block_start, block_end in blocks]
+
+    if processes == 1:
+        walked_blocks = [walk_block(games, *args) for args in block_args]
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            for column, values in games.items():
+                np.save(os.path.join(directory, f'{column}.npy'), values)
+
+            # spawn rather than fork, as tensorflow is not fork-safe once it has been initialised
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=tuning.load_shared_games, initargs=(directory,)) as executor:
+                walked_blocks = list(executor.map(walk_shared_block, *zip(*block_args)))
+
+    positions = np.concatenate([block_positions for block_positions, _ in walked_blocks])
+    pre_game_ratings = np.concatenate([block_ratings for _, block_ratings in walked_blocks])
+
+    priced_df = pd.DataFrame(pre_game_ratings, index=played_df.index[positions],
+                             columns=['player_one_rating', 'player_one_rating_variance',
+                                      'player_two_rating', 'player_two_rating_variance', 'rating_covariance'])
+    # games of unknown format are priced as played to the winning score, as in the evaluation of the ratings
+    priced_df['best_of'] = played_best_of(played_df['best_of'].iloc[positions].to_numpy(dtype=np.float64),
+                                          played_df['player_one_frames'].iloc[positions].to_numpy(dtype=np.float64),
+                                          played_df['player_two_frames'].iloc[positions].to_numpy(dtype=np.float64))
+
+    # every game of every step priced at once; games with an unrated player are dropped
+    priced_df = return_bet_sizes(priced_df, ev=ev, commission=commission, p1_handicap=0, uncertainty_z=uncertainty_z)
+
+    if prices_df is None:
+        print('No recorded prices: the games are priced by a baseline model, so the P&L is a simulation check of the '
+              'ratings against the baseline, not a backtest against the market')
+        prices_df = baseline_prices(played_df, priced_df).assign(price_source='baseline')
+    else:
+        prices_df = prices_df.assign(price_source='recorded')
+    priced_df = priced_df.join(prices_df, how='inner')
+
+    actions, action_ev = select_actions(priced_df, EV=priced_df['EV_if_achieved (%)'].to_numpy())
+    priced_df = priced_df.assign(ACTIONS=actions, action_ev=action_ev)
+    priced_df = priced_df.join(played_df[['date', 'player_one_id', 'player_two_id',
+                                          'player_one_frames', 'player_two_frames']])
+
+    bet_df = settle_bets(priced_df[priced_df['action_ev'].notna()], commission)
+    bet_df = priced_df.join(bet_df[['stake', 'liability', 'pnl', 'clv']])
+
+    return bet_df, summarise(bet_df.dropna(subset=['pnl']))
@@ -0,0 +1,66 @@
+"""
+Benchmark of the ModelA training step, comparing the eager loop against the compiled tf.function (with and
+without XLA) on the standard training set used by master.daily_model_update
+
+Run from the repository root with: python -m benchmarks.fit_step_benchmark
+"""
+import time
+
+import database_engine as database_engine
+from model import ModelA
+
+ITERATIONS = 2_000
+
+CONFIGURATIONS = {"eager": dict(compiled=False),
+                  "tf.function": dict(compiled=True),
+                  "tf.function + XLA": dict(compiled=True, jit_compile=True)}
+
+
+def time_fit(player_df, game_df, iterations, **fit_kwargs):
+    """
+    Time a fixed number of iterations of ModelA.fit_model, with the convergence checks switched off
+
+    Parameters
+    ----------
+    player_df : pandas.DataFrame
+        The players of the training set
+    game_df : pandas.DataFrame
+        The games of the training set
+    iterations : int
+        The number of iterations to run
+    **fit_kwargs
+        Passed on to ModelA.fit_model
+
+    Returns
+    -------
+    seconds : float
+        The wall clock time of the fit
+    """
+    snooker_model = ModelA(game_df.copy(), player_df.copy())
+    start = time.perf_counter()
+    snooker_model.fit_model(iterations=iterations, rel_tol=0, grad_tol=0,
+                            callback=lambda *args: False, **fit_kwargs)
+    return time.perf_counter() - start
+
+
+def run(iterations=ITERATIONS):
+    """
+    Run the benchmark and print the time and speedup over the eager loop for each configuration
+
+    Parameters
+    ----------
+    iterations : int
+        The number of iterations to run for each configuration
+    """
+    player_df, game_df = database_engine.read_game_player_filtered(last_played_filter="2012-01-01",
+                                                                   game_date_filter="2012-01-01",
+                                                                   minimum_games_filter=25)
+    print(f"Training set: {len(player_df)} players, {len(game_df)} games, {iterations} iterations\n")
+    timings = {name: time_fit(player_df, game_df, iterations, **kwargs) for name, kwargs in CONFIGURATIONS.items()}
+    for name, seconds in timings.items():
+        print(f"{name:<20} {seconds:8.2f}s  {1000 * seconds / iterations:7.3f}ms/iter  "
+              f"speedup x{timings['eager'] / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,79 @@
+"""
+Benchmark of the import time of the model package, each import timed in a fresh interpreter. Fails (with a non-zero
+exit status) if an import loads a module it should not, or takes longer than its budget, so that a top-level import
+of tensorflow or matplotlib creeping back in is caught
+
+Run from the repository root with: python -m benchmarks.import_benchmark
+"""
+import subprocess
+import sys
+
+REPEATS = 5
+
+# statement: (budget in seconds, modules it must not load)
+IMPORTS = {"from model.artifact import RatingsArtifact; from model.pairwise import PairwiseProbabilities":
+               (0.5, ("pandas", "tensorflow", "matplotlib")),
+           "import model": (0.5, ("pandas", "tensorflow", "matplotlib")),
+           "from model import OnlineRatingUpdater": (1.5, ("tensorflow", "matplotlib")),
+           "from model import ModelA": (3.0, ("tensorflow", "matplotlib"))}
+
+TIMER = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(module for module in {forbidden!r} if module in sys.modules))
+"""
+
+
+def time_import(statement, forbidden):
+    """
+    Time an import statement in a fresh interpreter
+
+    Parameters
+    ----------
+    statement : str
+        The import statement
+    forbidden : tuple of str
+        The modules to check for after the import
+
+    Returns
+    -------
+    seconds : float
+        The wall clock time of the import
+    loaded : list of str
+        The forbidden modules that the import loaded
+    """
+    output = subprocess.run([sys.executable, "-c", TIMER.format(statement=statement, forbidden=forbidden)],
+                            capture_output=True, text=True, check=True).stdout.split()
+    seconds = float(output[0])
+    loaded = output[1].split(",") if len(output) > 1 else []
+
+    return seconds, loaded
+
+
+def run(repeats=REPEATS):
+    """
+    Time each import, keeping the fastest of a number of repeats, and print the results
+
+    Returns
+    -------
+    passed : bool
+        Whether every import stayed within its budget without loading a forbidden module
+    """
+    passed = True
+    for statement, (budget, forbidden) in IMPORTS.items():
+        timings = [time_import(statement, forbidden) for _ in range(repeats)]
+        seconds = min(seconds for seconds, _ in timings)
+        loaded = sorted(set(module for _, modules in timings for module in modules))
+
+        ok = seconds <= budget and not loaded
+        passed &= ok
+        print(f"{'ok  ' if ok else 'FAIL'} {seconds * 1_000:8.1f} ms (budget {budget * 1_000:.0f} ms) {statement}"
+              + (f" loaded {', '.join(loaded)}" if loaded else ""))
+
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,114 @@
+"""
+Benchmark of writing the raw_game table to the database, comparing pandas' default insert (one executemany per chunk)
+against multi-row INSERT statements and, on MySQL with the local_infile setting enabled, LOAD DATA LOCAL INFILE. Each
+way loads the whole table into a scratch table, which is dropped afterwards
+
+Run from the repository root with: python -m benchmarks.write_benchmark
+The database is configured as for the rest of the package, e.g. SNOOKER_DATABASE_URL=mysql+pymysql://... to
+benchmark a local MySQL server
+"""
+import sys
+import time
+
+import database_engine as database_engine
+from database_engine.engine_config import get_engine, is_sqlite, local_infile_enabled
+from database_engine.write import CHUNKSIZE, insert_rows, load_data_infile, write_rows
+
+REPEATS = 3
+
+# The scratch table the raw games are written to
+TABLE_NAME = "benchmark_raw_game"
+
+
+def load_executemany(raw_game_df, connection):
+    """
+    Write the raw games with pandas' default insert, as to_database did
+    """
+    raw_game_df.to_sql(TABLE_NAME, connection, if_exists="replace", chunksize=CHUNKSIZE)
+
+
+def load_multi_row(raw_game_df, connection):
+    """
+    Write the raw games with multi-row INSERT statements
+    """
+    raw_game_df.to_sql(TABLE_NAME, connection, if_exists="replace", chunksize=CHUNKSIZE, method=insert_rows)
+
+
+def load_data(raw_game_df, connection):
+    """
+    Write the raw games with LOAD DATA LOCAL INFILE
+    """
+    raw_game_df.iloc[:0].to_sql(TABLE_NAME, connection, if_exists="replace")
+    load_data_infile(raw_game_df, TABLE_NAME, connection)
+
+
+def load_automatic(raw_game_df, connection):
+    """
+    Write the raw games as to_database does, chosen by the database and the number of rows
+    """
+    write_rows(raw_game_df, TABLE_NAME, connection, if_exists="replace")
+
+
+def time_load(load, raw_game_df):
+    """
+    Time writing the raw games to the scratch table, in one transaction, and drop the table
+
+    Parameters
+    ----------
+    load : callable
+        The function writing the raw games on a connection
+    raw_game_df : pandas.DataFrame
+        The raw_game table
+
+    Returns
+    -------
+    seconds : float
+        The wall clock time of the write, including the commit
+    row_count : int
+        The number of rows in the scratch table after the write
+    """
+    start = time.perf_counter()
+    with get_engine().begin() as connection:
+        load(raw_game_df, connection)
+    seconds = time.perf_counter() - start
+
+    with get_engine().begin() as connection:
+        row_count = connection.exec_driver_sql(f"SELECT COUNT(*) FROM {TABLE_NAME}").scalar()
+        connection.exec_driver_sql(f"DROP TABLE {TABLE_NAME}")
+
+    return seconds, row_count
+
+
+def run(repeats=REPEATS):
+    """
+    Time each way of writing the raw_game table, keeping the fastest of a number of repeats, and print the results
+
+    Returns
+    -------
+    passed : bool
+        Whether every way wrote every row
+    """
+    raw_game_df = database_engine.read_raw_game(fresh=True)
+    loads = {"executemany (pandas default)": load_executemany,
+             "multi-row INSERT": load_multi_row}
+    if not is_sqlite() and local_infile_enabled():
+        loads["LOAD DATA LOCAL INFILE"] = load_data
+    loads["write_rows (automatic)"] = load_automatic
+    print(f"Writing {len(raw_game_df)} raw games to {get_engine().dialect.name}, best of {repeats}\n")
+
+    passed = True
+    baseline = None
+    for name, load in loads.items():
+        timings = [time_load(load, raw_game_df) for _ in range(repeats)]
+        seconds = min(seconds for seconds, _ in timings)
+        complete = all(row_count == len(raw_game_df) for _, row_count in timings)
+        passed &= complete
+        baseline = seconds if baseline is None else baseline
+        print(f"{'ok  ' if complete else 'FAIL'} {name:30} {seconds:8.2f} s {len(raw_game_df) / seconds:10.0f} rows/s"
+              f" x{baseline / seconds:.2f}")
+
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
@@ -13,9 +13,9 @@ def calc_min_back_odds(df, comm):
         The populated 'Offered Price' column; For any price we see on the XChange above this, EV only increases
     """
     comm = 1-comm
-    df['P1_BACK_MIN_ODDS'] = df.apply(lambda x: ( ((x['EV_if_achieved (%)']+1)/x['p1_GW_prob']) + comm - 1)/comm, axis=1).values
+    df['P1_BACK_MIN_ODDS'] = ( ((df['EV_if_achieved (%)']+1)/df['p1_GW_prob']) + comm - 1)/comm
 
-    df['P2_BACK_MIN_ODDS'] = df.apply(lambda x: ( ((x['EV_if_achieved (%)']+1)/x['p2_GW_prob']) + comm - 1)/comm, axis=1).values
+    df['P2_BACK_MIN_ODDS'] = ( ((df['EV_if_achieved (%)']+1)/df['p2_GW_prob']) + comm - 1)/comm
 
     return df
 
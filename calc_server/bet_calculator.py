@@ -9,8 +9,8 @@ from .transform_data import add_columns, extract_relevant_odds, extract_live_pla
 from .lay_calcs import calc_max_lay_odds
 from .back_calcs import calc_min_back_odds
 from .probability_calcs import calc_p1_frame_prob, calc_p2_frame_prob
-from .probability_calcs import calc_game_prob
-from .bet_selector import find_value, calculate_ev, narrow_actions
+from .probability_calcs import calc_game_prob, calc_game_prob_sd
+from .bet_selector import find_value, calculate_ev, narrow_actions, select_actions
 
 pd.set_option('display.max_rows', 500)
 pd.set_option('display.max_columns', 500)
@@ -19,8 +19,8 @@ pd.set_option('display.width', 1000)
 def calc_fair_odds(df):
     """Re-calc back min odds calculator for EV as 0"""
 
-    df['P1_FAIR_BACK_ODDS'] = df.apply(lambda x: ((1)/x['p1_GW_prob']), axis=1).values
-    df['P2_FAIR_BACK_ODDS'] = df.apply(lambda x: ((1)/x['p2_GW_prob']), axis=1).values
+    df['P1_FAIR_BACK_ODDS'] = 1/df['p1_GW_prob']
+    df['P2_FAIR_BACK_ODDS'] = 1/df['p2_GW_prob']
 
     df['P1_FAIR_LAY_ODDS'] = df['P2_FAIR_BACK_ODDS']
     df['P2_FAIR_LAY_ODDS'] = df['P1_FAIR_BACK_ODDS']
@@ -35,7 +35,21 @@ def append_fair_and_ev_odds(df, comm):
 
     return df
 
-def append_bet_suggestions(df, p1_handicap, commission):
+def widen_ev_for_uncertainty(df, p1_handicap, uncertainty_z):
+    """Raises the EV we require of each match by uncertainty_z standard deviations of the EV from rating uncertainty
+
+    At the fair odds 1/p, an error of sd(GW prob) in our game win probability is an error of about sd(GW prob) / p in
+    the EV of a bet, so the hurdle is raised by uncertainty_z * sd(GW prob) / min(p1_GW_prob, p2_GW_prob), which
+    covers every bet on the match
+    """
+    p1_GW_prob_sd = calc_game_prob_sd(df, p1_handicap)
+    min_GW_prob = np.minimum(df['p1_GW_prob'].values, df['p2_GW_prob'].values)
+
+    df['EV_if_achieved (%)'] = df['EV_if_achieved (%)'] + uncertainty_z * p1_GW_prob_sd / min_GW_prob
+
+    return df
+
+def append_bet_suggestions(df, p1_handicap, commission, uncertainty_z=1.0):
 
     p1_frame_win_prob = calc_p1_frame_prob(df)
     p2_frame_win_prob = calc_p2_frame_prob(df)
@@ -52,22 +66,27 @@ def append_bet_suggestions(df, p1_handicap, commission):
     df['p1_GW_prob'] = p1_GW_prob
     df['p2_GW_prob'] = 1 - df['p1_GW_prob']
 
+    df = widen_ev_for_uncertainty(df, p1_handicap, uncertainty_z)
+
     df = append_fair_and_ev_odds(df, commission)
 
     return df
 
 
 
-def return_bet_sizes(df, ev, commission, p1_handicap):
+def return_bet_sizes(df, ev, commission, p1_handicap, uncertainty_z=1.0):
     """
     Calculates our EV for given matches, and the minimum odds we wish to place a bet at given the EV
 
     Parameters
     ----------
     df : pd.DataFrame
-        a dataframe of today's upcoming matches
+        a dataframe of today's upcoming matches, with the ratings and rating variances of both players and
+        optionally the 'rating_covariance' between them
     ev : float
         a number specified by the user which directly determines the market odds needed for us to bet with this EV
+    uncertainty_z : float
+        the number of standard deviations of rating uncertainty added to the EV each match must achieve
 
     Returns
     -------
@@ -79,17 +98,22 @@ def return_bet_sizes(df, ev, commission, p1_handicap):
 
     df['best_of'] = df['best_of'].fillna(1)
 
+    # ratings stored without a variance are treated as certain, and pairs without a covariance (e.g. a player
+    # outside the last fit) as independent, rather than dropping the match
+    variance_columns = ['player_one_rating_variance', 'player_two_rating_variance', 'rating_covariance']
+    df[variance_columns] = df.reindex(columns=variance_columns).fillna(0.0)
+
     #df = df[['date', "player_one_name", "player_one_id", "player_one_rating",  "player_two_name", "player_two_id", "player_two_rating"]]
    
     df.dropna(inplace=True)
     # df.fillna(0, inplace=True)
 
-    df = append_bet_suggestions(df, p1_handicap, commission)
+    df = append_bet_suggestions(df, p1_handicap, commission, uncertainty_z)
 
     return df
 
 
-def describe_actions(df, ev):
+def describe_actions(df):
     """This is the function which has our live market odds, and our fair values, and tells us what the EV is like and stake sizes etc
     Also tells us what actions to take to maximise the EV shown on screen
     
@@ -104,22 +128,11 @@ def describe_actions(df, ev):
     columns_to_check = ['p1_LIVE_best_BACK', 'p1_LIVE_best_LAY', 'p2_LIVE_best_BACK', 'p2_LIVE_best_LAY']
     df = df[~(df[columns_to_check] == 0.00).any(axis=1)]
 
-    actions = []
-    for idx, row in df.iterrows():
-
-        print('change/ check EV...')
-        action_set = find_value(row, EV=ev)
-
-        exact_action = narrow_actions(action_set, row)
-
-        actions.append(exact_action)
-
-        # ev = calculate_ev(exact_action, row)
-
-        print('APPEND THE VALUES (ESPECIALLY EV) CALC ABOVE TO THE BET_SUGGESTIONS DF.')
-        # bet_suggestions.append()
+    # the EV hurdle of each match has been widened by the uncertainty of its players' ratings
+    actions, action_ev = select_actions(df, EV=df['EV_if_achieved (%)'].values)
 
-    df['ACTIONS'] = actions
+    df = df.assign(ACTIONS=actions)
+    df['EV for unit stake/liability'] = action_ev
     return df
 
 
@@ -164,9 +177,10 @@ def find_matching_name(p1, database_players):
 
 
 
-def generate_bets(market_odds, df, ev, commission, p1_handicap):
+def generate_bets(market_odds, df, ev, commission, p1_handicap, uncertainty_z=1.0):
     
-    betting_df = return_bet_sizes(df=df, ev=ev, commission=commission, p1_handicap=p1_handicap)
+    betting_df = return_bet_sizes(df=df, ev=ev, commission=commission, p1_handicap=p1_handicap,
+                                  uncertainty_z=uncertainty_z)
 
     betting_df = extract_relevant_odds(betting_df)
 
@@ -244,7 +258,7 @@ def generate_bets(market_odds, df, ev, commission, p1_handicap):
     available_games.rename(columns={'p1_best_BACK':'p1_LIVE_best_BACK', 'p1_best_LAY':'p1_LIVE_best_LAY',
                             'p2_best_BACK':'p2_LIVE_best_BACK', 'p2_best_LAY':'p2_LIVE_best_LAY'}, inplace=True)
 
-    bet_suggestions = describe_actions(available_games, ev)
+    bet_suggestions = describe_actions(available_games)
 
     return bet_suggestions
 
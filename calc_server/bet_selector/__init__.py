@@ -1,5 +1,6 @@
-from .select_bet import find_value, narrow_actions, calculate_ev
+from .select_bet import find_value, narrow_actions, calculate_ev, select_actions
 
 __all__ = ['find_value',
            'narrow_actions',
-           'calculate_ev']
\ No newline at end of file
+           'calculate_ev',
+           'select_actions']
\ No newline at end of file
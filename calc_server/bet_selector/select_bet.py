@@ -1,3 +1,5 @@
+import numpy as np
+
 def find_value(pd_row, EV):
     # action = 'None'
     # if 1./ pd_row['P1_FAIR_BACK_ODDS'] > 1./pd_row['p1_LIVE_best_BACK']:
@@ -100,3 +102,37 @@ def calculate_ev(exact_action, row):
 
     return ev
 
+
+def select_actions(df, EV):
+    """Vectorised find_value, narrow_actions and calculate_ev over every row of df at once
+
+    Returns the action for each row, as narrow_actions would choose it, and the EV of that action for unit
+    stake/liability (NaN where there is no action)
+    """
+    model_p1_win = 1./df['P1_FAIR_BACK_ODDS'].values
+    model_p2_win = 1./df['P2_FAIR_BACK_ODDS'].values
+    EV = np.broadcast_to(np.asarray(EV, dtype=np.float64), model_p1_win.shape)
+
+    p1_back, p1_lay = df['p1_LIVE_best_BACK'].values, df['p1_LIVE_best_LAY'].values
+    p2_back, p2_lay = df['p2_LIVE_best_BACK'].values, df['p2_LIVE_best_LAY'].values
+
+    # one column per action, in the order find_value lists them
+    action_names = np.array(['BACK_P1', 'LAY_P1', 'BACK_P2', 'LAY_P2'])
+    has_value = np.column_stack([model_p1_win > (EV + 1)/p1_back,
+                                 model_p1_win < ( 1 - EV*(p1_lay - 1) )/p1_lay,
+                                 model_p2_win > (EV + 1)/p2_back,
+                                 model_p2_win < ( 1 - EV*(p2_lay - 1) )/p2_lay])
+    action_ev = np.column_stack([model_p1_win * (p1_back - 1) - (1 - model_p1_win),
+                                 (1 - model_p1_win)/(p1_lay - 1) - model_p1_win,
+                                 model_p2_win * (p2_back - 1) - (1 - model_p2_win),
+                                 (1 - model_p2_win)/(p2_lay - 1) - model_p2_win])
+
+    n_actions = has_value.sum(axis=1)
+    best = np.argmax(np.where(has_value, action_ev, -np.inf), axis=1)
+    best_ev = action_ev[np.arange(len(best)), best]
+
+    # with several actions, narrow_actions only picks one if its EV is positive
+    picked = (n_actions == 1) | ((n_actions > 1) & (best_ev > 0))
+    actions = np.where(picked, action_names[best], np.where(n_actions > 1, '', 'NOTHING'))
+
+    return actions, np.where(picked, best_ev, np.nan)
@@ -16,7 +16,7 @@ def calc_max_lay_odds(df, comm):
 
     comm = 1 - comm
     #NOTE - switcheed probabilities for game win as a P1 lay occurs with probability p2_game_win
-    df['P1_LAY_MAX_ODDS'] = df.apply(lambda x: (x['EV_if_achieved (%)']+ x['p2_GW_prob']*(1-comm) - 1)/(x['p2_GW_prob']-1), axis=1).values
+    df['P1_LAY_MAX_ODDS'] = (df['EV_if_achieved (%)']+ df['p2_GW_prob']*(1-comm) - 1)/(df['p2_GW_prob']-1)
 
-    df['P2_LAY_MAX_ODDS'] = df.apply(lambda x: (x['EV_if_achieved (%)']+ x['p1_GW_prob']*(1-comm) - 1)/(x['p1_GW_prob']-1), axis=1).values
+    df['P2_LAY_MAX_ODDS'] = (df['EV_if_achieved (%)']+ df['p1_GW_prob']*(1-comm) - 1)/(df['p1_GW_prob']-1)
     return df
@@ -1,7 +1,9 @@
 from .snooker_frame_prob import calc_p1_frame_prob, calc_p2_frame_prob
-from .snooker_game_prob import calc_game_prob
+from .snooker_game_prob import calc_game_win_prob, calc_game_prob, calc_game_prob_sd
 
 __all__ = ['calc_p1_frame_prob',
            'calc_p2_frame_prob',
-           'calc_game_prob']
+           'calc_game_win_prob',
+           'calc_game_prob',
+           'calc_game_prob_sd']
 
@@ -1,39 +1,49 @@
 import numpy as np
 import pandas as pd
-import math
-from math import comb
+from scipy.special import comb
+
+def calc_game_win_prob(p1_frame_win_prob, best_of, p1_handicap=0):
+    """Returns P1 GW prob for arrays of P1 frame win prob and best of, in one vectorised pass over every match
+
+    For w = ceil(best_of/2) frames to win, P1 wins with k frames lost with prob (w+k-1)C(k) p^w (1-p)^k. With a
+    handicap h <= 0, P1 only wins the handicap market on the score lines where w - k > |h|
+    """
+    if p1_handicap > 0: #TODO:
+        raise ValueError('HANDICAP > 0. CHECK. needs fixing')
+
+    p1_frame_win_prob = np.asarray(p1_frame_win_prob, dtype=np.float64)[:, None]
+    wins_to_win = np.ceil(np.asarray(best_of, dtype=np.float64) / 2)[:, None]
+
+    # one column for each number of frames p1 can lose, up to the longest match
+    frames_lost = np.arange(int(wins_to_win.max(initial=1)))[None, :]
+    p1_wins_score_line = wins_to_win - frames_lost > np.abs(p1_handicap)
+
+    gw_prob = (comb(wins_to_win + frames_lost - 1, frames_lost) * p1_frame_win_prob ** wins_to_win
+               * (1 - p1_frame_win_prob) ** frames_lost)
+
+    return np.where(p1_wins_score_line, gw_prob, 0.0).sum(axis=1)
 
 def calc_game_prob(df, p1_handicap):
     """Returns a vector for P1 GW prob, given P1 Frame Win Prob"""
 
-    p1_GW_prob_vec = []
-
-    for idx, row in df.iterrows():
-        p1_frame_win_prob = row['p1_frame_win_prob']
-        wins_to_win = math.ceil(row['best_of']/2)
-        total_games = row['best_of']
-        p1_game_win_prob = 0
-        
-        for winning_game in np.arange(wins_to_win, total_games+1):
-            #(n-1)C(r-1) p^n (1-p)^(r)
-            combi = comb(int(winning_game)-1, wins_to_win-1)
-            failures = (1-p1_frame_win_prob)**(winning_game-wins_to_win)
-            successes = (p1_frame_win_prob)**(wins_to_win)
-
-            gw_prob = combi * failures * successes
-
-            # if p1_handicap: # if we are interested in handicap market
-            if p1_handicap <= 0:
-                if 2*wins_to_win - winning_game > np.abs(p1_handicap): # then in this case, p1 wins so add the prob to p1_game_win_prob
-                # if (winning_game -1) - (wins_to_win) > np.abs(p1_handicap):
-                    p1_game_win_prob += gw_prob
-                else: # else p1 looses for this score line with handicap applied so dont add the prob
-                    p1_game_win_prob = p1_game_win_prob
-
-            if p1_handicap > 0: #TODO:
-                raise ValueError('HANDICAP > 0. CHECK. needs fixing')
-                pass
-
-        p1_GW_prob_vec.append(p1_game_win_prob)
-
-    return p1_GW_prob_vec
\ No newline at end of file
+    return calc_game_win_prob(df['p1_frame_win_prob'].values, df['best_of'].values, p1_handicap)
+
+def calc_game_prob_sd(df, p1_handicap, step=1e-4):
+    """Returns a vector for the standard deviation of P1 GW prob, from the variance of the players' ratings
+
+    Delta method: sd(GW prob) = |d GW prob / d frame prob| * p (1 - p) * sd(rating difference), where the rating
+    difference variance is var(r1) + var(r2) - 2 cov(r1, r2). Players who have played each other, or the same
+    opponents, have strongly correlated ratings, so their difference is known better than either rating. The
+    derivative of GW prob is taken by central differences of calc_game_prob
+    """
+    p1_frame_win_prob = df['p1_frame_win_prob'].values
+
+    p1_GW_prob_up = calc_game_prob(df.assign(p1_frame_win_prob=np.minimum(p1_frame_win_prob + step, 1)), p1_handicap)
+    p1_GW_prob_down = calc_game_prob(df.assign(p1_frame_win_prob=np.maximum(p1_frame_win_prob - step, 0)), p1_handicap)
+    dGW_dp = (np.array(p1_GW_prob_up) - np.array(p1_GW_prob_down)) / (2 * step)
+
+    rating_difference_variance = (df['player_one_rating_variance'].values + df['player_two_rating_variance'].values
+                                  - 2 * df['rating_covariance'].values)
+    rating_difference_sd = np.sqrt(np.maximum(rating_difference_variance, 0))
+
+    return np.abs(dGW_dp) * p1_frame_win_prob * (1 - p1_frame_win_prob) * rating_difference_sd
\ No newline at end of file
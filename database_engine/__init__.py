@@ -5,9 +5,15 @@ from .read import (read,
 	read_player,
 	read_rating,
 	read_game,
+	read_game_after,
+	iter_raw_game,
+	iter_game,
+	get_max_game_id,
+	get_played_game_summary,
 	read_game_player_filtered,
 	read_snookerorg_player,
 	read_upcoming_game,
+	read_player_link,
 	get_upcoming_rating,
 	get_name_rating,
 	get_tables
@@ -23,6 +29,9 @@ from .refresh import (raw_refresh,
 
 from .update import (
 	update,
-	update_rating)
+	update_rating,
+	update_player_rating)
 
-from .engine_config import set_server
\ No newline at end of file
+from .engine_config import set_server, get_engine, set_engine, get_path
+
+from .migrate import migrate, explain_hot_queries
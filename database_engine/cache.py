@@ -0,0 +1,278 @@
+"""
+Module for the local cache of the tables in the database
+
+Each table read in full is kept on disk as a Parquet file, so reading it again takes milliseconds rather than a
+download of the whole table. A cached table is used until it is older than the cache_max_age setting, or until it
+is written to by this package, and is then synced with the database:
+	- the rows with a key above the watermark, the largest key when the table was last synced, are appended
+	- the rows up to the watermark are checked against the checksum and row count they had when the table was last
+	  synced, both computed by the database, and the table is read again in full if they have changed, e.g.
+	  because the table was replaced or rows were updated
+Reading with fresh = True reads the table straight from the database instead. The tables are cached with the dtypes
+of their schema (see schema.py), which Parquet keeps, so a cached table is read with them and is not converted again.
+The cache needs pyarrow, without it the tables are always read from the database
+
+Invalidation is local only. Every statement writing to a table through the package's engine, including raw
+get_engine().execute calls, marks the table as out of date in this machine's cache once it is committed (see
+track_writes). Writes by other processes with another cache directory, or other machines, are not seen until the
+cached table is older than cache_max_age and is checked against the database's checksum. Read with fresh = True
+when those writes must be seen at once
+"""
+import json
+import os
+import re
+import time
+import uuid
+
+import pandas as pd
+import sqlalchemy
+from .engine_config import get_engine, read_config, DEFAULT_CACHE_SETTINGS
+from .schema import apply_schema
+
+def get_cache_settings():
+	"""
+	Get the directory of the cache and the number of seconds a cached table is used for
+
+	Returns
+	-------
+	cache_directory : str or None
+		The directory of the cache, or None if the cache is disabled or pyarrow is not installed
+	cache_max_age : float
+		The number of seconds a cached table is used for before it is synced with the database
+	"""
+	config = {**DEFAULT_CACHE_SETTINGS, **read_config()}
+	try:
+		import pyarrow
+	except ImportError:
+		return None, float(config["cache_max_age"])
+	return config["cache_directory"] or None, float(config["cache_max_age"])
+
+def meta_path(cache_directory, table_name):
+	"""
+	Get the path of the metadata of a cached table
+	"""
+	return os.path.join(cache_directory, f"{table_name}.json")
+
+def read_meta(cache_directory, table_name):
+	"""
+	Read the metadata of a cached table
+
+	Returns
+	-------
+	meta : dict or None
+		The metadata, or None if the table is not cached
+	"""
+	try:
+		with open(meta_path(cache_directory, table_name)) as meta_file:
+			return json.load(meta_file)
+	except FileNotFoundError:
+		return None
+
+def write_cache(cache_directory, table_name, table_df, meta):
+	"""
+	Write a table to the cache
+
+	The table is written to a new file, which is only used once the metadata naming it replaces the old metadata,
+	so a reader never sees a table and metadata which do not match. The old files of the table are then removed
+
+	Parameters
+	----------
+	cache_directory : str
+		The directory of the cache
+	table_name : str
+		The name of the table
+	table_df : pandas.DataFrame
+		The table
+	meta : dict
+		The metadata of the table, to which the name of the file is added
+	"""
+	os.makedirs(cache_directory, exist_ok = True)
+	file_name = f"{table_name}.{uuid.uuid4().hex}.parquet"
+	table_df.to_parquet(os.path.join(cache_directory, file_name))
+	path = meta_path(cache_directory, table_name)
+	with open(f"{path}.tmp", "w") as meta_file:
+		json.dump({**meta, "file": file_name}, meta_file)
+	os.replace(f"{path}.tmp", path)
+	for old_file_name in os.listdir(cache_directory):
+		if old_file_name.startswith(f"{table_name}.") and old_file_name.endswith(".parquet") and old_file_name != file_name:
+			try:
+				os.remove(os.path.join(cache_directory, old_file_name))
+			except FileNotFoundError:
+				pass
+
+def invalidate(table_name):
+	"""
+	Mark a cached table as out of date in the local cache, so it is synced with the database the next time it is read
+
+	Called by the functions of the package which write to a table, and for every table written to through the engine
+	once the write is committed (see track_writes). Other machines' caches are not invalidated
+	"""
+	cache_directory, _ = get_cache_settings()
+	if cache_directory is None:
+		return None
+	meta = read_meta(cache_directory, table_name)
+	if meta is not None:
+		path = meta_path(cache_directory, table_name)
+		with open(f"{path}.tmp", "w") as meta_file:
+			json.dump({**meta, "synced_at": 0}, meta_file)
+		os.replace(f"{path}.tmp", path)
+
+# The statements which write to a table, and the name of the table they write to
+WRITE_STATEMENT = re.compile(r"""^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?
+	|DROP\s+(?:TEMPORARY\s+)?TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE|RENAME\s+TABLE|CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?
+	|LOAD\s+DATA\s+(?:LOCAL\s+)?INFILE\s+'[^']*'\s+(?:REPLACE\s+|IGNORE\s+)?INTO\s+TABLE)\s+[`"]?(\w+)""",
+	re.IGNORECASE | re.VERBOSE)
+# The tables a table is renamed to, by ALTER TABLE ... RENAME TO or RENAME TABLE ... TO
+RENAME_TARGET = re.compile(r"""\bTO\s+[`"]?(\w+)""", re.IGNORECASE)
+
+# The key of the connection info the tables written to in the current transaction are kept in
+WRITTEN_TABLES_KEY = "snooker_written_tables"
+
+def get_written_tables(statement):
+	"""
+	Get the names of the tables a SQL statement writes to, an empty list if it does not write to a table
+	"""
+	match = WRITE_STATEMENT.match(statement)
+	if match is None:
+		return []
+	written_tables = [match.group(1)]
+	if re.match(r"\s*(?:ALTER|RENAME)\s", statement, re.IGNORECASE):
+		written_tables += RENAME_TARGET.findall(statement)
+	return written_tables
+
+def record_written_tables(connection, cursor, statement, parameters, context, executemany):
+	"""
+	Record the tables a statement about to be executed writes to on its connection
+	"""
+	written_tables = get_written_tables(statement)
+	if written_tables:
+		connection.info.setdefault(WRITTEN_TABLES_KEY, set()).update(written_tables)
+
+def invalidate_written_tables(connection):
+	"""
+	Invalidate the tables written to on a connection once the writes are committed
+	"""
+	for table_name in connection.info.pop(WRITTEN_TABLES_KEY, ()):
+		invalidate(table_name)
+
+def forget_written_tables(connection):
+	"""
+	Forget the tables written to on a connection when the writes are rolled back
+	"""
+	connection.info.pop(WRITTEN_TABLES_KEY, None)
+
+def track_writes(engine):
+	"""
+	Invalidate the cached tables written to through an engine when the writes are committed, whichever function of
+	the package, or raw execute call, made them. A table read and cached while a write to it was still in progress
+	is then synced again. Called by engine_config on the engine of the snooker database
+	"""
+	if not sqlalchemy.event.contains(engine, "before_cursor_execute", record_written_tables):
+		sqlalchemy.event.listen(engine, "before_cursor_execute", record_written_tables)
+		sqlalchemy.event.listen(engine, "commit", invalidate_written_tables)
+		sqlalchemy.event.listen(engine, "rollback", forget_written_tables)
+
+def get_table_summary(connection, table_name, key, columns, watermark = None):
+	"""
+	Get the number of rows, largest key and checksum of a table, computed by the database
+
+	Parameters
+	----------
+	connection : sqlalchemy.engine.Connection
+		The connection to the database
+	table_name : str
+		The name of the table
+	key : str
+		The key column of the table
+	columns : list of str
+		The columns of the table, including the key
+	watermark : int, optional
+		Only summarise the rows with a key up to the watermark
+
+	Returns
+	-------
+	summary : dict
+		The 'row_count', 'watermark' (the largest key) and 'checksum' of the rows
+	"""
+	mysql_query = f"""SELECT COUNT(*), MAX({key}), SUM(CRC32(CONCAT_WS('|', {', '.join(columns)})))
+					FROM {table_name}"""
+	if watermark is not None:
+		mysql_query += f" WHERE {key} <= {watermark}"
+	row_count, max_key, checksum = connection.exec_driver_sql(mysql_query).fetchone()
+	return {"row_count": int(row_count),
+		"watermark": None if max_key is None else int(max_key),
+		"checksum": None if checksum is None else int(checksum)}
+
+def read_table(table_name, index_col, parse_dates = None, fresh = False):
+	"""
+	Read a table from the local cache, syncing it with the database first if it is out of date
+
+	Parameters
+	----------
+	table_name : str
+		The name of the table
+	index_col : str
+		The key column of the table, an integer, which is used as the index
+	parse_dates : list of str, optional
+		The columns to parse as dates
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the cache
+
+	Returns
+	-------
+	table_df : pandas.DataFrame
+		DataFrame representing the table, as read by pandas.read_sql_table, with the dtypes of the table's schema
+	"""
+	cache_directory, cache_max_age = get_cache_settings()
+	if cache_directory is None:
+		table_df = pd.read_sql_table(table_name, get_engine(), index_col = index_col, parse_dates = parse_dates)
+		return apply_schema(table_df, table_name)
+	meta = read_meta(cache_directory, table_name)
+	if not fresh and meta is not None and time.time() - meta["synced_at"] < cache_max_age:
+		# The schema is checked, but only a column which Parquet does not keep the dtype of, e.g. an empty categorical
+		# column, is converted
+		return apply_schema(pd.read_parquet(os.path.join(cache_directory, meta["file"])), table_name)
+	return sync_table(cache_directory, table_name, index_col, parse_dates, None if fresh else meta)
+
+def sync_table(cache_directory, table_name, index_col, parse_dates, meta):
+	"""
+	Sync a cached table with the database, and write it to the cache
+
+	Parameters
+	----------
+	cache_directory : str
+		The directory of the cache
+	table_name : str
+		The name of the table
+	index_col : str
+		The key column of the table
+	parse_dates : list of str or None
+		The columns to parse as dates
+	meta : dict or None
+		The metadata of the cached table, None to read the table in full
+
+	Returns
+	-------
+	table_df : pandas.DataFrame
+		DataFrame representing the table
+	"""
+	with get_engine().connect() as connection, connection.begin():
+		columns = [column["name"] for column in sqlalchemy.inspect(connection).get_columns(table_name)]
+		table_df = None
+		if meta is not None and meta["columns"] == columns and meta["watermark"] is not None:
+			# The rows up to the watermark are unchanged, so only the rows after it are read
+			if get_table_summary(connection, table_name, index_col, columns, meta["watermark"]) == \
+				{key: meta[key] for key in ["row_count", "watermark", "checksum"]}:
+				cached_df = pd.read_parquet(os.path.join(cache_directory, meta["file"]))
+				date_columns = [column for column in cached_df if pd.api.types.is_datetime64_any_dtype(cached_df[column])]
+				mysql_query = f"SELECT * FROM {table_name} WHERE {index_col} > {meta['watermark']} ORDER BY {index_col}"
+				new_df = pd.read_sql_query(mysql_query, connection, index_col = index_col,
+					parse_dates = list(set(date_columns) | set(parse_dates or [])))
+				table_df = pd.concat([cached_df, new_df]) if not new_df.empty else cached_df
+		if table_df is None:
+			table_df = pd.read_sql_table(table_name, connection, index_col = index_col, parse_dates = parse_dates)
+		summary = get_table_summary(connection, table_name, index_col, columns)
+	# The appended rows are read with the default dtypes, so the schema is applied once they are appended
+	table_df = apply_schema(table_df, table_name)
+	write_cache(cache_directory, table_name, table_df, {**summary, "columns": columns, "synced_at": time.time()})
+	return table_df
@@ -1,33 +1,44 @@
 """
 Module for creating new tables
 """
-from .engine_config import SNOOKER_ENGINE
+import pandas as pd
+from .engine_config import foreign_key_checks_disabled
+from .migrate import full_name_column
+from .swap import get_shadow_table_name, shadow_create_statement, swap_shadow_table
 from .write import to_database
 
 __all__ = ["create_tournament_table",
 "create_player_table",
 "create_game_table",
-"create_rating_table"]
+"create_rating_table",
+"create_player_link_table"]
 
 def create_table(table_df, table_name, table_create_statement):
 	"""
-	Create a table in the database
+	Create a table in the database, with its secondary indexes
+
+	The table is built in a shadow table, which then replaces the table in one step (see swap.py), so the table can
+	be read while it is rebuilt
 
 	Parameters
 	----------
-	table_df : pandas.DataFrame
-		DataFrame representing the table to create
+	table_df : pandas.DataFrame or iterable of pandas.DataFrame
+		DataFrame representing the table to create, or the chunks of the table, e.g. transformed from the chunks
+		streamed by read.iter_raw_game, which are written one at a time
 	table_name : str
 		The name of the table to create
 	table_create_statement : str
 		The MySQL statement to create the table
 	"""
 	print(f"Creating the {table_name} table in the snooker database...")
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 0")
-	SNOOKER_ENGINE.execute(f"DROP TABLE IF EXISTS {table_name}")
-	SNOOKER_ENGINE.execute(table_create_statement)
-	to_database(table_df, table_name)
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 1")
+	shadow_table_name = get_shadow_table_name(table_name)
+	with foreign_key_checks_disabled() as connection:
+		connection.exec_driver_sql(f"DROP TABLE IF EXISTS {shadow_table_name}")
+		connection.exec_driver_sql(shadow_create_statement(table_create_statement, table_name))
+		for table_chunk_df in [table_df] if isinstance(table_df, pd.DataFrame) else table_df:
+			to_database(table_chunk_df, shadow_table_name, connection = connection)
+		# The indexes are created once the rows are loaded, rather than being updated with each row
+		swap_shadow_table(table_name, connection)
 	print(f"The {table_name} table was successfully created!\n")
 
 def create_tournament_table(tournament_df):
@@ -65,11 +76,12 @@ def create_player_table(player_df):
 	player_df : pandas.DataFrame
 		DataFrame representing the player table
 	"""
-	player_create_statement = """CREATE TABLE player (
+	player_create_statement = f"""CREATE TABLE player (
 								player_id SMALLINT UNSIGNED,
 								first_name VARCHAR(80),
 								last_name VARCHAR(80),
 								url VARCHAR(200),
+								{full_name_column()},
 								CONSTRAINT pk_player PRIMARY KEY (player_id)
 								)"""
 	create_table(player_df, "player", player_create_statement)
@@ -80,8 +92,8 @@ def create_game_table(game_df):
 
 	Parameters
 	----------
-	game_df : pandas.DataFrame
-		DataFrame representing the game table
+	game_df : pandas.DataFrame or iterable of pandas.DataFrame
+		DataFrame representing the game table, or its chunks
 	"""
 	game_create_statement = """CREATE TABLE game (
 								game_id MEDIUMINT UNSIGNED,
@@ -112,6 +124,7 @@ def create_rating_table(rating_df):
 	rating_create_statement = """CREATE TABLE rating (
 								player_id SMALLINT UNSIGNED,
 								rating FLOAT(7,5),
+								rating_variance FLOAT,
 								CONSTRAINT fk_player_rating FOREIGN KEY (player_id) REFERENCES player(player_id)
 								)"""
 	create_table(rating_df, "rating", rating_create_statement)
@@ -125,7 +138,7 @@ def create_snookerorg_player_table(snoookerorg_player_df):
 	snoookerorg_player_df : pandas.DataFrame
 		DataFrame representing the player table
 	"""
-	player_create_statement = """CREATE TABLE snookerorg_player (
+	player_create_statement = f"""CREATE TABLE snookerorg_player (
 								player_id SMALLINT UNSIGNED,
 								first_name VARCHAR(80),
 								middle_name VARCHAR(80),
@@ -133,6 +146,7 @@ def create_snookerorg_player_table(snoookerorg_player_df):
 								date_of_birth DATE,
 								turned_professional YEAR,
 								nationality VARCHAR(50),
+								{full_name_column()},
 								CONSTRAINT pk_snookerorg_player
 								PRIMARY KEY (player_id)
 								)"""
@@ -162,6 +176,24 @@ def create_upcoming_game_table(upcoming_game_df):
 		"upcoming_game",
 		upcoming_create_statement)
 
+def create_player_link_table(player_link_df):
+	"""
+	Create the player_link table in the database
 
-
-
+	Parameters
+	----------
+	player_link_df : pandas.DataFrame
+		DataFrame representing the player_link table, indexed by the snooker.org player ID with the CueTracker
+		'player_id' of each player
+	"""
+	player_link_create_statement = """CREATE TABLE player_link (
+									snookerorg_player_id SMALLINT UNSIGNED,
+									player_id SMALLINT UNSIGNED,
+									CONSTRAINT pk_player_link
+									PRIMARY KEY (snookerorg_player_id),
+									CONSTRAINT fk_snookerorg_player_player_link FOREIGN KEY (snookerorg_player_id) REFERENCES snookerorg_player(player_id),
+									CONSTRAINT fk_player_player_link FOREIGN KEY (player_id) REFERENCES player(player_id)
+									)"""
+	create_table(player_link_df,
+		"player_link",
+		player_link_create_statement)
@@ -1,14 +1,23 @@
 """
 Module for deleting rows from tables in the database
 """
-from .engine_config import SNOOKER_ENGINE
-from .read import read
+import sqlalchemy
 
-def delete_duplicate_primary_keys(df_to_upload, table_name):
+from .engine_config import get_engine, foreign_key_checks_disabled
+from .cache import invalidate
+
+# The number of primary keys to delete in each statement
+CHUNKSIZE = 5000
+
+def delete_duplicate_primary_keys(df_to_upload, table_name, connection = None):
 	"""
 	Delete rows from a table in the database which have the same primary key as the DataFrame which is about to
 	be uploaded to the database
 
+	The rows are deleted by the keys of the DataFrame, in batches of CHUNKSIZE keys, so the table is never read and
+	the cost depends on the size of the DataFrame rather than the table. Only needed for tables without a primary key
+	constraint, as write.append_to_database upserts into the others
+
 	Parameters
 	----------
 	df_to_upload : pandas.DataFrame
@@ -16,23 +25,25 @@ def delete_duplicate_primary_keys(df_to_upload, table_name):
 		in the database, therefore these rows need to be deleted from the database
 	table_name : pandas.DataFrame
 		The name of the table which is about to be uploaded to the database
+	connection : sqlalchemy.engine.Connection, optional
+		The connection to delete on, e.g. one in a transaction. Defaults to a connection with the foreign key checks
+		disabled
 	"""
-	current_df = read(table_name)
-	if current_df is not None:
-		index_column_name = current_df.index.name
-		replace_mask = df_to_upload.index.isin(current_df.index)
-		ids_to_replace = tuple(df_to_upload.index[replace_mask])
-		number_of_ids_to_replace = len(ids_to_replace)
-		if number_of_ids_to_replace > 0:
-			print(f"Deleting the following entries from the {table_name} table in the snooker database...")
-			delete_mask = current_df.index.isin(ids_to_replace)
-			print(current_df.loc[delete_mask,:])
-			SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 0")
-			if number_of_ids_to_replace == 1:
-				SNOOKER_ENGINE.execute(f"DELETE FROM {table_name} WHERE {index_column_name} = {ids_to_replace[0]}")
-			else:
-				SNOOKER_ENGINE.execute(f"DELETE FROM {table_name} WHERE {index_column_name} IN {ids_to_replace}")
-			SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 1")
+	if df_to_upload.empty:
+		return None
+	if connection is None:
+		with foreign_key_checks_disabled() as connection:
+			return delete_duplicate_primary_keys(df_to_upload, table_name, connection)
+	invalidate(table_name)
+	ids_to_replace = df_to_upload.index.unique().tolist()
+	delete_statement = sqlalchemy.text(f"DELETE FROM {table_name} WHERE {df_to_upload.index.name} IN :ids")
+	delete_statement = delete_statement.bindparams(sqlalchemy.bindparam("ids", expanding = True))
+	number_of_deleted_rows = 0
+	for start in range(0, len(ids_to_replace), CHUNKSIZE):
+		result = connection.execute(delete_statement, {"ids": ids_to_replace[start:start + CHUNKSIZE]})
+		number_of_deleted_rows += result.rowcount
+	if number_of_deleted_rows > 0:
+		print(f"Deleted {number_of_deleted_rows} entries with the same primary keys from the {table_name} table in the snooker database")
 
 def delete_from_raw_game(game_ids):
 	"""
@@ -43,10 +54,9 @@ def delete_from_raw_game(game_ids):
 	game_ids : int or sequence-like
 		The game IDs corresponding to the rows to delete from the raw_game table
 	"""
-	if isinstance(game_ids,int):
-		SNOOKER_ENGINE.execute(f"DELETE FROM raw_game WHERE game_id = {game_ids}")
-	else:
-		if len(game_ids) == 1:
-			SNOOKER_ENGINE.execute(f"DELETE FROM raw_game WHERE game_id = {game_ids[0]}")
-		else:
-			SNOOKER_ENGINE.execute(f"DELETE FROM raw_game WHERE game_id IN {tuple(game_ids)}")
+	game_ids = [game_ids] if isinstance(game_ids, int) else [int(game_id) for game_id in game_ids]
+	delete_statement = sqlalchemy.text("DELETE FROM raw_game WHERE game_id IN :game_ids")
+	delete_statement = delete_statement.bindparams(sqlalchemy.bindparam("game_ids", expanding = True))
+	# the cached raw_game table is invalidated when the delete is committed (see cache.track_writes)
+	with get_engine().begin() as connection:
+		connection.execute(delete_statement, {"game_ids": game_ids})
@@ -1,8 +1,9 @@
 """
 Module for deleting tables from the database 
 """
-from .engine_config import SNOOKER_ENGINE
+from .engine_config import foreign_key_checks_disabled
 from .read import get_tables
+from .cache import invalidate
 
 _all__ = ["drop_all",
 "drop_all_formatted"]
@@ -12,11 +13,11 @@ def drop_all():
 	Delete all the tables from the database
 	"""
 	print("Deleting the all tables from the database...")
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 0")
 	all_tables = get_tables()
-	for table in all_tables:
-		SNOOKER_ENGINE.execute(f"DROP TABLE {table}")
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 1")
+	with foreign_key_checks_disabled() as connection:
+		for table in all_tables:
+			invalidate(table)
+			connection.exec_driver_sql(f"DROP TABLE {table}")
 	print("All tables have been deleted!\n")
 
 def drop_all_formatted():
@@ -24,13 +25,13 @@ def drop_all_formatted():
 	Delete all the formatted tables from the database
 	"""
 	print("Deleting all the tables from the database except for the raw_game and raw_tournament tables...")
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 0")
 	all_tables = get_tables()
 	deleted = ""
-	for table in all_tables:
-		if table != "raw_game" and table != "raw_tournament":
-			SNOOKER_ENGINE.execute(f"DROP TABLE {table}")
-			deleted = deleted + table + "\n"
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 1")
+	with foreign_key_checks_disabled() as connection:
+		for table in all_tables:
+			if table != "raw_game" and table != "raw_tournament":
+				invalidate(table)
+				connection.exec_driver_sql(f"DROP TABLE {table}")
+				deleted = deleted + table + "\n"
 	print(f"The following tables were deleted: {deleted}\n")
 
@@ -2,12 +2,60 @@
 # sharpsports
 """
 Module for configuring the server and database to connect to
+
+The engine is created the first time it is used, by get_engine, so importing the package does not touch the network.
+It is configured from, in order of priority:
+	- SNOOKER_DATABASE_URL, SNOOKER_DATABASE_SERVER and SNOOKER_DATABASE_<POOL SETTING> environment variables
+	- the [database] section of the config file named by SNOOKER_DATABASE_CONFIG (snooker_database.ini by default),
+	  with the keys url, server, pool_size, max_overflow, pool_recycle, pool_pre_ping, cache_directory,
+	  cache_max_age, local_infile and the keys of DEFAULT_PATH_SETTINGS
+	- the AWS server, with DEFAULT_POOL_SETTINGS
+The same settings place the files the model writes, see get_path
+A sqlite URL, e.g. sqlite:///snooker.db, runs the same read/write API against a local file, offline
 """
+import configparser
+import contextlib
+import os
+import zlib
+
 import sqlalchemy
 
 DATABASE = "snooker"
 PORT = 3306
 
+CONFIG_PATH_VARIABLE = "SNOOKER_DATABASE_CONFIG"
+DEFAULT_CONFIG_PATH = "snooker_database.ini"
+
+# Connections are checked with a ping before use and replaced after an hour, as RDS drops idle connections
+DEFAULT_POOL_SETTINGS = {"pool_size": 5,
+	"max_overflow": 10,
+	"pool_recycle": 3600,
+	"pool_pre_ping": True}
+
+# The local cache of the tables (see cache.py), and the number of seconds a cached table is used for before it is
+# synced with the database. An empty cache_directory disables the cache
+DEFAULT_CACHE_SETTINGS = {"cache_directory": "table_cache",
+	"cache_max_age": 300}
+
+# Whether MySQL connections may send local files to the server with LOAD DATA LOCAL INFILE (see
+# write.load_data_infile). Off by default, as a connection allowed to do so lets the server ask for any file the
+# client can read, so large writes use multi-row INSERT statements unless it is enabled
+DEFAULT_WRITE_SETTINGS = {"local_infile": False}
+
+# Where the model keeps its files: the versioned ratings artifacts, the training store of the played games, the
+# head-to-head probability matrices and the history of the out-of-sample scores. Relative paths are relative to
+# ROOT_DIRECTORY, so the files are the same whichever directory the scheduler runs from
+DEFAULT_PATH_SETTINGS = {"ratings_directory": "ratings_artifacts",
+	"training_store_directory": "training_store",
+	"pairwise_directory": "pairwise",
+	"evaluation_history_path": "evaluation_history.csv"}
+
+# The directory holding the database_engine and model packages
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The engine, created on first use by get_engine
+_ENGINE = None
+
 def set_server(name = "AWS"):
 	"""
 	Set the server for the MySQL database
@@ -27,6 +75,197 @@ def set_server(name = "AWS"):
 		host = "localhost"
 	return user, password, host
 
-USER, PASSWORD, HOST = set_server("AWS")
-CONNECT_STRING = f"mysql+pymysql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
-SNOOKER_ENGINE = sqlalchemy.create_engine(CONNECT_STRING)
\ No newline at end of file
+def read_config():
+	"""
+	Read the database configuration from the config file and the environment, the environment taking priority
+
+	Returns
+	-------
+	config : dict of str:str
+		The configured settings, of url, server and the keys of DEFAULT_POOL_SETTINGS, DEFAULT_CACHE_SETTINGS,
+		DEFAULT_WRITE_SETTINGS and DEFAULT_PATH_SETTINGS
+	"""
+	config = {}
+	parser = configparser.ConfigParser()
+	parser.read(os.environ.get(CONFIG_PATH_VARIABLE, DEFAULT_CONFIG_PATH))
+	if parser.has_section("database"):
+		config.update(parser["database"])
+	for key in ["url", "server", *DEFAULT_POOL_SETTINGS, *DEFAULT_CACHE_SETTINGS, *DEFAULT_WRITE_SETTINGS,
+		*DEFAULT_PATH_SETTINGS]:
+		environment_value = os.environ.get(f"SNOOKER_DATABASE_{key.upper()}")
+		if environment_value is not None:
+			config[key] = environment_value
+	return config
+
+def is_enabled(value):
+	"""
+	Return whether a boolean setting, which may be text from the config file or the environment, is enabled
+	"""
+	return str(value).lower() in ("true", "1", "yes")
+
+def local_infile_enabled(config = None):
+	"""
+	Return whether LOAD DATA LOCAL INFILE is enabled by the local_infile setting
+
+	Parameters
+	----------
+	config : dict of str:str, optional
+		The settings, as returned by read_config. Defaults to read_config()
+	"""
+	config = read_config() if config is None else config
+	return is_enabled(config.get("local_infile", DEFAULT_WRITE_SETTINGS["local_infile"]))
+
+def get_path(key, config = None):
+	"""
+	Return the configured path of one of the files the model writes, anchored at ROOT_DIRECTORY if it is relative
+
+	Parameters
+	----------
+	key : str
+		The setting, one of the keys of DEFAULT_PATH_SETTINGS
+	config : dict of str:str, optional
+		The settings, as returned by read_config. Defaults to read_config()
+
+	Returns
+	-------
+	path : str
+		The absolute path
+	"""
+	config = read_config() if config is None else config
+	path = os.path.expanduser(config.get(key, DEFAULT_PATH_SETTINGS[key]))
+	return os.path.join(ROOT_DIRECTORY, path)
+
+def register_sqlite_functions(dbapi_connection, connection_record):
+	"""
+	Register the MySQL functions used by the queries of the package on a new sqlite connection
+	"""
+	def concat(*values):
+		# like MySQL, CONCAT is NULL if any of its arguments are
+		if any(value is None for value in values):
+			return None
+		return "".join(str(value) for value in values)
+	def concat_ws(separator, *values):
+		# CONCAT_WS skips NULL arguments
+		return separator.join(str(value) for value in values if value is not None)
+	def crc32(value):
+		if value is None:
+			return None
+		return zlib.crc32(str(value).encode())
+	dbapi_connection.create_function("CONCAT", -1, concat, deterministic = True)
+	dbapi_connection.create_function("CONCAT_WS", -1, concat_ws, deterministic = True)
+	dbapi_connection.create_function("CRC32", 1, crc32, deterministic = True)
+
+def enable_sqlite_write_ahead_log(dbapi_connection, connection_record):
+	"""
+	Put a new sqlite connection in write-ahead log mode, so a table can be streamed (see read.iter_table) while the
+	transformed rows are written to another table, as MySQL allows. Otherwise the reader's lock blocks the writer
+	"""
+	dbapi_connection.execute("PRAGMA journal_mode = WAL")
+
+def create_engine_from_config(config = None):
+	"""
+	Create an engine from a database configuration
+
+	Parameters
+	----------
+	config : dict of str:str, optional
+		The settings, as returned by read_config. Defaults to read_config()
+
+	Returns
+	-------
+	engine : sqlalchemy.engine.Engine
+		The engine. No connection is opened until it is first used
+	"""
+	config = read_config() if config is None else config
+	if "url" in config:
+		connect_string = config["url"]
+	else:
+		user, password, host = set_server(config.get("server", "AWS"))
+		connect_string = f"mysql+pymysql://{user}:{password}@{host}:{PORT}/{DATABASE}"
+	url = sqlalchemy.engine.make_url(connect_string)
+
+	pool_pre_ping = is_enabled(config.get("pool_pre_ping", DEFAULT_POOL_SETTINGS["pool_pre_ping"]))
+	if url.get_backend_name() == "sqlite":
+		# sqlite connections are local files, so the server pool settings do not apply
+		engine = sqlalchemy.create_engine(url, pool_pre_ping = pool_pre_ping)
+		sqlalchemy.event.listen(engine, "connect", register_sqlite_functions)
+		sqlalchemy.event.listen(engine, "connect", enable_sqlite_write_ahead_log)
+	else:
+		# local_infile lets write.load_data_infile send files from this machine with LOAD DATA LOCAL INFILE, so the
+		# connections only allow it if the local_infile setting is enabled
+		engine = sqlalchemy.create_engine(url,
+			pool_size = int(config.get("pool_size", DEFAULT_POOL_SETTINGS["pool_size"])),
+			max_overflow = int(config.get("max_overflow", DEFAULT_POOL_SETTINGS["max_overflow"])),
+			pool_recycle = int(config.get("pool_recycle", DEFAULT_POOL_SETTINGS["pool_recycle"])),
+			pool_pre_ping = pool_pre_ping,
+			connect_args = {"local_infile": True} if local_infile_enabled(config) else {})
+	return engine
+
+def get_engine():
+	"""
+	Return the engine of the snooker database, creating it from the configuration on first use
+
+	Returns
+	-------
+	engine : sqlalchemy.engine.Engine
+		The engine of the snooker database
+	"""
+	global _ENGINE
+	if _ENGINE is None:
+		set_engine(create_engine_from_config())
+	return _ENGINE
+
+def set_engine(engine):
+	"""
+	Point the package at another database, e.g. a local sqlite file for tests or benchmarks
+
+	Parameters
+	----------
+	engine : sqlalchemy.engine.Engine or str
+		The engine, or the URL to create one from with the configured pool settings
+	"""
+	global _ENGINE
+	if isinstance(engine, str):
+		engine = create_engine_from_config({**read_config(), "url": engine})
+	if _ENGINE is not None and _ENGINE is not engine:
+		_ENGINE.dispose()
+	# imported here, as the cache reads the engine from this module
+	from .cache import track_writes
+	track_writes(engine)
+	_ENGINE = engine
+
+def is_sqlite(engine = None):
+	"""
+	Return whether the engine (by default the snooker database engine) is backed by sqlite
+	"""
+	engine = get_engine() if engine is None else engine
+	return engine.dialect.name == "sqlite"
+
+@contextlib.contextmanager
+def foreign_key_checks_disabled():
+	"""
+	Context manager giving a connection, in a transaction, on which MySQL's foreign key checks are disabled. The
+	checks are a session setting, so every statement that relies on them being off must use this connection. sqlite
+	does not enforce foreign keys unless asked to, so there is nothing to disable
+
+	Yields
+	------
+	connection : sqlalchemy.engine.Connection
+		The connection to run the statements on
+	"""
+	engine = get_engine()
+	with engine.begin() as connection:
+		if is_sqlite(engine):
+			yield connection
+			return
+		connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 0")
+		try:
+			yield connection
+		finally:
+			connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 1")
+
+def __getattr__(name):
+	# SNOOKER_ENGINE is kept for code that imported it from here, it is now created on first access
+	if name == "SNOOKER_ENGINE":
+		return get_engine()
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
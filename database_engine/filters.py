@@ -0,0 +1,43 @@
+"""
+Filters of the training data shared by the database reads, the training store and the model tuning. NumPy only, so
+they can be used without a database connection
+"""
+import numpy as np
+
+
+def minimum_games_fixed_point(p1_idx, p2_idx, player_mask, game_mask, minimum_games):
+	"""
+	Removes the players with fewer than the minimum number of games, and their games, until every remaining player
+	has the minimum number of games against the remaining players, as removing a player lowers their opponents' counts
+
+	Parameters
+	----------
+	p1_idx : np.Array
+		The player index of player one of each game
+	p2_idx : np.Array
+		The player index of player two of each game
+	player_mask : np.Array
+		Boolean mask of the players which may be kept
+	game_mask : np.Array
+		Boolean mask of the games which may be kept, only between players of player_mask
+	minimum_games : int
+		The minimum number of games each kept player must have
+
+	Returns
+	-------
+	player_mask : np.Array
+		Boolean mask of the players kept
+	game_mask : np.Array
+		Boolean mask of the games kept
+	total_games : np.Array
+		The number of games kept of each player
+	"""
+	n_players = len(player_mask)
+	while True:
+		total_games = (np.bincount(p1_idx[game_mask], minlength=n_players)
+			+ np.bincount(p2_idx[game_mask], minlength=n_players))
+		too_few_games = player_mask & (total_games < minimum_games)
+		if not too_few_games.any():
+			return player_mask, game_mask, total_games
+		player_mask = player_mask & ~too_few_games
+		game_mask = game_mask & player_mask[p1_idx] & player_mask[p2_idx]
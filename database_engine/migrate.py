@@ -0,0 +1,144 @@
+"""
+Module for the secondary indexes of the tables in the database
+
+The create functions create these indexes with their tables. migrate adds any that are missing to the tables of an
+existing database, along with the columns added to the tables since they were created, which the indexes may cover, and explain_hot_queries checks, with EXPLAIN, that the queries of the read functions use them
+"""
+import pandas as pd
+import sqlalchemy
+from .engine_config import get_engine, is_sqlite
+from .read import get_tables
+
+__all__ = ["migrate",
+	"explain_hot_queries"]
+
+# The secondary indexes of each table, as index name: indexed columns
+INDEXES = {"game": {"ix_game_date": "date, player_one_id, player_two_id",
+		"ix_game_player_one_date": "player_one_id, date",
+		"ix_game_player_two_date": "player_two_id, date"},
+	"rating": {"ix_rating_player": "player_id, rating, rating_variance"},
+	"player": {"ix_player_full_name": "full_name"},
+	"snookerorg_player": {"ix_snookerorg_player_full_name": "full_name"}}
+
+# The tables with a full_name column, the normalised name the player tables are joined on
+FULL_NAME_TABLES = ["player", "snookerorg_player"]
+
+# The columns added to the tables since they were first created, as column name: column type
+ADDED_COLUMNS = {"rating": {"rating_variance": "FLOAT"}}
+
+# The queries of the read functions which should use the indexes, with the indexes they should use
+HOT_QUERIES = {"last played (read_game_player_filtered)": ("""SELECT p.player_id, MAX(p.date) AS last_played
+		FROM (
+		SELECT player_one_id AS player_id, date FROM game
+		UNION
+		SELECT player_two_id AS player_id, date FROM game
+		) AS p
+		GROUP BY p.player_id""", ["ix_game_player_one_date", "ix_game_player_two_date"]),
+	"game date (read_game_player_filtered)": ("SELECT player_one_id, player_two_id FROM game WHERE date >= '2100-01-01'",
+		["ix_game_date"]),
+	"upcoming rating (get_upcoming_rating)": ("""SELECT l1.player_id, r1.rating
+		FROM upcoming_game
+		LEFT JOIN player_link AS l1 ON upcoming_game.player_one_id = l1.snookerorg_player_id
+		LEFT JOIN rating AS r1 ON l1.player_id = r1.player_id""", ["ix_rating_player"]),
+	"player name match (update_player_link)": ("""SELECT sp.player_id, p.player_id
+		FROM snookerorg_player AS sp
+		INNER JOIN player AS p ON sp.full_name = p.full_name""", ["ix_player_full_name"])}
+
+def full_name_column(storage = "STORED"):
+	"""
+	Get the definition of the full_name column of a player table
+
+	The column is generated by the database from the first and last names, lower cased, so it is always in step
+	with them and the player tables can be joined on it using an index
+
+	Parameters
+	----------
+	storage : {"STORED", "VIRTUAL"}, default "STORED"
+		Whether the column is stored or computed when read. sqlite can only add virtual generated columns to an
+		existing table
+
+	Returns
+	-------
+	column_definition : str
+		The column definition, for a CREATE TABLE or ALTER TABLE statement
+	"""
+	if is_sqlite():
+		# MySQL's || is a logical or, while sqlite has no built in CONCAT
+		full_name = "LOWER(first_name || ' ' || last_name)"
+	else:
+		full_name = "LOWER(CONCAT(first_name, ' ', last_name))"
+	return f"full_name VARCHAR(161) AS ({full_name}) {storage}"
+
+def create_index_statements(table_name, on_table_name = None):
+	"""
+	Get the statements creating the secondary indexes of a table
+
+	Parameters
+	----------
+	table_name : str
+		The name of the table
+	on_table_name : str, optional
+		The name of the table to create the indexes on, e.g. the shadow table the table is rebuilt in (see
+		swap.py). Defaults to the table
+
+	Returns
+	-------
+	index_statements : list of str
+		The CREATE INDEX statements, empty if the table has no secondary indexes
+	"""
+	on_table_name = table_name if on_table_name is None else on_table_name
+	return [f"CREATE INDEX {index_name} ON {on_table_name} ({columns})"
+		for index_name, columns in INDEXES.get(table_name, {}).items()]
+
+def migrate():
+	"""
+	Add the full_name columns, the other added columns and the secondary indexes which are missing from the tables in
+	an existing database. The columns are added first, as the indexes may cover them
+	"""
+	print("Adding the missing columns and indexes to the tables in the snooker database...")
+	inspector = sqlalchemy.inspect(get_engine())
+	tables = get_tables()
+	with get_engine().begin() as connection:
+		for table_name in FULL_NAME_TABLES:
+			if table_name in tables and "full_name" not in [column["name"] for column in inspector.get_columns(table_name)]:
+				storage = "VIRTUAL" if is_sqlite() else "STORED"
+				connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {full_name_column(storage)}")
+				print(f"Added the full_name column to the {table_name} table")
+		for table_name, columns in ADDED_COLUMNS.items():
+			if table_name not in tables:
+				continue
+			existing_columns = [column["name"] for column in inspector.get_columns(table_name)]
+			for column_name, column_type in columns.items():
+				if column_name not in existing_columns:
+					connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+					print(f"Added the {column_name} column to the {table_name} table")
+		for table_name, indexes in INDEXES.items():
+			if table_name not in tables:
+				continue
+			existing_indexes = [index["name"] for index in inspector.get_indexes(table_name)]
+			for index_name, columns in indexes.items():
+				if index_name not in existing_indexes:
+					connection.exec_driver_sql(f"CREATE INDEX {index_name} ON {table_name} ({columns})")
+					print(f"Added the {index_name} index to the {table_name} table")
+	print("The snooker database has been migrated!\n")
+
+def explain_hot_queries():
+	"""
+	Check that the hot queries of the read functions use the secondary indexes, from the query plans given by
+	EXPLAIN (EXPLAIN QUERY PLAN on sqlite)
+
+	Returns
+	-------
+	uses_indexes : dict of str:bool
+		Whether each hot query uses all the indexes it should
+	"""
+	explain = "EXPLAIN QUERY PLAN" if is_sqlite() else "EXPLAIN"
+	uses_indexes = {}
+	with get_engine().connect() as connection:
+		for query_name, (query, index_names) in HOT_QUERIES.items():
+			plan_df = pd.DataFrame(connection.exec_driver_sql(f"{explain} {query}").fetchall())
+			plan = plan_df.to_string()
+			uses_indexes[query_name] = all(index_name in plan for index_name in index_names)
+			print(f"{query_name}: {'uses' if uses_indexes[query_name] else 'does NOT use'} {', '.join(index_names)}")
+			print(plan_df)
+	return uses_indexes
@@ -5,9 +5,16 @@ This modules is used to retrieve information from the database. This can
 either be a full table from the database, a specific piece of information
 from the database
 """
+import numpy as np
 import pandas as pd
 import sqlalchemy
-from .engine_config import SNOOKER_ENGINE
+from .engine_config import get_engine
+from .cache import read_table
+from .schema import apply_schema
+from .filters import minimum_games_fixed_point
+
+# The number of rows in each chunk when streaming a table
+READ_CHUNKSIZE = 20000
 
 __all__ = ["read",
 	"read_raw_tournament",
@@ -16,14 +23,20 @@ __all__ = ["read",
 	"read_player",
 	"read_rating",
 	"read_game",
+	"read_game_after",
+	"iter_raw_game",
+	"iter_game",
+	"get_max_game_id",
+	"get_played_game_summary",
 	"read_game_player_filtered",
 	"read_snookerorg_player",
 	"read_upcoming_game",
+	"read_player_link",
 	"get_upcoming_rating",
 	"get_name_rating",
 	"get_tables"]
 
-def read(table_name):
+def read(table_name, fresh = False):
 	"""
 	Read a table from the database into a DataFrame
 
@@ -31,6 +44,8 @@ def read(table_name):
 	----------
 	table_name : str
 		The name of the table to read
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
 
 	Returns
 	-------
@@ -38,105 +53,260 @@ def read(table_name):
 		DataFrame representing the specified table
 	"""
 	if table_name == "raw_tournament":
-		return read_raw_tournament()
+		return read_raw_tournament(fresh = fresh)
 	elif table_name == "raw_game":
-		return read_raw_game()
+		return read_raw_game(fresh = fresh)
 	elif table_name == "tournament":
-		return read_tournament()
+		return read_tournament(fresh = fresh)
 	elif table_name == "player":
-		return read_player()
+		return read_player(fresh = fresh)
 	elif table_name == "game":
-		return read_game()
+		return read_game(fresh = fresh)
 	elif table_name == "rating":
-		return read_rating()
+		return read_rating(fresh = fresh)
 	elif table_name == "snookerorg_player":
-		return read_snookerorg_player()
+		return read_snookerorg_player(fresh = fresh)
 	elif table_name == "upcoming_game":
-		return read_upcoming_game()
+		return read_upcoming_game(fresh = fresh)
+	elif table_name == "player_link":
+		return read_player_link(fresh = fresh)
 	else:
 		print(f"Failed to read table. There is no table in the snooker database called {table_name}.\n")
 		return None
-def read_raw_tournament():
+def read_raw_tournament(fresh = False):
 	"""
 	Read the raw_tournament table from the database into a DataFrame
 
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	raw_tournament_df : pandas.DataFrame
 		DataFrame representing the raw tournament table.
 	"""
-	raw_tournament_df = pd.read_sql_table("raw_tournament", SNOOKER_ENGINE, index_col = "tournament_id")
+	raw_tournament_df = read_table("raw_tournament", "tournament_id", fresh = fresh)
 	return raw_tournament_df
 
-def read_raw_game(game_ids = None):
+def read_raw_game(game_ids = None, fresh = False):
 	"""
 	Read the raw_game table from the database into a DataFrame
 
+	Parameters
+	----------
+	game_ids : sequence of int, optional
+		The game IDs of the rows to read, which are always read from the database. Defaults to the whole table
+	fresh : bool, default False
+		Whether to read the whole table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	raw_game_df : pandas.DataFrame
 		DataFrame representing the raw games csv file.
 	"""
 	if game_ids is None:
-		raw_game_df = pd.read_sql_table("raw_game", SNOOKER_ENGINE, index_col = "game_id")
+		raw_game_df = read_table("raw_game", "game_id", fresh = fresh)
 	else:
 		if len(game_ids) == 1:
 			mysql_query = f"SELECT * FROM raw_game WHERE game_id = {game_ids[0]}"
-			raw_game_df = pd.read_sql_query(mysql_query, SNOOKER_ENGINE)
+			raw_game_df = pd.read_sql_query(mysql_query, get_engine())
 		else:
 			mysql_query = f"SELECT * FROM raw_game WHERE game_id = {tuple(game_ids)}"
-			raw_game_df = pd.read_sql_query(mysql_query, SNOOKER_ENGINE)
+			raw_game_df = pd.read_sql_query(mysql_query, get_engine())
+		raw_game_df = apply_schema(raw_game_df, "raw_game")
 	return raw_game_df
 
-def read_tournament():
+def read_tournament(fresh = False):
 	"""
 	Read the tournament table from the database into a DataFrame
 
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	tournament_df : pandas.DataFrame
 		DataFrame representing the tournaments table from the database
 	"""
 	date_columns = ['qualifying_start_date','qualifying_end_date','start_date','end_date']
-	tournament_df = pd.read_sql_table("tournament", SNOOKER_ENGINE, index_col = "tournament_id", parse_dates = date_columns)
+	tournament_df = read_table("tournament", "tournament_id", parse_dates = date_columns, fresh = fresh)
 	return tournament_df
 
-def read_player():
+def read_player(fresh = False):
 	"""
 	Read the players table from the database into a DataFrame
 
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	player_df : pandas.DataFrame
 		DataFrame representing the players table from the snooker database
 	"""
-	player_df = pd.read_sql_table("player", SNOOKER_ENGINE, index_col = "player_id")
+	player_df = read_table("player", "player_id", fresh = fresh)
+	# full_name is generated by the database from the first and last names, so it is not written back
+	player_df = player_df.drop(columns = ["full_name"], errors = "ignore")
 	return player_df
 
-def read_rating():
+def read_rating(fresh = False):
 	"""
 	Read the rating table from the database into a DataFrame
 s
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	rating_df : pandas.DataFrame
 		DataFrame representing the rating table from the snooker database
 	"""
-	rating_df = pd.read_sql_table("rating", SNOOKER_ENGINE, index_col = "player_id")
+	rating_df = read_table("rating", "player_id", fresh = fresh)
 	return rating_df
 
-def read_game():
+def read_game(fresh = False):
 	"""
 	Read the game table from the database into a DataFrame
 
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	game_df : pandas.DataFrame
 		DataFrame representing the game table from the database
 	"""
-	game_df = pd.read_sql_table("game", SNOOKER_ENGINE, index_col = "game_id", parse_dates = ["date"])
+	game_df = read_table("game", "game_id", parse_dates = ["date"], fresh = fresh)
+	return game_df
+
+def iter_table(table_name, index_col, parse_dates = None, chunksize = READ_CHUNKSIZE):
+	"""
+	Stream a table from the database in chunks
+
+	The rows are fetched over a server-side cursor, so only one chunk is held in memory at a time, rather than the
+	whole table
+
+	Parameters
+	----------
+	table_name : str
+		The name of the table
+	index_col : str
+		The column to use as the index
+	parse_dates : list of str, optional
+		The columns to parse as dates
+	chunksize : int, default READ_CHUNKSIZE
+		The number of rows in each chunk
+
+	Yields
+	------
+	chunk_df : pandas.DataFrame
+		DataFrame containing the next rows of the table, with the dtypes of the table's schema (see schema.py)
+	"""
+	with get_engine().connect().execution_options(stream_results = True) as connection:
+		for chunk_df in pd.read_sql_query(f"SELECT * FROM {table_name}", connection, index_col = index_col,
+			parse_dates = parse_dates, chunksize = chunksize):
+			yield apply_schema(chunk_df, table_name)
+
+def iter_raw_game(chunksize = READ_CHUNKSIZE):
+	"""
+	Stream the raw_game table from the database in chunks, see iter_table
+
+	Parameters
+	----------
+	chunksize : int, default READ_CHUNKSIZE
+		The number of rows in each chunk
+
+	Yields
+	------
+	raw_game_df : pandas.DataFrame
+		DataFrame containing the next rows of the raw_game table
+	"""
+	yield from iter_table("raw_game", "game_id", chunksize = chunksize)
+
+def iter_game(chunksize = READ_CHUNKSIZE):
+	"""
+	Stream the game table from the database in chunks, see iter_table
+
+	Parameters
+	----------
+	chunksize : int, default READ_CHUNKSIZE
+		The number of rows in each chunk
+
+	Yields
+	------
+	game_df : pandas.DataFrame
+		DataFrame containing the next rows of the game table
+	"""
+	yield from iter_table("game", "game_id", parse_dates = ["date"], chunksize = chunksize)
+
+def read_game_after(game_id):
+	"""
+	Read the games with a game ID greater than a certain game ID from the database into a DataFrame
+
+	Parameters
+	----------
+	game_id : int
+		The game ID after which to read the games
+
+	Returns
+	-------
+	game_df : pandas.DataFrame
+		DataFrame containing the games from the game table with a larger game ID, in game ID order
+	"""
+	mysql_query = f"SELECT * FROM game WHERE game_id > {int(game_id)} ORDER BY game_id"
+	game_df = pd.read_sql_query(mysql_query, get_engine(), index_col = "game_id", parse_dates = ["date"])
+	game_df = apply_schema(game_df, "game")
 	return game_df
 
+def get_max_game_id():
+	"""
+	Get the largest game ID in the game table
+
+	Returns
+	-------
+	max_game_id : int
+		The largest game ID in the game table, or 0 if the table is empty
+	"""
+	max_game_id = pd.read_sql_query("SELECT MAX(game_id) AS max_game_id FROM game", get_engine()).iloc[0, 0]
+	if pd.isnull(max_game_id):
+		return 0
+	return int(max_game_id)
+
+def get_played_game_summary(watermark_game_id):
+	"""
+	Get the number of played games, those with a date and a result, with a game ID up to a watermark, and the sum of
+	the CRC32 checksums of their 'game_id|player_one_id|player_two_id|player_one_frames|player_two_frames', computed
+	by the database. Used to check the model's training store still holds the same games as the game table
+
+	Parameters
+	----------
+	watermark_game_id : int
+		The largest game ID to include
+
+	Returns
+	-------
+	summary : dict
+		The 'row_count' and 'checksum' of the played games, the checksum 0 if there are none
+	"""
+	mysql_query = f"""SELECT COUNT(*), SUM(CRC32(CONCAT_WS('|', game_id, player_one_id, player_two_id,
+					player_one_frames, player_two_frames)))
+					FROM game
+					WHERE game_id <= {int(watermark_game_id)} AND date IS NOT NULL
+					AND player_one_frames IS NOT NULL AND player_two_frames IS NOT NULL"""
+	with get_engine().connect() as connection:
+		row_count, checksum = connection.exec_driver_sql(mysql_query).fetchone()
+	return {"row_count": int(row_count), "checksum": 0 if checksum is None else int(checksum)}
+
 def read_game_player_filtered(last_played_filter = "2010-01-01", game_date_filter = "2010-01-01", minimum_games_filter = 10):
 	"""
 	Read the game and player table from the database into a DataFrame and filters the tables in the database for certain conditions
@@ -144,10 +314,12 @@ def read_game_player_filtered(last_played_filter = "2010-01-01", game_date_filte
 	This function reads the game and player table from the snooker database and filters them for certain conditions.
 	The players which appear in the player DataFrame that is returned:
 		- Have played more recently than a certain date
-		- Have played more than a certain number of games after a certain date
+		- Have played at least a certain number of games after a certain date, against the other returned players
 	The games which appear in the game DataFrame that is returned:
 		- Include two players which satisfy the recency and number of games conditions
 		- Occur after a certain date
+	The filtering is done by the database and on the player IDs of the games, so only the returned games are read in
+	full. The number of games condition is applied until no more players are removed (see filters.minimum_games_fixed_point)
 
 	Parameters
 	----------
@@ -161,9 +333,10 @@ def read_game_player_filtered(last_played_filter = "2010-01-01", game_date_filte
 	Returns
 	-------
 	filtered_player_df : pandas.DataFrame
-		DataFrame containing the player table from the database with the 3 filters applied
+		DataFrame containing the player table from the database with the 3 filters applied, with the 'last_played'
+		date and 'total_games' of each player
 	filtered_game_df : pandas.DataFrame
-		DataFrame containing the game table from the database with the 3 filters applied
+		DataFrame containing the game table from the database with the 3 filters applied, indexed by game ID
 	"""
 	# Get all the players that last played a game on/after a certain date
 	mysql_player_query = f"""SELECT p.player_id AS 'player_id', MAX(p.date) AS 'last_played'
@@ -176,75 +349,121 @@ def read_game_player_filtered(last_played_filter = "2010-01-01", game_date_filte
 							) AS p
 							GROUP BY p.player_id
 							HAVING last_played >= '{last_played_filter}'"""
-	last_played_filtered_player_df = pd.read_sql_query(mysql_player_query, SNOOKER_ENGINE, index_col = "player_id", parse_dates = ["last_played"])
-	# Get all the games that occured on/after a certain date
-	mysql_game_query = f"SELECT * FROM game WHERE date >= '{game_date_filter}'"
-	game_date_filtered_game_df = pd.read_sql_query(mysql_game_query, SNOOKER_ENGINE, index_col = "game_id", parse_dates = ["date"])
-	# Only keep the games which are played by two players that appear in the last played filtered DataFrame
-	lp_gd_filtered_df = generic_game_filter(last_played_filtered_player_df, game_date_filtered_game_df)
-	# Add a total_games column to player DataFrame and 
-	filtered_player_df, filtered_game_df = total_games_filter(last_played_filtered_player_df, lp_gd_filtered_df, minimum_games_filter)
+	# Get the players of the games that occured on/after a certain date, which is covered by the ix_game_date index
+	mysql_game_player_query = f"SELECT player_one_id, player_two_id FROM game WHERE date >= '{game_date_filter}'"
+	mysql_game_query = sqlalchemy.text(f"""SELECT * FROM game
+							WHERE date >= '{game_date_filter}'
+							AND player_one_id IN :player_ids
+							AND player_two_id IN :player_ids
+							ORDER BY game_id""").bindparams(sqlalchemy.bindparam("player_ids", expanding = True))
+	with get_engine().connect() as connection:
+		last_played_filtered_player_df = pd.read_sql_query(mysql_player_query, connection, index_col = "player_id", parse_dates = ["last_played"])
+		game_player_ids = pd.read_sql_query(mysql_game_player_query, connection).to_numpy(dtype = np.int64)
+		# Only keep the players who have played enough games against the other players who are kept
+		player_one_idx = last_played_filtered_player_df.index.get_indexer(game_player_ids[:,0])
+		player_two_idx = last_played_filtered_player_df.index.get_indexer(game_player_ids[:,1])
+		player_mask, _, total_games = minimum_games_fixed_point(player_one_idx, player_two_idx,
+			np.ones(len(last_played_filtered_player_df), dtype = bool), (player_one_idx >= 0) & (player_two_idx >= 0),
+			minimum_games_filter)
+		filtered_player_df = last_played_filtered_player_df.loc[player_mask,:].assign(total_games = total_games[player_mask])
+		# Only the games between two of the players are read
+		filtered_game_df = pd.read_sql_query(mysql_game_query, connection, index_col = "game_id", parse_dates = ["date"],
+			params = {"player_ids": filtered_player_df.index.tolist()})
+	filtered_player_df = apply_schema(filtered_player_df, "player")
+	filtered_game_df = apply_schema(filtered_game_df, "game")
 	return filtered_player_df, filtered_game_df
 
-def read_snookerorg_player():
+def read_snookerorg_player(fresh = False):
 	"""
 	Read the snookerorg_player table from the database into a DataFrame
 
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	snookerorg_player_df : pandas.DataFrame
 		DataFrame representing the snookerorg_player table from the database
 	"""
-	snookerorg_player_df = pd.read_sql_table("snookerorg_player", SNOOKER_ENGINE, index_col = "player_id")
+	snookerorg_player_df = read_table("snookerorg_player", "player_id", fresh = fresh)
+	snookerorg_player_df = snookerorg_player_df.drop(columns = ["full_name"], errors = "ignore")
 	return snookerorg_player_df
 
-def read_upcoming_game():
+def read_upcoming_game(fresh = False):
 	"""
 	Read the upcoming_game table from the database into a DataFrame
 
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
 	Returns
 	-------
 	upcoming_game_df : pandas.DataFrame
 		DataFrame representing the upcoming_game table from the database
 	"""
-	upcoming_game_df = pd.read_sql_table("upcoming_game", SNOOKER_ENGINE)
+	upcoming_game_df = read_table("upcoming_game", "game_id", fresh = fresh).reset_index()
 	return upcoming_game_df
 
+def read_player_link(fresh = False):
+	"""
+	Read the player_link table from the database into a DataFrame
+
+	Parameters
+	----------
+	fresh : bool, default False
+		Whether to read the table straight from the database, rather than from the local cache (see cache.py)
+
+	Returns
+	-------
+	player_link_df : pandas.DataFrame
+		DataFrame representing the player_link table from the database, the CueTracker 'player_id' of each
+		snooker.org player
+	"""
+	player_link_df = read_table("player_link", "snookerorg_player_id", fresh = fresh)
+	return player_link_df
+
 def get_upcoming_rating():
 	"""
 	Get a table with the upcoming games and the ratings for the players in the
 	upcoming games
 
+	The snooker.org players of the upcoming games are matched to their CueTracker player IDs through the player_link
+	table, so every join is on an integer key
+
 	Returns
 	-------
 	upcoming_rating_df : pandas.DataFrame
 	"""
 	mysql_query ="""SELECT date,
 					CONCAT(sp1.first_name, ' ', sp1.last_name) AS 'player_one_name',
-					p1.player_id AS 'player_one_id',
+					l1.player_id AS 'player_one_id',
 					r1.rating AS 'player_one_rating',
+					r1.rating_variance AS 'player_one_rating_variance',
 					CONCAT(sp2.first_name,' ', sp2.last_name) AS 'player_two_name',
-					p2.player_id AS 'player_two_id',
+					l2.player_id AS 'player_two_id',
 					r2.rating AS 'player_two_rating',
+					r2.rating_variance AS 'player_two_rating_variance',
 					best_of
 					FROM upcoming_game
 					LEFT JOIN snookerorg_player AS sp1
 					ON upcoming_game.player_one_id = sp1.player_id
 					LEFT JOIN snookerorg_player AS sp2
 					ON upcoming_game.player_two_id = sp2.player_id
-					LEFT JOIN player AS p1
-					ON CONCAT(sp1.first_name,' ', sp1.last_name)
-					= CONCAT(p1.first_name, ' ', p1.last_name)
-					LEFT JOIN player AS p2
-					ON CONCAT(sp2.first_name,' ', sp2.last_name)
-					= CONCAT(p2.first_name, ' ', p2.last_name)
+					LEFT JOIN player_link AS l1
+					ON upcoming_game.player_one_id = l1.snookerorg_player_id
+					LEFT JOIN player_link AS l2
+					ON upcoming_game.player_two_id = l2.snookerorg_player_id
 					LEFT JOIN rating AS r1
-					ON p1.player_id = r1.player_id
+					ON l1.player_id = r1.player_id
 					LEFT JOIN rating AS r2
-					ON p2.player_id = r2.player_id
+					ON l2.player_id = r2.player_id
 					ORDER BY upcoming_game.game_id ASC
 					"""
-	upcoming_rating_df = pd.read_sql_query(mysql_query, SNOOKER_ENGINE)
+	upcoming_rating_df = pd.read_sql_query(mysql_query, get_engine())
 	return upcoming_rating_df
 
 def get_name_rating():
@@ -261,7 +480,7 @@ def get_name_rating():
 					rating.rating
 					FROM player
 					LEFT JOIN rating ON player.player_id = rating.player_id"""
-	player_rating_dict = pd.read_sql_query(mysql_query, SNOOKER_ENGINE)
+	player_rating_dict = pd.read_sql_query(mysql_query, get_engine())
 	return player_rating_dict
 
 def get_tables():
@@ -274,101 +493,5 @@ def get_tables():
 		A list where each element is the name of a table in the snooker database
 	"""
 	metadata_obj = sqlalchemy.MetaData()
-	metadata_obj.reflect(bind=SNOOKER_ENGINE)
+	metadata_obj.reflect(bind=get_engine())
 	return list(metadata_obj.tables.keys())
-
-def generic_game_filter(filtered_player_df, game_df):
-	"""
-	Returns games where both players appear in the filtered players DataFrame
-
-	This function is used to remove games from a game DataFrame where the players involved do not appear in the
-	player DataFrame that is passed as an argument. 
-	For example, if the player DataFrame that is passed as an arugment only contains players who last played after 2010, 
-	then this function would return a DataFrame containing games where both players last played after 2010.
-	If one player last played after 2010 and one did not, then it would not include that game.
-	Additionally, games where both players last played before 2010 would also not be included
-
-	Parameters
-	----------
-	filtered_player_df : pandas.DataFrame
-		DataFrame containing the players table from the database after some filter condition has been applied
-		which removes some players
-	game_df : pandas.DataFrame
-		DataFrame containing the games table from the database
-
-	Returns
-	-------
-	games_db_filtered_df : pandas.DataFrame
-		DataFrame containing games where both players in the game appear in 'filtered_player_df' 
-	"""
-	# Make "Player ID" a column
-	players_merger = filtered_player_df.reset_index()
-	# Perform an inner join so only games where Player 1 appears in the players DataFrame remain
-	m1 = pd.merge(game_df, players_merger.loc[:,"player_id"], how = "inner", left_on = "player_one_id", right_on = "player_id")
-	m1.drop(columns = ["player_id"], inplace = True)
-	# Perform an inner join so only games where Player 2 appears in the players DataFrame remain
-	games_db_filtered_df = pd.merge(m1, players_merger.loc[:,"player_id"], how = "inner", left_on = "player_two_id", right_on = "player_id")
-	games_db_filtered_df.drop(columns = ["player_id"], inplace = True)
-	return games_db_filtered_df
-
-def total_games_filter(player_df, game_df, minimum_games_filter):
-	"""
-	Returns the players and games after the minimum game filter has been applied
-
-	This function takes DataFrame containing players and games as arguments. It then removes the players who have
-	played in under 'min_games' games and removes games which involve one or more players who have played in
-	under 'min_games' games.
-	Note that the number of games is based on the games DataFrame that is passed as an argument. This DataFrame
-	may already be filtered so that it does not include games before a certain date. In a case like this, players
-	who played ages ago would get filtered out from this function, as non of there games would be in the games
-	DataFrame that is passed as an argument
-
-	Parameters 
-	----------
-	player_df : pandas.DataFrame
-		DataFrame containing the players table from the database
-	game_df : pandas.DataFrame
-		DataFrame containing the games table from the database
-	minimum_games_filter : int
-		The minimum number of games a player must play to be included in the players and games DataFrames that are
-		returnd
-
-	Returns
-	-------
-	players_db_filtered_df : pandas.DataFrame
-		DataFrame containing the players table from the database. Players who
-		have played in less than 'min_games' are not included
-	games_db_filtered_df : pandas.DataFrame
-		DataFrame containing the games table from the database,
-		Only games where both players played in more than 'min_games' are included
-	"""
-	# Add the "Total games" to the players DataFrame
-	total_games_series = get_total_games(game_df)
-	player_df_w_total_games = pd.merge(player_df, total_games_series, how = "left", left_index = True, right_index = True)
-	# Boolean Series that is True at indexes where players have played less than 'min_games' games
-	not_enough_games_mask = (player_df_w_total_games.loc[:,"total_games"] < minimum_games_filter)
-	# Drop players who have not played enough games
-	players_db_filtered_df = player_df_w_total_games.drop(player_df_w_total_games.loc[not_enough_games_mask,:].index)
-	games_db_filtered_df = generic_game_filter(players_db_filtered_df, game_df)
-	return players_db_filtered_df, games_db_filtered_df
-
-def get_total_games(game_df):
-	"""
-	Get a Series containing the total number of games each player has played
-
-	Parameters
-	----------
-	game_df : pandas.DataFrame
-		DataFrame containing game data
-
-	Returns
-	-------
-	total_games_series : pandas.Series
-		Series containing the total number of games each player has played
-	"""
-	games_player_ids = pd.concat([game_df.loc[:,"player_one_id"], game_df.loc[:,"player_two_id"]], axis = 0)
-	total_games_series = games_player_ids.value_counts()
-	total_games_series.name = "total_games"
-	total_games_series.index.name = "player_id"
-	return total_games_series
-
@@ -10,6 +10,7 @@ from .create import *
 from .read import *
 from .drop import *
 from. write import to_database
+from .update.snookerorg_update import update_player_link
 
 __all__ = ["raw_refresh",
 "tournament_refresh",
@@ -54,14 +55,19 @@ def player_refresh():
 	This function refreshes the player table in the database. It reads the raw_game table from the database and converts
 	it into the nicely formatted player table.
 	If there is a player table present, this function will delete that table and replace it with a new one and if there is
-	no player table present, this function will simply create a new player table.
+	no player table present, this function will simply create a new player table. The players already in the table keep
+	their player IDs, matched by URL, so the rating table, the model's training store and the other data keyed on the
+	player IDs still refer to the same players
 	In order for this function to work propertly, the raw_game table in the database should be updated to contain the latest raw
 	data on the games
 	"""
 	print("Refreshing the player table in the snooker database...")
-	raw_game_df = read_raw_game()
-	player_df = player_transform.raw_game_to_player_transform(raw_game_df)
+	existing_player_df = read_player(fresh = True) if "player" in get_tables() else None
+	# The raw games are streamed in chunks, so the whole raw_game table is never held in memory
+	player_df = player_transform.raw_game_chunks_to_player_transform(iter_raw_game(), existing_player_df)
 	create_player_table(player_df)
+	# The refreshed players may have new names and URLs, so the links to the snooker.org players are rebuilt
+	update_player_link(rebuild = True)
 	print("Player table refresh complete!\n")
 
 def game_refresh():
@@ -77,21 +83,22 @@ def game_refresh():
 	the lastest information in the raw game and tournament tables.
 	"""
 	print("Refreshing the game table in the snooker database...")
-	raw_game_df = read_raw_game()
 	tournament_df = read_tournament()
 	player_df = read_player()
-	game_df = game_transform.raw_game_transform(raw_game_df, tournament_df, player_df)
-	create_game_table(game_df)
+	# Each chunk of raw games is transformed and written before the next is read
+	game_chunks = game_transform.raw_game_chunks_transform(iter_raw_game(), tournament_df, player_df)
+	create_game_table(game_chunks)
 	print("Game table refresh complete!\n")
 
 def full_refresh():
 	"""
 	Do a refresh of the database
 
-	This function 
+	This function redownloads the raw data from CueTracker and rebuilds the tournament, player and game tables from it.
+	Each table is rebuilt in a shadow table which then replaces it in one step (see swap.py), so the database can be
+	read, e.g. to price the upcoming games, while it is refreshed
 	"""
 	print("---- PERFORMING A FULL REFRESH OF THE SNOOKER DATABASE ----")
-	drop_all()
 	raw_refresh()
 	tournament_refresh()
 	player_refresh()
@@ -104,12 +111,12 @@ def half_refresh():
 
 	This function refreshes the tournament, player and game table in the database. It reads the raw_game and
 	raw_tournament tables and converts them into the formatted tables.
-	If any of the three tables are present, this function will delete the current table and replace it with a new one.
+	If any of the three tables are present, this function will replace the current table with a new one, which is
+	swapped in once it is complete (see swap.py).
 	In order for this function to work properly, the raw_game and raw_tournament table should be updated to contain
 	the latest raw data on the games and tournaments. 
 	"""
 	print("---- REFRESHING THE FORMATTED TABLES IN THE SNOOKER DATABASE ----\n")
-	drop_all_formatted()
 	tournament_refresh()
 	player_refresh()
 	game_refresh()
@@ -0,0 +1,119 @@
+"""
+Module for the schema of the tables in the database, the pandas dtypes their columns are read as
+
+pandas reads every integer column as int64, or float64 if it has a NULL, and every text column as Python strings.
+The read functions give the columns compact dtypes instead:
+	- IDs are int32
+	- frames and best_of are int8/int16, nullable (Int8/Int16) in the raw tables, whose rows may have no result
+	- text columns with few distinct values, e.g. rounds, names and URLs, are categorical
+	- dates are datetime64, which the local cache (see cache.py) keeps, so they are not parsed again
+which makes the raw_game table several times smaller, and speeds up the merges and groupbys on these columns
+"""
+import numpy as np
+import pandas as pd
+
+__all__ = ["apply_schema"]
+
+# The dtype of the index and columns of each table. Columns which are not listed keep the dtype pandas reads them as
+TABLE_SCHEMAS = {"raw_tournament": {"tournament_id": "int32",
+		"season": "category",
+		"type": "category",
+		"location": "category"},
+	"raw_game": {"game_id": "int32",
+		"round": "category",
+		"player_one_name": "category",
+		"player_two_name": "category",
+		"player_one_frames": "Int8",
+		"player_two_frames": "Int8",
+		"best_of": "Int16",
+		"player_one_url": "category",
+		"player_two_url": "category",
+		"tournament_name": "category",
+		"tournament_season": "category",
+		"tournament_url": "category"},
+	"tournament": {"tournament_id": "int32",
+		"season": "category",
+		"type": "category",
+		"qualifying_start_date": "datetime64[ns]",
+		"qualifying_end_date": "datetime64[ns]",
+		"start_date": "datetime64[ns]",
+		"end_date": "datetime64[ns]",
+		"country": "category",
+		"city": "category",
+		"prize_fund_gbp": "Int32"},
+	"player": {"player_id": "int32"},
+	"game": {"game_id": "int32",
+		"date": "datetime64[ns]",
+		"tournament_id": "int32",
+		"round": "category",
+		"player_one_id": "int32",
+		"player_two_id": "int32",
+		"player_one_frames": "int8",
+		"player_two_frames": "int8",
+		"best_of": "int16"},
+	"rating": {"player_id": "int32"},
+	"snookerorg_player": {"player_id": "int32",
+		"nationality": "category"},
+	"upcoming_game": {"game_id": "int32",
+		"player_one_id": "Int32",
+		"player_two_id": "Int32",
+		"best_of": "Int16"},
+	"player_link": {"snookerorg_player_id": "int32",
+		"player_id": "int32"}}
+
+def to_schema_dtype(column, dtype):
+	"""
+	Convert a column to the dtype of the table's schema
+
+	An integer column is given the nullable version of its dtype if it has any NULLs, and text, which the columns of
+	the raw tables are as scraped, is converted to numbers first, with any text which is not a number becoming NULL
+
+	Parameters
+	----------
+	column : pandas.Series or pandas.Index
+		The column
+	dtype : str
+		The dtype of the column in the schema
+
+	Returns
+	-------
+	column : pandas.Series or pandas.Index
+		The column with the dtype of the schema, or the column as it was if its values do not fit in an integer
+		dtype, rather than the values overflowing
+	"""
+	if column.dtype == dtype:
+		return column
+	if pd.api.types.is_integer_dtype(dtype):
+		if pd.api.types.is_object_dtype(column.dtype):
+			column = pd.to_numeric(column, errors = "coerce")
+		dtype_info = np.iinfo(dtype.lower())
+		if len(column) > 0 and (column.min() < dtype_info.min or column.max() > dtype_info.max):
+			return column
+		if column.hasnans:
+			dtype = dtype.capitalize()
+	return column.astype(dtype)
+
+def apply_schema(table_df, table_name):
+	"""
+	Give the index and columns of a DataFrame read from a table the dtypes of the table's schema
+
+	Parameters
+	----------
+	table_df : pandas.DataFrame
+		DataFrame read from the table, with all or some of its columns
+	table_name : str
+		The name of the table
+
+	Returns
+	-------
+	table_df : pandas.DataFrame
+		The DataFrame with the dtypes of the schema, the same DataFrame if it already has them
+	"""
+	schema = TABLE_SCHEMAS.get(table_name, {})
+	columns = {column: to_schema_dtype(table_df[column], dtype) for column, dtype in schema.items()
+		if column in table_df.columns and table_df[column].dtype != dtype}
+	if columns:
+		table_df = table_df.assign(**columns)
+	if table_df.index.name in schema:
+		table_df = table_df.set_axis(to_schema_dtype(table_df.index, schema[table_df.index.name]), axis = 0)
+	return table_df
@@ -0,0 +1,180 @@
+"""
+Module for publishing rebuilt tables with an atomic swap
+
+A table which is rebuilt, by the create functions or replace_in_database, is written to a shadow table next to it,
+which replaces the table in one step once it is complete. Readers, e.g. get_upcoming_rating while the ratings are
+published, see the old table until the swap and the new table after it, never a missing or partly written table:
+	- on MySQL the tables are swapped with a single RENAME TABLE statement, which is atomic. InnoDB moves the foreign
+	  keys of the tables referencing the table to the old table with it, so they are then created again on the new
+	  table before the old table is dropped
+	- on sqlite the old table is dropped and the shadow table renamed in the writer's transaction, which readers do
+	  not see until it is committed
+"""
+import re
+
+import sqlalchemy
+from .engine_config import is_sqlite
+from .cache import invalidate
+from .migrate import create_index_statements
+
+# The suffixes of the shadow table a table is rebuilt in, and of the old table while it is swapped out
+SHADOW_SUFFIX = "_shadow"
+OLD_SUFFIX = "_old"
+
+def get_shadow_table_name(table_name):
+	"""
+	Get the name of the shadow table a table is rebuilt in
+	"""
+	return f"{table_name}{SHADOW_SUFFIX}"
+
+def shadow_create_statement(table_create_statement, table_name):
+	"""
+	Get the statement creating the shadow table of a table, from the statement creating the table
+
+	The foreign key constraints are left unnamed, as MySQL constraint names are unique across the database, so the
+	shadow table cannot reuse the names of the table's constraints. MySQL names them after the shadow table, and
+	renames them with it when it is swapped in
+
+	Parameters
+	----------
+	table_create_statement : str
+		The MySQL statement to create the table
+	table_name : str
+		The name of the table
+
+	Returns
+	-------
+	shadow_create_statement : str
+		The MySQL statement to create the shadow table
+	"""
+	statement = re.sub(rf"CREATE TABLE {table_name}\b", f"CREATE TABLE {get_shadow_table_name(table_name)}",
+		table_create_statement, count = 1)
+	return re.sub(r"CONSTRAINT\s+\w+\s+FOREIGN KEY", "FOREIGN KEY", statement)
+
+def rename_shadow_indexes(table_name, on_table_name, connection):
+	"""
+	Rename the indexes named after the shadow table of a table, e.g. the index pandas.DataFrame.to_sql creates on
+	the index of a DataFrame, to be named after the table
+
+	Parameters
+	----------
+	table_name : str
+		The name of the table
+	on_table_name : str
+		The name of the table the indexes are on, the shadow table before it is swapped in on MySQL, where index
+		names are unique within a table, or the table after the swap on sqlite, where they are unique across the
+		database
+	connection : sqlalchemy.engine.Connection
+		The connection the shadow table was written on
+	"""
+	shadow_table_name = get_shadow_table_name(table_name)
+	if is_sqlite():
+		# sqlite cannot rename an index, so it is created again under the new name
+		index_rows = connection.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+			(on_table_name,)).fetchall()
+		for index_name, index_statement in index_rows:
+			if index_statement is not None and shadow_table_name in index_name:
+				connection.exec_driver_sql(f"DROP INDEX {index_name}")
+				connection.exec_driver_sql(index_statement.replace(index_name, index_name.replace(shadow_table_name, table_name), 1))
+	else:
+		for index in sqlalchemy.inspect(connection).get_indexes(on_table_name):
+			if shadow_table_name in index["name"]:
+				connection.exec_driver_sql(f"ALTER TABLE {on_table_name} RENAME INDEX {index['name']} TO "
+					f"{index['name'].replace(shadow_table_name, table_name)}")
+
+def get_referencing_foreign_keys(table_name, connection):
+	"""
+	Get the foreign keys of the other tables which reference a table
+
+	Parameters
+	----------
+	table_name : str
+		The name of the table
+	connection : sqlalchemy.engine.Connection
+		The connection to inspect the tables on
+
+	Returns
+	-------
+	foreign_keys : list of (str, dict)
+		The name of each referencing table, and the foreign key as returned by sqlalchemy's Inspector.get_foreign_keys
+	"""
+	inspector = sqlalchemy.inspect(connection)
+	skipped_table_names = {table_name, get_shadow_table_name(table_name), f"{table_name}{OLD_SUFFIX}"}
+	return [(referencing_table_name, foreign_key) for referencing_table_name in inspector.get_table_names()
+		if referencing_table_name not in skipped_table_names
+		for foreign_key in inspector.get_foreign_keys(referencing_table_name)
+		if foreign_key["referred_table"] == table_name]
+
+def recreate_foreign_key(referencing_table_name, foreign_key, table_name, connection):
+	"""
+	Create a foreign key again under its name, referencing a table by name, e.g. the table swapped in for the table
+	it referenced. Without the foreign key checks the existing rows are not checked, so only the definition changes
+
+	Parameters
+	----------
+	referencing_table_name : str
+		The name of the table the foreign key is on
+	foreign_key : dict
+		The foreign key, as returned by sqlalchemy's Inspector.get_foreign_keys
+	table_name : str
+		The name of the table referenced
+	connection : sqlalchemy.engine.Connection
+		The connection, on which the foreign key checks are disabled
+	"""
+	quote = connection.dialect.identifier_preparer.quote
+	constrained_columns = ", ".join(quote(column) for column in foreign_key["constrained_columns"])
+	referred_columns = ", ".join(quote(column) for column in foreign_key["referred_columns"])
+	options = foreign_key.get("options", {})
+	actions = "".join(f" ON {action.upper()} {options[f'on{action}']}" for action in ["delete", "update"]
+		if options.get(f"on{action}"))
+	connection.exec_driver_sql(f"ALTER TABLE {quote(referencing_table_name)} DROP FOREIGN KEY {quote(foreign_key['name'])}")
+	connection.exec_driver_sql(f"""ALTER TABLE {quote(referencing_table_name)} ADD CONSTRAINT {quote(foreign_key['name'])}
+								FOREIGN KEY ({constrained_columns}) REFERENCES {quote(table_name)} ({referred_columns}){actions}""")
+
+def swap_shadow_table(table_name, connection):
+	"""
+	Replace a table with its shadow table, creating the secondary indexes of the table on it
+
+	The tables which reference the table by a foreign key reference the new table once it is swapped in: on sqlite
+	the references are by name, and on MySQL, where RENAME TABLE moves them to the old table, they are created again
+	on the new table. Must be called on a connection with the foreign key checks disabled (see
+	engine_config.foreign_key_checks_disabled), in the transaction the shadow table was written in. MySQL commits
+	the transaction at each statement changing a table, so only the swap itself is atomic there
+
+	Parameters
+	----------
+	table_name : str
+		The name of the table
+	connection : sqlalchemy.engine.Connection
+		The connection the shadow table was written on
+	"""
+	shadow_table_name = get_shadow_table_name(table_name)
+	old_table_name = f"{table_name}{OLD_SUFFIX}"
+	table_exists = table_name in sqlalchemy.inspect(connection).get_table_names()
+	if is_sqlite():
+		# Index names are unique across a sqlite database, so the indexes are created once the table they were on
+		# is dropped. The legacy behaviour of ALTER TABLE leaves the references of other tables to the names alone
+		connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+		if table_exists:
+			connection.exec_driver_sql(f"DROP TABLE {table_name}")
+		connection.exec_driver_sql(f"ALTER TABLE {shadow_table_name} RENAME TO {table_name}")
+		connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+		rename_shadow_indexes(table_name, table_name, connection)
+		for index_statement in create_index_statements(table_name):
+			connection.exec_driver_sql(index_statement)
+	else:
+		# The indexes are built while the old table is still being read
+		rename_shadow_indexes(table_name, shadow_table_name, connection)
+		for index_statement in create_index_statements(table_name, on_table_name = shadow_table_name):
+			connection.exec_driver_sql(index_statement)
+		connection.exec_driver_sql(f"DROP TABLE IF EXISTS {old_table_name}")
+		if table_exists:
+			referencing_foreign_keys = get_referencing_foreign_keys(table_name, connection)
+			connection.exec_driver_sql(f"RENAME TABLE {table_name} TO {old_table_name}, {shadow_table_name} TO {table_name}")
+			# InnoDB renamed the references to the table with it, so they are pointed at the new table
+			for referencing_table_name, foreign_key in referencing_foreign_keys:
+				recreate_foreign_key(referencing_table_name, foreign_key, table_name, connection)
+			connection.exec_driver_sql(f"DROP TABLE {old_table_name}")
+		else:
+			connection.exec_driver_sql(f"RENAME TABLE {shadow_table_name} TO {table_name}")
+	invalidate(table_name)
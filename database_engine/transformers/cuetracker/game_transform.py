@@ -402,8 +402,31 @@ def raw_game_transform(raw_game_df, tournament_df, player_df):
 		raise IndexError("""There was a problem transforming the raw games DataFrame into database format.
 		The length of the new DataFrame does not game the length of the raw games DataFrame.""")
 
+def raw_game_chunks_transform(raw_game_chunks, tournament_df, player_df):
+	"""
+	Transform chunks of raw games into the database format, one chunk at a time
 
+	Each game is transformed on its own, given the tournament and player tables, so the chunks of the raw_game
+	table streamed by read.iter_raw_game can be transformed and written without holding the whole table in memory
 
+	Parameters
+	----------
+	raw_game_chunks : iterable of pandas.DataFrame
+		The chunks of game data in the raw format
+	tournament_df : pandas.DataFrame
+		DataFrame representing the tournament table from the database
+	player_df : pandas.DataFrame
+		DataFrame representing the player table for the database
 
+	Yields
+	------
+	game_df : pandas.DataFrame
+		DataFrame with the game data of the next chunk in database format
 
-
+	See Also
+	--------
+	raw_game_transform(raw_game_df, tournament_df, player_df) : Transform a DataFrame containing games into the
+	database format
+	"""
+	for raw_game_df in raw_game_chunks:
+		yield raw_game_transform(raw_game_df, tournament_df, player_df)
@@ -4,6 +4,7 @@ This module is used to transform a raw games table into the players table that i
 TODO:
 Clean up docstrings and code
 """
+import numpy as np
 import pandas as pd
 
 PLAYER_COLUMNS = ["first_name","last_name","url"]
@@ -30,11 +31,12 @@ def games_to_players_transform(raw_game_df):
 			The names are duplicated for players who have (Walkover) at the end of their name
 			The names are in the 'name' column rather than split into 'first_name' and 'last_name' columns
 	"""
-	# Get a Series of all the players
-	player_series = raw_game_df.loc[:,["player_one_name","player_two_name"]].stack()
+	# Get a Series of all the players, as strings rather than the categories the raw_game table is read as, since the
+	# names and links are modified
+	player_series = raw_game_df.loc[:,["player_one_name","player_two_name"]].astype(object).stack()
 	player_series.index = range(len(player_series))
 	# Get a Series of all the links
-	link_series = raw_game_df.loc[:,["player_one_url","player_two_url"]].stack()
+	link_series = raw_game_df.loc[:,["player_one_url","player_two_url"]].astype(object).stack()
 	link_series.index = range(len(link_series))
 
 	# Combine the players and links to form a DataFrame
@@ -140,7 +142,7 @@ def name_transform(raw_player_df):
 	player_df = pd.concat([player_name_df, raw_player_df.drop(columns = ["name"])], axis = 1)
 	return player_df
 
-def reindex_transform(player_df):
+def reindex_transform(player_df, existing_player_df = None):
 	"""
 	Change the columns and index for the player DataFrame to database format
 
@@ -148,12 +150,18 @@ def reindex_transform(player_df):
 	- Sort the players by last name
 	- Change the index
 	- Add the last_played column
+	A player already in the existing player table keeps their player ID, found by their URL, so the ratings, the
+	model's training store and the other data keyed on the player IDs stay with the same players after a refresh. The
+	new players are numbered on from the largest existing player ID
 
 	Parameters
 	---------
 	player_df : pandas.DataFrame
         DataFrame containing all the player information that will go into the DataBase. The last_played column
         is missing, the index is unamed and the index numbers are not a range starting from 0.
+	existing_player_df : pandas.DataFrame, optional
+		The player table in the database, indexed by player ID with the url column. Without it the players are
+		numbered from 0
 
     Returns
     --------
@@ -161,10 +169,18 @@ def reindex_transform(player_df):
          DataFrame containing all the player information that will go into the DataBase 
 	"""
 	player_df_transformed = player_df.sort_values("last_name")
-	player_df_transformed.index = pd.RangeIndex(stop=len(player_df_transformed), name = "player_id")
+	if existing_player_df is None or existing_player_df.empty:
+		player_df_transformed.index = pd.RangeIndex(stop=len(player_df_transformed), name = "player_id")
+		return player_df_transformed
+	existing_player_ids = pd.Series(existing_player_df.index, index = existing_player_df["url"].astype(str))
+	existing_player_ids = existing_player_ids[~existing_player_ids.index.duplicated()]
+	player_ids = player_df_transformed["url"].astype(str).map(existing_player_ids)
+	new_player = player_ids.isnull()
+	player_ids[new_player] = int(existing_player_df.index.max()) + 1 + np.arange(new_player.sum())
+	player_df_transformed.index = pd.Index(player_ids.astype(np.int64).to_numpy(), name = "player_id")
 	return player_df_transformed
 
-def raw_game_to_player_transform(raw_game_df):
+def raw_game_to_player_transform(raw_game_df, existing_player_df = None):
 	"""
 	Transform a raw games DataFrame into a players DataFrame in database format
 
@@ -181,7 +197,9 @@ def raw_game_to_player_transform(raw_game_df):
 	----------
 	raw_game_df : pandas.DataFrame
 		DataFrame with raw data from CueTracker on all the games
-		
+	existing_player_df : pandas.DataFrame, optional
+		The player table in the database, whose players keep their player IDs (see reindex_transform)
+
 	Returns
 	-------
 	player_df : pandas.DataFrame
@@ -199,7 +217,46 @@ def raw_game_to_player_transform(raw_game_df):
 	t1.drop_duplicates("url", inplace = True)
 	t2 = walkover_transform(t1)
 	t3 = name_transform(t2)
-	player_df = reindex_transform(t3)
+	player_df = reindex_transform(t3, existing_player_df)
 	print("Game to player transformations complete!\n")
 	return player_df
 
+def raw_game_chunks_to_player_transform(raw_game_chunks, existing_player_df = None):
+	"""
+	Transform chunks of raw games into a players DataFrame in database format
+
+	The players of each chunk are found and deduplicated by URL as the chunks arrive, so only one chunk of games and
+	the players seen so far are held in memory. The result is the same as raw_game_to_player_transform applied to
+	all the chunks at once
+
+	Parameters
+	----------
+	raw_game_chunks : iterable of pandas.DataFrame
+		The chunks of raw data from CueTracker on the games, e.g. streamed by read.iter_raw_game
+	existing_player_df : pandas.DataFrame, optional
+		The player table in the database, whose players keep their player IDs (see reindex_transform)
+
+	Returns
+	-------
+	player_df : pandas.DataFrame
+		DataFrame containing the names and links of all the players in database format
+	"""
+	raw_player_dfs = []
+	for raw_game_df in raw_game_chunks:
+		if raw_game_df.empty:
+			continue
+		raw_player_df = url_transform(games_to_players_transform(raw_game_df))
+		raw_player_dfs.append(raw_player_df.drop_duplicates("url"))
+		# Keep the first appearance of each player, as raw_game_to_player_transform does
+		raw_player_dfs = [pd.concat(raw_player_dfs, axis = 0, ignore_index = True).drop_duplicates("url")]
+	if len(raw_player_dfs) == 0:
+		print(f"There is no raw game DataFrame to transform to a player DataFrame.\n")
+		player_df = pd.DataFrame(columns = PLAYER_COLUMNS)
+		player_df.index.name = "player_id"
+		return player_df
+	print(f"Transforming the {len(raw_player_dfs[0])} players of the raw games into a player DataFrame in database format...")
+	t2 = walkover_transform(raw_player_dfs[0])
+	t3 = name_transform(t2)
+	player_df = reindex_transform(t3, existing_player_df)
+	print("Game to player transformations complete!\n")
+	return player_df
@@ -1,2 +1,3 @@
 from .update import (update,
-	update_rating)
\ No newline at end of file
+	update_rating,
+	update_player_rating)
\ No newline at end of file
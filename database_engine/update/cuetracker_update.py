@@ -9,10 +9,10 @@ from ..transformers.cuetracker import tournament_transform
 from ..transformers.cuetracker import player_transform
 from ..transformers.cuetracker import game_transform
 
-from ..engine_config import SNOOKER_ENGINE
 from ..read import *
 from ..write import to_database
 from ..delete import delete_from_raw_game
+from ..schema import apply_schema
 
 __all__ = ["update",
 "update_rating"]
@@ -443,6 +443,9 @@ def get_new_raw():
 	"""
 	# Get raw data on the latest games and tournaments
 	latest_raw_game_df, latest_raw_tournament_df = cuetracker.get_latest_raw()
+	# The scraped data is given the dtypes the raw tables are read with, so its rows can be compared with theirs
+	latest_raw_game_df = apply_schema(latest_raw_game_df, "raw_game")
+	latest_raw_tournament_df = apply_schema(latest_raw_tournament_df, "raw_tournament")
 	raw_tournament_df = read_raw_tournament()
 	# Get raw data on the latest new tournaments
 	new_raw_tournament_df = get_new_tournament(latest_raw_tournament_df,raw_tournament_df)
@@ -6,7 +6,11 @@ from ..scrapers import snookerorg
 from ..transformers.snookerorg import game_transform
 from ..transformers.snookerorg import player_transform
 
-from ..create import create_snookerorg_player_table, create_upcoming_game_table
+import pandas as pd
+
+from ..engine_config import get_engine
+from ..create import create_snookerorg_player_table, create_upcoming_game_table, create_player_link_table
+from ..read import get_tables
 from ..write import to_database
 
 def get_snookerorg_player():
@@ -51,9 +55,66 @@ def get_upcoming_game():
 	upcoming_game_df = game_transform.raw_game_transform(raw_upcoming_game_df)
 	return upcoming_game_df
 
+def get_player_name_match(rebuild = False):
+	"""
+	Get the CueTracker player matching each snooker.org player by name
+
+	The players are matched on their normalised full names. Names shared by more than one CueTracker player are
+	ambiguous, so those snooker.org players are left unmatched rather than given the rating of the wrong player
+
+	Parameters
+	----------
+	rebuild : bool, default False
+		Whether to match every snooker.org player, rather than only those which are not in the player_link table
+
+	Returns
+	-------
+	player_link_df : pandas.DataFrame
+		DataFrame indexed by snooker.org player ID with the matching CueTracker 'player_id'
+	"""
+	mysql_query = """SELECT sp.player_id AS snookerorg_player_id, p.player_id AS player_id
+					FROM snookerorg_player AS sp
+					INNER JOIN player AS p
+					ON sp.full_name = p.full_name"""
+	if not rebuild:
+		mysql_query += """
+					LEFT JOIN player_link AS l
+					ON sp.player_id = l.snookerorg_player_id
+					WHERE l.snookerorg_player_id IS NULL"""
+	player_link_df = pd.read_sql_query(mysql_query, get_engine())
+	ambiguous_mask = player_link_df.duplicated("snookerorg_player_id", keep = False)
+	if ambiguous_mask.any():
+		print(f"Could not link {player_link_df.loc[ambiguous_mask, 'snookerorg_player_id'].nunique()} snooker.org players, as their names match more than one player")
+	player_link_df = player_link_df.loc[~ambiguous_mask,:].set_index("snookerorg_player_id")
+	return player_link_df
+
+def update_player_link(rebuild = False):
+	"""
+	Link the snooker.org players which are not yet in the player_link table to their CueTracker player IDs
+
+	Only the unlinked players are matched by name, so the cost of an update depends on the number of new players
+	rather than the size of the player tables. Players without a match, e.g. because they are not yet in the player
+	table, are matched again on the next update
+
+	Parameters
+	----------
+	rebuild : bool, default False
+		Whether to recreate the player_link table from every snooker.org player, e.g. after the player table is
+		refreshed and its player IDs change
+	"""
+	tables = get_tables()
+	if "player" not in tables or "snookerorg_player" not in tables:
+		return None
+	rebuild = rebuild or "player_link" not in tables
+	player_link_df = get_player_name_match(rebuild)
+	if rebuild:
+		create_player_link_table(player_link_df)
+	else:
+		to_database(player_link_df, "player_link")
+
 def update():
 	"""
-	Update the snookerorg_player and upcoming_game tables in the database
+	Update the snookerorg_player, upcoming_game and player_link tables in the database
 	"""
 	print("Updating the snooker.org tables in the database (snookerorg_player and upcoming_game)\n")
 	upcoming_game_df = get_upcoming_game()
@@ -61,5 +122,6 @@ def update():
 	snookerorg_player_df = get_new_snooker_org_player()
 	if snookerorg_player_df is not None:
 		to_database(snookerorg_player_df,"snookerorg_player","append")
+	update_player_link()
 	print("The snooker.org tables have been updated\n")
 
@@ -1,7 +1,10 @@
 """
 Module for updating the database with the latest information
 """
+import sqlalchemy
 
+from ..engine_config import get_engine
+from ..cache import invalidate
 from ..create import create_rating_table
 
 from . import snookerorg_update
@@ -23,6 +26,31 @@ def update_rating(rating_df):
 	---------
 	rating_df : pandas.DataFrame
 		DataFrame with the player ratings. The index should contain player ids and is named 'player_id'
-		The column should contain ratings and be named 'rating'
+		The columns should contain ratings and be named 'rating', and the variances of the ratings and be named
+		'rating_variance'
 	"""
-	create_rating_table(rating_df)
\ No newline at end of file
+	create_rating_table(rating_df)
+
+def update_player_rating(rating_df):
+	"""
+	Update the ratings of some players in the rating table, leaving the ratings of the other players unchanged
+
+	The old ratings of the players are deleted and the new ones inserted in a single transaction, so the rating
+	table is never seen without a rating for these players
+
+	Parameters
+	---------
+	rating_df : pandas.DataFrame
+		DataFrame with the new player ratings. The index should contain player ids and is named 'player_id'
+		The columns should contain ratings and be named 'rating', and the variances of the ratings and be named
+		'rating_variance'
+	"""
+	if rating_df.empty:
+		return None
+	delete_statement = sqlalchemy.text("DELETE FROM rating WHERE player_id IN :player_ids")
+	delete_statement = delete_statement.bindparams(sqlalchemy.bindparam("player_ids", expanding = True))
+	invalidate("rating")
+	with get_engine().begin() as connection:
+		connection.execute(delete_statement, {"player_ids": [int(player_id) for player_id in rating_df.index]})
+		rating_df.to_sql("rating", connection, if_exists = "append")
+	print(f"Updated the ratings of {len(rating_df)} players in the rating table\n")
@@ -1,33 +1,275 @@
 """
 Module for writing to the database
 """
+import contextlib
+import os
+import tempfile
+
 import pandas as pd
-from .engine_config import SNOOKER_ENGINE
+import sqlalchemy
+from sqlalchemy.dialects import mysql, sqlite
+from .engine_config import get_engine, foreign_key_checks_disabled, local_infile_enabled
 from .read import read, get_tables
+from .cache import invalidate
+from .swap import get_shadow_table_name, swap_shadow_table
 from. delete import delete_duplicate_primary_keys
 __all__ = ["to_database"]
 
 # The number of rows to include in each chunk when uploading to the database
 CHUNKSIZE = 5000
 
-def append_to_database(df_to_append, table_name):
+# The number of rows from which a DataFrame is written to a MySQL table with LOAD DATA LOCAL INFILE, rather than with
+# multi-row INSERT statements
+LOAD_DATA_MINIMUM_ROWS = 10000
+
+# The default limit of sqlite on the number of parameters of a statement
+SQLITE_MAX_VARIABLES = 999
+
+def get_primary_key(table_name, connection = None):
+	"""
+	Get the primary key columns of a table in the database
+
+	Parameters
+	----------
+	table_name : str
+		The name of the table
+	connection : sqlalchemy.engine.Connection, optional
+		The connection to inspect the table on. Defaults to the snooker database engine
+
+	Returns
+	-------
+	primary_key : list of str
+		The names of the primary key columns, empty if the table has no primary key constraint
+	"""
+	inspector = sqlalchemy.inspect(get_engine() if connection is None else connection)
+	return inspector.get_pk_constraint(table_name)["constrained_columns"]
+
+def upsert_rows(pd_table, connection, keys, data_iter):
+	"""
+	Insert rows into a table, updating the rows which already have the same primary key
+
+	Used as the method of pandas.DataFrame.to_sql, which calls it for each chunk of rows, so each chunk is sent as
+	one executemany of an INSERT ... ON DUPLICATE KEY UPDATE on MySQL, or an INSERT ... ON CONFLICT DO UPDATE on
+	sqlite. The index of the DataFrame must be the primary key of the table
+
+	Parameters
+	----------
+	pd_table : pandas.io.sql.SQLTable
+		The table being written to
+	connection : sqlalchemy.engine.Connection
+		The connection to write on
+	keys : list of str
+		The names of the columns, including the index
+	data_iter : iterable of tuple
+		The rows of the chunk
+	"""
+	rows = [dict(zip(keys, row)) for row in data_iter]
+	primary_key = list(pd_table.index)
+	update_columns = [column for column in keys if column not in primary_key]
+	dialect_name = connection.dialect.name
+	if dialect_name == "mysql":
+		statement = mysql.insert(pd_table.table)
+		# MySQL needs at least one column to update, updating the key to itself leaves the row unchanged
+		statement = statement.on_duplicate_key_update({column: statement.inserted[column] for column in update_columns or primary_key})
+	elif dialect_name == "sqlite":
+		statement = sqlite.insert(pd_table.table)
+		statement = statement.on_conflict_do_update(index_elements = primary_key,
+			set_ = {column: statement.excluded[column] for column in update_columns or primary_key})
+	else:
+		raise ValueError(f"Upserting is not supported by the {dialect_name} dialect")
+	connection.execute(statement, rows)
+
+def get_max_statement_size(connection):
+	"""
+	Get the largest statement, in bytes, which can be sent to the database
+
+	Parameters
+	----------
+	connection : sqlalchemy.engine.Connection
+		The connection to the database
+
+	Returns
+	-------
+	max_statement_size : int or None
+		The max_allowed_packet of the MySQL server, less some room for the rest of the packet, or None if the
+		database has no limit
+	"""
+	if connection.dialect.name != "mysql":
+		return None
+	if "max_allowed_packet" not in connection.info:
+		connection.info["max_allowed_packet"] = int(connection.exec_driver_sql("SELECT @@max_allowed_packet").scalar())
+	return connection.info["max_allowed_packet"] - 1024
+
+def insert_rows(pd_table, connection, keys, data_iter):
+	"""
+	Insert rows into a table with multi-row INSERT ... VALUES statements
+
+	Used as the method of pandas.DataFrame.to_sql, which calls it for each chunk of rows. The rows are sent in as few
+	statements as fit in the max_allowed_packet of a MySQL server, rather than the driver sending a statement for
+	every row or a fixed number of bytes of rows. On sqlite each statement is limited to SQLITE_MAX_VARIABLES
+	parameters
+
+	Parameters
+	----------
+	pd_table : pandas.io.sql.SQLTable
+		The table being written to
+	connection : sqlalchemy.engine.Connection
+		The connection to write on
+	keys : list of str
+		The names of the columns, including the index
+	data_iter : iterable of tuple
+		The rows of the chunk
+	"""
+	dialect = connection.dialect
+	placeholder = "?" if dialect.paramstyle == "qmark" else "%s"
+	row_placeholder = f"({', '.join([placeholder] * len(keys))})"
+	columns = ", ".join(dialect.identifier_preparer.quote(key) for key in keys)
+	insert_statement = f"INSERT INTO {dialect.identifier_preparer.format_table(pd_table.table)} ({columns}) VALUES "
+	max_statement_size = get_max_statement_size(connection)
+	max_rows = SQLITE_MAX_VARIABLES // len(keys) if dialect.name == "sqlite" else None
+
+	def execute(rows):
+		connection.exec_driver_sql(insert_statement + ", ".join([row_placeholder] * len(rows)),
+			tuple(value for row in rows for value in row))
+
+	rows = []
+	statement_size = len(insert_statement)
+	for row in data_iter:
+		# Each value is sent quoted and escaped, with a separator
+		row_size = sum(len(str(value)) for value in row) + 4 * len(keys)
+		if rows and ((max_statement_size is not None and statement_size + row_size > max_statement_size)
+			or (max_rows is not None and len(rows) == max_rows)):
+			execute(rows)
+			rows = []
+			statement_size = len(insert_statement)
+		rows.append(row)
+		statement_size += row_size
+	if rows:
+		execute(rows)
+
+def get_index_labels(table_df):
+	"""
+	Get the names of the columns the index of a DataFrame is written to, as pandas.DataFrame.to_sql names them
+	"""
+	if table_df.index.nlevels == 1:
+		return [table_df.index.name if table_df.index.name is not None else "index"]
+	return [name if name is not None else f"level_{level}" for level, name in enumerate(table_df.index.names)]
+
+def load_data_infile(table_df, table_name, connection, upsert = False):
+	"""
+	Write a DataFrame to an existing MySQL table with LOAD DATA LOCAL INFILE
+
+	The DataFrame is written to a temporary CSV file, which the server loads in one statement, rather than the rows
+	being sent in INSERT statements. When upserting, the rows are loaded into a temporary copy of the table and then
+	upserted from it, so the rows with the same primary key as a row in the table replace it as upsert_rows does.
+	Needs local_infile to be enabled on the server, and by the local_infile setting (see engine_config)
+
+	Parameters
+	----------
+	table_df : pandas.DataFrame
+		The DataFrame to write, whose index and columns are columns of the table
+	table_name : str
+		The name of the table
+	connection : sqlalchemy.engine.Connection
+		The connection to write on
+	upsert : bool, default False
+		Whether to update the rows which already have the same primary key. The index of the DataFrame must be
+		the primary key of the table
+	"""
+	quote = connection.dialect.identifier_preparer.quote
+	index_labels = get_index_labels(table_df)
+	keys = [*index_labels, *table_df.columns]
+	columns = ", ".join(quote(key) for key in keys)
+	load_table_name = f"{table_name}_load" if upsert else table_name
+	# pandas writes booleans as True/False, which MySQL would load into a BOOL (TINYINT) column as 0
+	bool_columns = [column for column in table_df.columns if pd.api.types.is_bool_dtype(table_df[column])]
+	table_df = table_df.astype({column: "Int8" for column in bool_columns})
+	with tempfile.NamedTemporaryFile("w", suffix = ".csv", newline = "", encoding = "utf-8", delete = False) as csv_file:
+		# An unquoted NULL is loaded as NULL, while any text containing a comma, quote or new line is quoted
+		table_df.to_csv(csv_file, header = False, na_rep = "NULL", lineterminator = "\n",
+			date_format = "%Y-%m-%d %H:%M:%S")
+	try:
+		if upsert:
+			connection.exec_driver_sql(f"CREATE TEMPORARY TABLE {quote(load_table_name)} LIKE {quote(table_name)}")
+		path = csv_file.name.replace("\\", "/")
+		connection.exec_driver_sql(f"""LOAD DATA LOCAL INFILE '{path}'
+									INTO TABLE {quote(load_table_name)}
+									CHARACTER SET utf8mb4
+									FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+									LINES TERMINATED BY '\\n'
+									({columns})""")
+		if upsert:
+			update_columns = [key for key in keys if key not in index_labels] or index_labels
+			updates = ", ".join(f"{quote(column)} = VALUES({quote(column)})" for column in update_columns)
+			connection.exec_driver_sql(f"""INSERT INTO {quote(table_name)} ({columns})
+										SELECT {columns} FROM {quote(load_table_name)}
+										ON DUPLICATE KEY UPDATE {updates}""")
+	finally:
+		if upsert:
+			connection.exec_driver_sql(f"DROP TEMPORARY TABLE IF EXISTS {quote(load_table_name)}")
+		os.remove(csv_file.name)
+
+def write_rows(table_df, table_name, connection = None, if_exists = "append", upsert = False):
+	"""
+	Write the rows of a DataFrame to a table, in the fastest way for the database and the number of rows
+
+	On MySQL, if the local_infile setting is enabled, a DataFrame with at least LOAD_DATA_MINIMUM_ROWS rows is loaded
+	from a file with LOAD DATA LOCAL INFILE (see load_data_infile). Otherwise the rows are sent in multi-row INSERT statements (see insert_rows), or upserted
+	(see upsert_rows). benchmarks/write_benchmark.py times each way
+
+	Parameters
+	----------
+	table_df : pandas.DataFrame
+		The DataFrame to write
+	table_name : str
+		The name of the table
+	connection : sqlalchemy.engine.Connection, optional
+		The connection to write on, e.g. one in a transaction. Defaults to a transaction on the snooker database engine
+	if_exists : {"fail", "replace", "append"}, default "append"
+		How to behave if the table already exists, see pandas.DataFrame.to_sql. A table which does not exist is
+		created
+	upsert : bool, default False
+		Whether to update the rows which already have the same primary key. The index of the DataFrame must be
+		the primary key of the table, which must exist
+	"""
+	with contextlib.nullcontext(connection) if connection is not None else get_engine().begin() as connection:
+		if connection.dialect.name == "mysql" and len(table_df) >= LOAD_DATA_MINIMUM_ROWS and local_infile_enabled():
+			# pandas creates or replaces the table with the first rows, and the rest are then loaded
+			table_df.iloc[:CHUNKSIZE].to_sql(table_name, connection, if_exists = if_exists,
+				method = upsert_rows if upsert else insert_rows)
+			load_data_infile(table_df.iloc[CHUNKSIZE:], table_name, connection, upsert = upsert)
+		else:
+			table_df.to_sql(table_name, connection, if_exists = if_exists, chunksize = CHUNKSIZE,
+				method = upsert_rows if upsert else insert_rows)
+
+def append_to_database(df_to_append, table_name, connection = None):
 	"""
 	Add a DataFrame to an existing table in the database
 
+	Rows with the same primary key as a row in the table replace it. If the table has a primary key constraint,
+	the rows are upserted, otherwise the rows with the same keys are deleted first. Either way the table is never read,
+	so the cost of the write depends on the size of the DataFrame rather than the table
+
 	Parameters
 	----------
 	df_to_append : pandas.DataFrame
 		The DataFrame to append to the database
 	table_name : str
 		The name of the table to append to
+	connection : sqlalchemy.engine.Connection, optional
+		The connection to write on, e.g. one in a transaction. Defaults to the snooker database engine
 	"""
 	if df_to_append.empty == True:
 		print(f"There were no new entries to add to the {table_name} table!\n")
 	else:
-		delete_duplicate_primary_keys(df_to_append, table_name)
 		print(f"Adding the following entries to the {table_name} table in the snooker database...")
 		print(df_to_append)
-		df_to_append.to_sql(table_name, SNOOKER_ENGINE, if_exists = "append", chunksize = CHUNKSIZE)
+		invalidate(table_name)
+		if get_primary_key(table_name, connection) == list(df_to_append.index.names):
+			write_rows(df_to_append, table_name, connection, upsert = True)
+		else:
+			delete_duplicate_primary_keys(df_to_append, table_name, connection)
+			write_rows(df_to_append, table_name, connection)
 
 def replace_in_database(replacing_df, table_name):
 	"""
@@ -42,11 +284,12 @@ def replace_in_database(replacing_df, table_name):
 	"""
 	print(f"Replacing the current {table_name} table with the following table...")
 	print(replacing_df)
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 0")
-	replacing_df.to_sql(table_name, SNOOKER_ENGINE, if_exists = "replace", chunksize = CHUNKSIZE)
-	SNOOKER_ENGINE.execute("SET FOREIGN_KEY_CHECKS = 1")
+	# The DataFrame is written to a shadow table, which then replaces the table in one step (see swap.py)
+	with foreign_key_checks_disabled() as connection:
+		write_rows(replacing_df, get_shadow_table_name(table_name), connection, if_exists = "replace")
+		swap_shadow_table(table_name, connection)
 
-def to_database(df_to_write, table_name, if_table_exists = "append"):
+def to_database(df_to_write, table_name, if_table_exists = "append", connection = None):
 	"""
 	Write a DataFrame to the snooker database
 
@@ -66,6 +309,8 @@ def to_database(df_to_write, table_name, if_table_exists = "append"):
 		- fail: Raise a ValueError.
 		- replace: Drop the table before inserting new values.
 		- append: Insert new values to the existing table.
+	connection : sqlalchemy.engine.Connection, optional
+		The connection to write on, e.g. one in a transaction. Defaults to the snooker database engine
 
 	Returns
 	-------
@@ -74,7 +319,7 @@ def to_database(df_to_write, table_name, if_table_exists = "append"):
 	# If we are inserting new values to the existing table
 	if if_table_exists == "append":
 		if table_name in get_tables():
-			append_to_database(df_to_write, table_name)
+			append_to_database(df_to_write, table_name, connection)
 			return None
 		else:
 			print(f"Creating a new table called {table_name} in the database...")
@@ -85,7 +330,8 @@ def to_database(df_to_write, table_name, if_table_exists = "append"):
 		else:
 			print(f"Creating a new table called {table_name} in the database...")
 	print(df_to_write)
-	df_to_write.to_sql(table_name, SNOOKER_ENGINE, if_exists = if_table_exists, chunksize = CHUNKSIZE)
+	invalidate(table_name)
+	write_rows(df_to_write, table_name, connection, if_exists = if_table_exists)
 	print(f"The upload to the database was succesful!\n")
 	return None
 
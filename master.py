@@ -1,20 +1,80 @@
 # MASTER is going to eventually be the script we call for scheduling etc...
 
-from model import ModelA
+from model import ModelA, OnlineRatingUpdater
+from model.evaluation import evaluate_ratings, append_evaluation_history
+from model.pairwise import build_probability_matrices
+from model.training_store import TrainingStore
+import pandas as pd
 import database_engine as database_engine
 import mli
 import calc_server
 
+# The online updater is kept between calls, so each call only reads the games added since the last one
+ONLINE_UPDATER = None
+
+# The ratings of the last daily fit and the largest game ID in it, scored on the games played since at the next fit
+LAST_FIT = None
+
+# The model of the last daily fit, whose rating covariance widens the EV hurdles of the upcoming games
+LAST_MODEL = None
+
+# The players who have played in this many days are paired in the head-to-head probability matrices
+ACTIVE_PLAYER_DAYS = 365
+
 # This function is to be called by the schedule module once a day to update the model ratings
 def daily_model_update():
-
-    player_df, game_df = database_engine.read_game_player_filtered(last_played_filter="2012-01-01",
-                                                                  game_date_filter="2012-01-01",
-                                                                  minimum_games_filter=25)
+    global ONLINE_UPDATER, LAST_FIT, LAST_MODEL
+
+    # games added after this point are not in the fit, so are left for the online updater
+    last_game_id = database_engine.get_max_game_id()
+
+    # out-of-sample scores of the previous fit, on the games it has not seen
+    if LAST_FIT is not None:
+        fit_ratings, fit_last_game_id = LAST_FIT
+        evaluation = evaluate_ratings(fit_ratings['rating'], database_engine.read_game_after(fit_last_game_id))
+        append_evaluation_history(evaluation['summary'], database_engine.get_path('evaluation_history_path'))
+
+    # the compact store of the played games the fit is trained on, brought up to date from the game table each day.
+    # It is rebuilt from the whole game table if a refresh has changed the player IDs
+    training_store = TrainingStore(database_engine.get_path('training_store_directory'),
+                                   player_url=database_engine.read_player(fresh=True)['url'])
+    # and if a raw refresh has renumbered the games
+    training_store.check_games(database_engine.get_played_game_summary(training_store.watermark_game_id))
+    # only the games added since the last update are read from the database, up to the online updater's starting point
+    new_game_df = database_engine.read_game_after(training_store.watermark_game_id)
+    training_store.append(new_game_df.loc[new_game_df.index <= last_game_id])
+
+    player_df, game_df = training_store.training_set(last_played_filter="2012-01-01",
+                                                     game_date_filter="2012-01-01",
+                                                     minimum_games_filter=25)
     SnookerModel = ModelA(game_df, player_df)
-    SnookerModel.fit_model(iterations=100_000)
+    SnookerModel.fit_components(iterations=100_000)
 
     database_engine.update_rating(SnookerModel.optimised_ratings)
+    active_player_ids = player_df.index[player_df['last_played'] >= pd.Timestamp.today() - pd.Timedelta(days=ACTIVE_PLAYER_DAYS)]
+    # the head-to-head probability matrices of the active players
+    build_probability_matrices(SnookerModel.optimised_ratings['rating'], database_engine.get_path('pairwise_directory'),
+                               player_ids=active_player_ids)
+
+    ONLINE_UPDATER = OnlineRatingUpdater(SnookerModel.optimised_ratings, last_game_id)
+    LAST_FIT = (SnookerModel.optimised_ratings, last_game_id)
+    LAST_MODEL = SnookerModel
+
+    return None
+
+
+# This function is to be called every few minutes between the daily model updates, to move the ratings of players
+# as soon as their results are added to the game table
+def online_rating_update():
+    global ONLINE_UPDATER
+
+    if ONLINE_UPDATER is None:
+        ONLINE_UPDATER = OnlineRatingUpdater(database_engine.read_rating(), database_engine.get_max_game_id())
+
+    new_game_df = database_engine.read_game_after(ONLINE_UPDATER.last_game_id)
+    changed_rating_df = ONLINE_UPDATER.update_games(new_game_df)
+
+    database_engine.update_player_rating(changed_rating_df)
 
     return None
 
@@ -28,6 +88,12 @@ def give_me_actions():
     # pull down our best-guess player ratings
     upcoming_games_player_ratings = database_engine.get_upcoming_rating()
 
+    # the covariance of each pair's ratings in the last fit, so the rating difference of players who have met is
+    # not treated as more uncertain than it is. Without a fit in this process the ratings are taken as independent
+    if LAST_MODEL is not None:
+        upcoming_games_player_ratings['rating_covariance'] = LAST_MODEL.rating_pair_covariance(
+            upcoming_games_player_ratings['player_one_id'], upcoming_games_player_ratings['player_two_id'])
+
     # use the market and our player ratings to give us bet suggestions
     bet_suggestions = calc_server.generate_bets(market_odds, 
                                                 upcoming_games_player_ratings,
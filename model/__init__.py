@@ -2,6 +2,20 @@
 # typically define what gets imported when someone imports your package. 
 # This file is executed when the package is imported, and it allows you to control what names are considered part of the package's public API. 
 
-from .modelA import ModelA
+import importlib
 
-__all__ = ['ModelA']
\ No newline at end of file
+# the module each public name is defined in. They are imported on first access, so importing the package, or one
+# of its NumPy-only modules such as model.artifact or model.pairwise, does not load pandas or tensorflow
+_LAZY_ATTRIBUTES = {'ModelA': '.modelA',
+                    'MetricHistory': '.history',
+                    'OnlineRatingUpdater': '.online'}
+
+__all__ = ['ModelA',
+           'MetricHistory',
+           'OnlineRatingUpdater']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
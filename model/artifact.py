@@ -0,0 +1,214 @@
+"""
+Versioned, immutable ratings artifacts. Each fit writes its ratings, their variances, the fit metadata and the data
+watermark to a new uncompressed .npz file, whose arrays are memory mapped straight out of the archive on load. A
+'LATEST' file names the newest version, so a reader can either pin a version or follow the latest one. Loading only
+needs NumPy, pandas is imported when writing or converting to a DataFrame
+"""
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+LATEST_FILE = 'LATEST'
+
+# The size of the fixed part of a zip local file header, followed by the file name and extra field
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def artifact_path(directory, version):
+    """
+    Returns the path of the artifact of a ratings version
+    """
+    return os.path.join(directory, f'ratings_{version}.npz')
+
+
+def save_ratings_artifact(rating_df, directory, metadata):
+    """
+    Writes the ratings of a fit to a new artifact and makes it the latest version. The version is the UTC time of
+    writing followed by the watermark game ID, and an existing version is never overwritten
+
+    Parameters
+    ----------
+    rating_df : pandas.DataFrame
+        DataFrame indexed by player ID with a 'rating' column and optionally a 'rating_variance' column
+    directory : str
+        The directory of the artifacts, created if it does not exist
+    metadata : dict
+        JSON serialisable metadata of the fit, including the 'watermark_game_id' and 'watermark_date' of the data
+
+    Returns
+    -------
+    version : str
+        The version of the new artifact
+    """
+    import pandas as pd
+
+    os.makedirs(directory, exist_ok=True)
+
+    version = f"{pd.Timestamp.utcnow():%Y%m%dT%H%M%S%f}_{metadata.get('watermark_game_id')}"
+    path = artifact_path(directory, version)
+    if os.path.exists(path):
+        raise FileExistsError(f'Ratings version {version} already exists')
+
+    rating_variance = rating_df['rating_variance'] if 'rating_variance' in rating_df else np.nan
+    rating_df = rating_df.assign(rating_variance=rating_variance).sort_index()
+
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as artifact_file:
+        np.savez(artifact_file,
+                 player_ids=rating_df.index.to_numpy(dtype=np.int64),
+                 rating=rating_df['rating'].to_numpy(dtype=np.float64),
+                 rating_variance=rating_df['rating_variance'].to_numpy(dtype=np.float64),
+                 metadata=np.array(json.dumps({'version': version, **metadata}, default=str)))
+    os.replace(temporary_path, path)
+
+    latest_path = os.path.join(directory, LATEST_FILE)
+    with open(f'{latest_path}.tmp', 'w') as latest_file:
+        latest_file.write(version)
+    os.replace(f'{latest_path}.tmp', latest_path)
+
+    return version
+
+
+def latest_version(directory):
+    """
+    Returns the latest ratings version in a directory, or None if there is none
+    """
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as latest_file:
+            return latest_file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(directory):
+    """
+    Returns every ratings version in a directory, oldest first
+    """
+    return sorted(file_name[len('ratings_'):-len('.npz')] for file_name in os.listdir(directory)
+                  if file_name.startswith('ratings_') and file_name.endswith('.npz'))
+
+
+def memmap_npz(path, names):
+    """
+    Memory maps arrays of an uncompressed .npz archive in place, by locating the .npy data of each member inside
+    the zip file
+
+    Parameters
+    ----------
+    path : str
+        The path of the archive, as written by numpy.savez
+    names : sequence of str
+        The names of the arrays to map
+
+    Returns
+    -------
+    arrays : dict of str:np.memmap
+        The read-only arrays, keyed by name
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as archive_file:
+        for name in names:
+            info = archive.getinfo(f'{name}.npy')
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{name} is compressed in {path}, so it cannot be memory mapped')
+
+            archive_file.seek(info.header_offset)
+            local_header = archive_file.read(ZIP_LOCAL_HEADER_SIZE)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            archive_file.seek(info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length)
+
+            if np.lib.format.read_magic(archive_file) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(archive_file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(archive_file)
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=archive_file.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+
+    return arrays
+
+
+class RatingsArtifact:
+    """
+    A ratings version loaded from its artifact, with the arrays memory mapped
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the artifacts
+    version : str, optional
+        The version to load, defaults to the latest
+
+    Attributes
+    ----------
+    version : str
+        The version loaded
+    player_ids : np.Array
+        The sorted player IDs
+    rating : np.Array
+        The rating of each player
+    rating_variance : np.Array
+        The variance of each player's rating, NaN where it was not computed
+    metadata : dict
+        The metadata of the fit, including its data watermark
+    """
+
+    def __init__(self, directory, version=None):
+        version = latest_version(directory) if version is None else version
+        if version is None:
+            raise FileNotFoundError(f'There are no ratings artifacts in {directory}')
+
+        self.directory = directory
+        self.version = version
+
+        path = artifact_path(directory, version)
+        arrays = memmap_npz(path, ['player_ids', 'rating', 'rating_variance'])
+        self.player_ids = arrays['player_ids']
+        self.rating = arrays['rating']
+        self.rating_variance = arrays['rating_variance']
+        with np.load(path) as archive:
+            self.metadata = json.loads(str(archive['metadata']))
+
+    def is_latest(self):
+        """
+        Whether a newer version has been written since this one, so a reader following the latest version knows
+        when to swap
+        """
+        return latest_version(self.directory) == self.version
+
+    def lookup(self, player_ids):
+        """
+        Returns the rating and rating variance of each player, NaN for players without a rating
+
+        Parameters
+        ----------
+        player_ids : sequence of int
+            The player IDs
+
+        Returns
+        -------
+        rating : np.Array
+            The rating of each player
+        rating_variance : np.Array
+            The variance of each player's rating
+        """
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        # with no players in the artifact there is no last row to clip the search to
+        if len(self.player_ids) == 0:
+            return np.full(len(player_ids), np.nan), np.full(len(player_ids), np.nan)
+        idx = np.minimum(np.searchsorted(self.player_ids, player_ids), len(self.player_ids) - 1)
+        found = self.player_ids[idx] == player_ids
+
+        return (np.where(found, self.rating[idx], np.nan),
+                np.where(found, self.rating_variance[idx], np.nan))
+
+    def to_frame(self):
+        """
+        Returns the ratings as a DataFrame indexed by player ID, like ModelA.optimised_ratings
+        """
+        import pandas as pd
+
+        return pd.DataFrame({'rating': np.asarray(self.rating), 'rating_variance': np.asarray(self.rating_variance)},
+                            index=pd.Index(np.asarray(self.player_ids), name='player_id'))
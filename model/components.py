@@ -0,0 +1,88 @@
+"""
+Decomposition of the who-played-whom graph into connected components. Ratings are only identified relative to the
+other players in the same component, so each component is fitted on its own with one of its players pinned
+"""
+import numpy as np
+
+
+def find_components(player_one_idx, player_two_idx, n_players):
+    """
+    Finds the connected components of the player graph with a union-find over the games
+
+    Parameters
+    ----------
+    player_one_idx : np.Array
+        The (contiguous, zero-based) index of player one in each game
+    player_two_idx : np.Array
+        The (contiguous, zero-based) index of player two in each game
+    n_players : int
+        The number of players, including any who do not appear in the games
+
+    Returns
+    -------
+    labels : np.Array
+        The component of each player. Components are numbered by decreasing size, so the main tour is component 0
+    """
+    parent = list(range(n_players))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        # path compression, so later finds on this branch are one step
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for p1, p2 in zip(np.asarray(player_one_idx).tolist(), np.asarray(player_two_idx).tolist()):
+        p1_root, p2_root = find(p1), find(p2)
+        if p1_root != p2_root:
+            parent[max(p1_root, p2_root)] = min(p1_root, p2_root)
+
+    roots = np.array([find(i) for i in range(n_players)], dtype=np.int64)
+    _, labels, sizes = np.unique(roots, return_inverse=True, return_counts=True)
+
+    size_rank = np.empty(len(sizes), dtype=np.int64)
+    size_rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+
+    return size_rank[labels]
+
+
+def fit_component(match_df, player_df, reference_id, model_kwargs, fit_kwargs):
+    """
+    Fits a ModelA to the games of a single component, with the reference player's rating pinned. Defined at module
+    level so it can be sent to the worker processes of ModelA.fit_components
+
+    Parameters
+    ----------
+    match_df : pandas.DataFrame
+        The games between the players of the component
+    player_df : pandas.DataFrame
+        The players of the component
+    reference_id : int
+        The player ID of the player whose rating is pinned
+    model_kwargs : dict
+        Passed on to the ModelA constructor, the decay factor, prior and as_of date of the model being fitted
+    fit_kwargs : dict
+        Passed on to ModelA.fit_model
+
+    Returns
+    -------
+    optimised_ratings : pandas.DataFrame
+        The optimised ratings of the players of the component
+    final_LL : float
+        The final negative LL of the component fit
+    n_iterations : int
+        The number of iterations the component fit ran for
+    converged : bool
+        Whether the component fit converged
+    """
+    from .modelA import ModelA
+
+    component_model = ModelA(match_df, player_df, **model_kwargs)
+    component_model.reference_players = [reference_id]
+    component_model.ratings_path = None
+    component_model.fit_model(**fit_kwargs)
+
+    return (component_model.optimised_ratings, component_model.final_LL,
+            component_model.n_iterations, component_model.converged)
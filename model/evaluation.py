@@ -0,0 +1,161 @@
+"""
+Out-of-sample evaluation of the ratings. The frame win probability of each held-out game and the match win
+probability from the vectorised calc_server engine are scored against the results in one pass over the games
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from calc_server.probability_calcs import calc_game_win_prob
+
+# Probabilities are clipped away from 0 and 1 so a confident miss has a finite log loss
+PROB_EPSILON = 1e-12
+
+
+def reliability_bins(predicted, observed, weights, n_bins=10):
+    """
+    Groups predictions into equal-width probability bins, comparing the mean prediction with the observed frequency
+    of each bin
+
+    Parameters
+    ----------
+    predicted : np.Array
+        The predicted probability of each outcome
+    observed : np.Array
+        The observed frequency of each outcome, 0 or 1 for a single event
+    weights : np.Array
+        The number of events behind each prediction
+    n_bins : int
+        The number of bins
+
+    Returns
+    -------
+    reliability_df : pandas.DataFrame
+        The lower and upper edge, number of events, mean prediction and observed frequency of each non-empty bin
+    """
+    edges = np.linspace(0, 1, n_bins + 1)
+    bins = np.clip(np.digitize(predicted, edges[1:-1]), 0, n_bins - 1)
+
+    events = np.bincount(bins, weights, minlength=n_bins)
+    mean_predicted = np.bincount(bins, weights * predicted, minlength=n_bins) / np.maximum(events, 1e-300)
+    observed_frequency = np.bincount(bins, weights * observed, minlength=n_bins) / np.maximum(events, 1e-300)
+
+    reliability_df = pd.DataFrame({'lower': edges[:-1], 'upper': edges[1:], 'events': events,
+                                   'mean_predicted': mean_predicted, 'observed_frequency': observed_frequency})
+
+    return reliability_df[reliability_df['events'] > 0].reset_index(drop=True)
+
+
+def played_best_of(best_of, p1_frames, p2_frames):
+    """
+    The format of each game, with the games of unknown format taken to have been played to the winning score. A
+    format is unknown if it is NULL, or 0 as game_transform.best_of_transform stores it in the game table
+
+    Parameters
+    ----------
+    best_of : np.Array
+        The best of of each game, as stored
+    p1_frames : np.Array
+        The frames won by player one in each game
+    p2_frames : np.Array
+        The frames won by player two in each game
+
+    Returns
+    -------
+    best_of : np.Array
+        The best of of each game, as float
+    """
+    best_of = np.asarray(best_of, dtype=np.float64)
+    unknown_format = np.isnan(best_of) | (best_of <= 0)
+    return np.where(unknown_format, 2 * np.maximum(p1_frames, p2_frames) - 1, best_of)
+
+
+def evaluate_ratings(rating, game_df, n_bins=10):
+    """
+    Scores ratings on held-out games: the log loss and Brier score of every frame and of every match result, the
+    reliability of both probabilities and the calibration of the match probability for each format (best of)
+
+    Parameters
+    ----------
+    rating : pandas.Series
+        The rating of each player, indexed by player ID
+    game_df : pandas.DataFrame
+        The held-out games, with the columns of the game table. Games without a result or involving a player
+        without a rating are not scored, nor are drawn matches at the match level. Games of unknown format are
+        scored as played to the winning score, see played_best_of
+    n_bins : int
+        The number of reliability bins
+
+    Returns
+    -------
+    evaluation : dict
+        'summary', a pandas.Series of the scores, 'frame_reliability' and 'match_reliability', see
+        reliability_bins, and 'by_format', a pandas.DataFrame of the match-level scores of each best of
+    """
+    game_df = game_df.dropna(subset=['player_one_frames', 'player_two_frames'])
+    p1_idx = rating.index.get_indexer(game_df['player_one_id'])
+    p2_idx = rating.index.get_indexer(game_df['player_two_id'])
+    rated = (p1_idx >= 0) & (p2_idx >= 0)
+
+    rating_values = rating.to_numpy(dtype=np.float64)
+    p1_frames = game_df['player_one_frames'].to_numpy(dtype=np.float64)[rated]
+    p2_frames = game_df['player_two_frames'].to_numpy(dtype=np.float64)[rated]
+    frames = p1_frames + p2_frames
+
+    best_of = played_best_of(game_df['best_of'].to_numpy(dtype=np.float64)[rated], p1_frames, p2_frames)
+
+    p1_frame_win_prob = 1. / (1 + np.exp(-(rating_values[p1_idx[rated]] - rating_values[p2_idx[rated]])))
+    p1_frame_win_prob = np.clip(p1_frame_win_prob, PROB_EPSILON, 1 - PROB_EPSILON)
+    p1_GW_prob = np.clip(calc_game_win_prob(p1_frame_win_prob, best_of), PROB_EPSILON, 1 - PROB_EPSILON)
+
+    frame_negative_LL = -(p1_frames * np.log(p1_frame_win_prob) + p2_frames * np.log(1 - p1_frame_win_prob))
+    frame_squared_error = p1_frames * (1 - p1_frame_win_prob) ** 2 + p2_frames * p1_frame_win_prob ** 2
+
+    decided = p1_frames != p2_frames
+    p1_won = (p1_frames > p2_frames).astype(np.float64)
+    match_negative_LL = -(p1_won * np.log(p1_GW_prob) + (1 - p1_won) * np.log(1 - p1_GW_prob))
+    match_squared_error = (p1_won - p1_GW_prob) ** 2
+
+    total_frames = max(frames.sum(), 1)
+    total_matches = max(decided.sum(), 1)
+    summary = pd.Series({'games': int(rated.sum()),
+                         'unrated_games': int((~rated).sum()),
+                         'frames': int(frames.sum()),
+                         'frame_log_loss': frame_negative_LL.sum() / total_frames,
+                         'frame_brier': frame_squared_error.sum() / total_frames,
+                         'match_log_loss': match_negative_LL[decided].sum() / total_matches,
+                         'match_brier': match_squared_error[decided].sum() / total_matches,
+                         'match_accuracy': ((p1_GW_prob > 0.5) == (p1_won == 1))[decided].sum() / total_matches})
+
+    by_format = pd.DataFrame({'best_of': best_of, 'games': 1.0, 'log_loss': match_negative_LL,
+                              'brier': match_squared_error, 'mean_predicted': p1_GW_prob,
+                              'observed_frequency': p1_won})[decided]
+    by_format = by_format.groupby('best_of').agg({'games': 'sum', 'log_loss': 'mean', 'brier': 'mean',
+                                                  'mean_predicted': 'mean', 'observed_frequency': 'mean'})
+    by_format['calibration_gap'] = by_format['observed_frequency'] - by_format['mean_predicted']
+
+    return {'summary': summary,
+            'frame_reliability': reliability_bins(p1_frame_win_prob, p1_frames / np.maximum(frames, 1), frames,
+                                                  n_bins),
+            'match_reliability': reliability_bins(p1_GW_prob[decided], p1_won[decided], np.ones(decided.sum()),
+                                                  n_bins),
+            'by_format': by_format}
+
+
+def append_evaluation_history(summary, path, date=None):
+    """
+    Appends the summary of an evaluation to a csv, so the scores of successive fits can be tracked as a time series
+
+    Parameters
+    ----------
+    summary : pandas.Series
+        The 'summary' of evaluate_ratings
+    path : str
+        The path of the csv, created with a header if it does not exist
+    date : pandas.Timestamp, optional
+        The date the evaluation is recorded against, defaults to today
+    """
+    date = pd.Timestamp.today().normalize() if date is None else pd.Timestamp(date)
+    history_df = pd.DataFrame([summary], index=pd.Index([date], name='date'))
+    history_df.to_csv(path, mode='a', header=not os.path.exists(path))
@@ -0,0 +1,110 @@
+"""
+Fixed-size record of the quantities tracked while optimising a model, so that inspecting the optimisation
+process does not cost more memory the longer the optimisation runs
+"""
+import numpy as np
+import pandas as pd
+
+
+class MetricHistory:
+    """
+    A ring buffer holding the most recent records of the metrics tracked during the model optimisation. The buffer
+    is preallocated, once it is full the oldest record is overwritten by the newest
+
+    Parameters
+    ----------
+    capacity : int
+        The maximum number of records to keep
+    columns : tuple of str
+        The names of the metrics in each record
+
+    Attributes
+    ----------
+    total_records : int
+        The number of records appended over the lifetime of the buffer, including those which have been overwritten
+    """
+
+    def __init__(self, capacity=1_000, columns=('iteration', 'loss', 'norm', 'grad_norm')):
+        if capacity < 1:
+            raise ValueError('The capacity of a MetricHistory must be at least 1')
+
+        self.capacity = int(capacity)
+        self.columns = tuple(columns)
+        self.total_records = 0
+
+        self._buffer = np.full((self.capacity, len(self.columns)), np.nan, dtype=np.float64)
+
+    def __len__(self):
+        return min(self.total_records, self.capacity)
+
+    def append(self, *values):
+        """
+        Add a record to the history, overwriting the oldest record if the buffer is full
+
+        Parameters
+        ----------
+        *values : float
+            One value for each of the columns, in the same order as the columns
+        """
+        self._buffer[self.total_records % self.capacity] = values
+        self.total_records += 1
+
+    def to_array(self):
+        """
+        Returns the records currently held, ordered from oldest to newest
+
+        Returns
+        -------
+        records : np.Array
+            An array of shape (number of records, number of columns)
+        """
+        if self.total_records <= self.capacity:
+            return self._buffer[:self.total_records].copy()
+
+        start = self.total_records % self.capacity
+        return np.concatenate([self._buffer[start:], self._buffer[:start]])
+
+    def column(self, name):
+        """
+        Returns the values of a single metric currently held, ordered from oldest to newest
+
+        Parameters
+        ----------
+        name : str
+            The name of the metric
+
+        Returns
+        -------
+        values : np.Array
+            An array of the values of the metric
+        """
+        return self.to_array()[:, self.columns.index(name)]
+
+    def last(self, name):
+        """
+        Returns the most recent value of a single metric, or NaN if nothing has been recorded
+
+        Parameters
+        ----------
+        name : str
+            The name of the metric
+
+        Returns
+        -------
+        value : float
+            The latest value of the metric
+        """
+        if self.total_records == 0:
+            return float('NaN')
+        return float(self._buffer[(self.total_records - 1) % self.capacity, self.columns.index(name)])
+
+    def to_frame(self):
+        """
+        Returns the records currently held as a pandas.DataFrame, ordered from oldest to newest
+
+        Returns
+        -------
+        df : pandas.DataFrame
+            A DataFrame with one column per metric
+        """
+        return pd.DataFrame(self.to_array(), columns=list(self.columns))
@@ -0,0 +1,29 @@
+"""
+Deferred imports of the heavy dependencies of the model package, so that importing the package, or using only its
+NumPy parts, does not pay for loading TensorFlow or matplotlib
+"""
+import importlib
+
+
+class LazyModule:
+    """
+    Stands in for a module, importing it the first time one of its attributes is used
+
+    Parameters
+    ----------
+    name : str
+        The full name of the module, e.g. 'matplotlib.pyplot'
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._name!r} ({state})>'
@@ -1,9 +1,23 @@
 # Upload new model ratings
 import pandas as pd
 import numpy as np
-from math import comb
-import tensorflow as tf
-import matplotlib.pyplot as plt
+import scipy.sparse
+from scipy.special import comb, expit, log_expit
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from .lazy import LazyModule
+from .history import MetricHistory
+from .components import find_components, fit_component
+from .uncertainty import build_hessian, RatingCovariance
+from .evaluation import evaluate_ratings
+from .artifact import save_ratings_artifact
+from database_engine.engine_config import get_path
+
+# tensorflow and matplotlib take seconds to import, so they are only loaded once a model is fitted or plotted
+tf = LazyModule('tensorflow')
+plt = LazyModule('matplotlib.pyplot')
 
 
 class ModelA:
@@ -18,6 +32,12 @@ class ModelA:
         DataFrame containing the matches we wish to train the model on
     player_df : pandas.DataFrame
         DataFrame containing the players and their current (pre-trained or trained) model rating
+    decay_factor : float
+        The rate, per day, at which the weight of a game decays with its age. Default to 1/725
+    l2_prior : float
+        The precision of a Gaussian prior on each player strength, centred on the initial strength. Default to 0
+    as_of : str or pandas.Timestamp, optional
+        The date the ages of the games are measured from. Default to today
     
     Attributes
     ----------
@@ -31,15 +51,54 @@ class ModelA:
 
     optimised_ratings : 
 
-    LL_evolution : list
+    pair_data : pandas.DataFrame
+        DataFrame of the training set collapsed to one row per pair of players, which the optimiser iterates over
+
+    history : MetricHistory
+        Fixed-size record of the iteration, loss, norm and gradient norm, taken every check_every iterations of the
+        optimisation
+
+    LL_evolution : np.Array
+        The negative LL values held in the history
 
     final_LL : float
 
-    iter : list
+    norm : np.Array
+        The norms of the player strength vector held in the history
+
+    n_iterations : int
+        The number of iterations the last optimisation ran for
 
-    norm : list
+    converged : bool
+        Whether the last optimisation stopped because a convergence tolerance was met
 
     idx_mapping : dict
+        The index of each player in the strength vector, keyed by player ID
+
+    player_ids : np.Array
+        The player ID of each index of the strength vector, the inverse of idx_mapping
+
+    reference_players : list
+        Player IDs whose ratings are pinned at their initial value during the optimisation
+
+    ratings_path : str or None
+        The directory the versioned ratings artifact of each fit is written to, or None to not write them. Defaults
+        to the ratings_directory setting of the database configuration, see database_engine.get_path
+
+    ratings_version : str or None
+        The version of the ratings artifact written by the last fit, see model.artifact
+
+    player_components : pandas.DataFrame
+        The connected component of the player graph each player belongs to, see find_player_components
+
+    component_ratings : pandas.DataFrame
+        The optimised ratings of the players of every component fitted by fit_components
+
+    unidentifiable_players : pandas.Index
+        The player IDs of the players outside the main component, who are not rated by fit_components
+
+    rating_covariance : RatingCovariance
+        The Laplace approximation of the covariance of the optimised ratings, see compute_rating_uncertainty
     
     Methods
     -------
@@ -49,28 +108,45 @@ class ModelA:
     """
 
 
-    def __init__(self, match_df, player_df):
+    def __init__(self, match_df, player_df, decay_factor=1 / 725, l2_prior=0.0, as_of=None):
         self.prob_product = float('NaN')
         self.log_likelihood = float('NaN')
 
-        self.match_data = match_df
+        self.decay_factor = decay_factor
+        self.l2_prior = l2_prior
+        self.as_of = pd.Timestamp.today() if as_of is None else pd.Timestamp(as_of)
+
+        # dropna returns a new frame, so the caller's match_df is never modified by the model. The games are kept
+        # with their player IDs, and match_data is rebuilt from them by each transform, so fitting again is the same
+        self.raw_match_data = match_df.dropna()
+        self.match_data = self.raw_match_data
         self.player_data = player_df
         self.optimised_ratings = float('NaN')
-
-        self.match_data.dropna(inplace=True)
+        self.pair_data = None
 
         # attributes of the ML optimiser to allow inspection of the opt process
-        self.LL_evolution = []
+        self.history = MetricHistory()
         self.final_LL = 0
-        self.iter =[]
-        self.norm = []
+        self.n_iterations = 0
+        self.converged = False
 
         self.idx_mapping = {}
+        self.player_ids = None
+        self.reference_players = []
+        self.ratings_path = get_path('ratings_directory')
+        self.ratings_version = None
+
+        self.player_components = None
+        self.component_ratings = None
+        self.unidentifiable_players = None
+        self.rating_covariance = None
 
     def re_index_player_IDs(self):
         """
-        Re-calculates and re-assigns player IDs for the match_df and player_df attributes inplace. Useful as avoids
-        conflicts when players are added / dropped from the database
+        Re-calculates and re-assigns player IDs for the match_df attribute, replacing each ID with the contiguous
+        int32 index of the player in player_df. match_data is rebuilt from the games with their player IDs, so it can
+        be called again, e.g. by a second fit. Useful as avoids conflicts when players are added / dropped from the
+        database. Both ID columns are encoded together in a single pass, as codes of a categorical over the player IDs
 
         Parameters
         ----------
@@ -82,15 +158,23 @@ class ModelA:
             Dictionary of the new ID mappings with k, v pairs of { old ID : new ID }
 
         """
- 
         player_ids = self.player_data.index
-        map_dict = dict(zip(player_ids, range(0, len(player_ids))))
-        self.match_data.loc[:, "player_one_id"].replace(map_dict, inplace=True)
-        self.match_data.loc[:, "player_two_id"].replace(map_dict, inplace=True)
+        n_matches = len(self.raw_match_data)
 
-        self.idx_mapping = map_dict # update the idx_mapping class attribute
-        
-        return map_dict
+        both_id_columns = np.concatenate([self.raw_match_data['player_one_id'].values,
+                                          self.raw_match_data['player_two_id'].values])
+        codes = pd.Categorical(both_id_columns, categories=player_ids).codes.astype(np.int32)
+        if (codes < 0).any():
+            raise ValueError(f'Players {sorted(set(both_id_columns[codes < 0]))} play in match_df but are not in '
+                             f'player_df')
+
+        # assign builds a new frame, rather than writing into a slice of one that may be shared
+        self.match_data = self.raw_match_data.assign(player_one_id=codes[:n_matches], player_two_id=codes[n_matches:])
+
+        self.player_ids = player_ids.to_numpy() # the inverse map, the player ID of each index
+        self.idx_mapping = dict(zip(self.player_ids, range(len(self.player_ids)))) # update the idx_mapping class attribute
+
+        return self.idx_mapping
 
     def add_necessary_columns_to_df(self, df):
         """
@@ -131,15 +215,14 @@ class ModelA:
         -------
         None
         """
+        p1_frames = df['player_one_frames'].values.astype(np.float64)
+        p2_frames = df['player_two_frames'].values.astype(np.float64)
+
+        # evaluated for every game at once, rather than row by row with df.apply
         if NegBin:
-            df['nCr'] = df.apply(
-                lambda x: comb(x['player_one_frames'] + x['player_two_frames'] - 1
-                               if x['player_one_frames'] + x['player_two_frames'] - 1 >= 0 else 0,
-                               x['player_one_frames'] - 1 if x['player_one_frames'] - 1 >= 0 else 0),
-                axis=1).values
+            df['nCr'] = comb(np.maximum(p1_frames + p2_frames - 1, 0), np.maximum(p1_frames - 1, 0))
         else:
-            df['nCr'] = df.apply(lambda x: comb(x['player_one_frames'] + x['player_two_frames'], x['player_one_frames']),
-                                 axis=1).values
+            df['nCr'] = comb(p1_frames + p2_frames, p1_frames)
 
     def update_time_decay_col(self, df):
         """
@@ -155,13 +238,53 @@ class ModelA:
         -------
         None
         """
-        t_days_ago = (pd.to_datetime(df['date']) - pd.Timestamp.today()).dt.days
+        t_days_ago = (pd.to_datetime(df['date']) - self.as_of).dt.days
 
-        decay_factor = 1 / 725
-        time_decay = np.exp(decay_factor * t_days_ago)
+        time_decay = np.exp(self.decay_factor * t_days_ago)
         
         df['time_decay'] = time_decay
 
+    def aggregate_match_data(self, df):
+        """
+        Collapses the matches DataFrame into one row per pair of players. The likelihood of our model only depends
+        on the time decay weighted frames each player won against the other, so the optimiser can iterate over the
+        unique pairs rather than every game in the training set. The nCr term does not depend on the player
+        ratings, so it is carried along as a constant (weighted) log offset for each pair
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            This is the matches DataFrame, our training dataset, with the nCr and time_decay columns populated
+
+        Returns
+        -------
+        pair_df : pandas.DataFrame
+            A DataFrame with one row per pair of players (ordered so that player_one_id < player_two_id) holding the
+            weighted frames won by each player, the weighted log nCr, the summed time decay and the number of games
+        """
+        # order each pair the same way round, so A vs B and B vs A games are collapsed together
+        swap = df['player_one_id'].values > df['player_two_id'].values
+
+        p1_ID = np.where(swap, df['player_two_id'].values, df['player_one_id'].values)
+        p2_ID = np.where(swap, df['player_one_id'].values, df['player_two_id'].values)
+        p1_frames = np.where(swap, df['player_two_frames'].values, df['player_one_frames'].values).astype(np.float64)
+        p2_frames = np.where(swap, df['player_one_frames'].values, df['player_two_frames'].values).astype(np.float64)
+
+        time_decay = df['time_decay'].values.astype(np.float64)
+        log_nCr = np.log(df['nCr'].values.astype(np.float64))
+
+        pair_df = pd.DataFrame({'player_one_id': p1_ID,
+                                'player_two_id': p2_ID,
+                                'player_one_frames': time_decay * p1_frames,
+                                'player_two_frames': time_decay * p2_frames,
+                                'log_nCr': time_decay * log_nCr,
+                                'time_decay': time_decay,
+                                'games': 1})
+
+        pair_df = pair_df.groupby(['player_one_id', 'player_two_id'], as_index=False, sort=False).sum()
+
+        return pair_df
+
     def extract_constant_tensors(self, df):
         """
         Extracts the desired columns of our model (a DataFrame) so that we can access these in the 
@@ -170,39 +293,39 @@ class ModelA:
         Parameters
         ----------
         df : pandas.DataFrame
-            This is the matches DataFrame, our training dataset
+            This is the pairs DataFrame returned by aggregate_match_data
 
         Returns
         -------
         p1_ID_extraction_vector : array
-            An array with player 1 IDs from all games in the matches df
+            An array with player 1 IDs from all pairs in the pairs df
 
         p2_ID_extraction_vector : array
-            An array with player 2 IDs from all games in the matches df
+            An array with player 2 IDs from all pairs in the pairs df
 
-        nCr_col : vector
-            An array with the nCr values of the match scorelines, from all games in the matches df
+        log_nCr_col : vector
+            An array with the weighted sum of the log nCr values of the match scorelines, for each pair
 
         time_decay_col : array
-            An array with the time decay constants for each game in our the matches df
+            An array with the summed time decay constants of the games between each pair
 
         p1_frames : array
-            An array holding the frames P1 won in each game, for all the games in our matches df
+            An array holding the weighted frames P1 won against P2, for each pair
 
         p2_frames : array
-            An array holding the frames P2 won in each game, for all the games in our matches df
+            An array holding the weighted frames P2 won against P1, for each pair
         """
-        p1_ID_extraction_vector = df['player_one_id']
-        p2_ID_extraction_vector = df['player_two_id']
+        p1_ID_extraction_vector = df['player_one_id'].values.astype(np.int32)
+        p2_ID_extraction_vector = df['player_two_id'].values.astype(np.int32)
         
-        nCr_col = df['nCr']
+        log_nCr_col = df['log_nCr'].values.astype(np.float32)
         
-        time_decay_col = df['time_decay']
+        time_decay_col = df['time_decay'].values.astype(np.float32)
         
-        p1_frames = df['player_one_frames']
-        p2_frames = df['player_two_frames']
+        p1_frames = df['player_one_frames'].values.astype(np.float32)
+        p2_frames = df['player_two_frames'].values.astype(np.float32)
 
-        return p1_ID_extraction_vector, p2_ID_extraction_vector, nCr_col, time_decay_col, p1_frames, p2_frames
+        return p1_ID_extraction_vector, p2_ID_extraction_vector, log_nCr_col, time_decay_col, p1_frames, p2_frames
     
     def apply_model_transforms(self, NegBin=True):
         """
@@ -211,43 +334,44 @@ class ModelA:
 
         Parameters
         ----------
-        df : pandas.DataFrame
-            This is the matches DataFrame, our training dataset
+        NegBin : bool
+            Controls whether to run calculations for the Negative-Binomial case, or normal nCr. Default to True
 
         Returns
         -------
         p1_ID_extraction_vector : array
-            An array with player 1 IDs from all games in the matches df
+            An array with player 1 IDs from all pairs of players in the matches df
 
         p2_ID_extraction_vector : array
-            An array with player 2 IDs from all games in the matches df
+            An array with player 2 IDs from all pairs of players in the matches df
 
-        nCr_col : vector
-            An array with the nCr values of the match scorelines, from all games in the matches df
+        log_nCr_col : vector
+            An array with the weighted sum of the log nCr values of the match scorelines, for each pair
 
         time_decay_col : array
-            An array with the time decay constants for each game in our the matches df
+            An array with the summed time decay constants of the games between each pair
 
         p1_frames : array
-            An array holding the frames P1 won in each game, for all the games in our matches df
+            An array holding the weighted frames P1 won against P2, for each pair
 
         p2_frames : array
-            An array holding the frames P2 won in each game, for all the games in our matches df
+            An array holding the weighted frames P2 won against P1, for each pair
         """
         
         idx_mapping = self.re_index_player_IDs()
         self.add_necessary_columns_to_df(self.match_data)
         self.update_nCr_col(self.match_data, NegBin)
         self.update_time_decay_col(self.match_data)
+        self.pair_data = self.aggregate_match_data(self.match_data)
 
-        p1_ID_t, p2_ID_t, nCr_t, time_t, p1_frames_t, p2_frames_t = self.extract_constant_tensors(self.match_data)
+        p1_ID_t, p2_ID_t, log_nCr_t, time_t, p1_frames_t, p2_frames_t = self.extract_constant_tensors(self.pair_data)
         
-        return p1_ID_t, p2_ID_t, nCr_t, time_t, p1_frames_t, p2_frames_t
+        return p1_ID_t, p2_ID_t, log_nCr_t, time_t, p1_frames_t, p2_frames_t
     
-    def x_to_probabilities(self, x, data_constants):
+    def x_to_log_likelihoods(self, x, data_constants):
         """
-        A function, used in the Loss function, to use the player ratings vector, x, to calculate the probabiluty of P1 and P2
-        winning each game in the matches df
+        A function, used in the Loss function, to use the player ratings vector, x, to calculate the (time decay
+        weighted) log likelihood of the results between each pair of players in the pairs df
 
         Parameters
         ----------
@@ -255,51 +379,51 @@ class ModelA:
             This is a vector of length (Number of Players) where each entry represents the players strength variable
 
         data_constants : list (of arrays)
-            This is the model-specific arrays calculated as part of the model generation stage (recall: nCr, P1_ID, ...)
+            This is the model-specific arrays calculated as part of the model generation stage (recall: log_nCr, P1_ID, ...)
 
         Returns
         -------
-        game_win_prob : tf.Vector # TODO: check this is actually correct
-            A tensorflow Vector containing the probability of P1 winning each game
+        pair_LL : tf.Vector
+            A tensorflow Vector containing the log likelihood of the results between each pair of players
         """
 
 
-        p1_ID_t, p2_ID_t, nCr_t, time_decay, p1_frames_t, p2_frames_t = data_constants
+        p1_ID_t, p2_ID_t, log_nCr_t, time_decay, p1_frames_t, p2_frames_t = data_constants
 
         p1_strength = tf.gather(x, p1_ID_t)
         p2_strength = tf.gather(x, p2_ID_t)
 
         player_strength_differential = tf.math.subtract(p1_strength, p2_strength)
 
-        p1_frame_win_prob_t = tf.math.sigmoid(player_strength_differential)
-        p2_frame_win_prob_t = tf.math.sigmoid(tf.math.scalar_mul(-1, player_strength_differential))
+        # log_sigmoid rather than log(sigmoid) so heavily one-sided pairs do not underflow to log(0)
+        p1_frame_win_log_prob_t = tf.math.log_sigmoid(player_strength_differential)
+        p2_frame_win_log_prob_t = tf.math.log_sigmoid(tf.math.scalar_mul(-1, player_strength_differential))
 
-        # game_win_prob = nCr x (p1_frame_win_prob)^r X (p2_frame_win_prob)^(n-r) , where n-r = number of p2 frames, r = number of p1 frames
+        # log(game_win_prob) = log(nCr) + r log(p1_frame_win_prob) + (n-r) log(p2_frame_win_prob), summed over the
+        # games of each pair with the time decay weights already folded into log_nCr, r and (n-r)
 
-        p1_contribution = tf.math.pow(p1_frame_win_prob_t, p1_frames_t)
-        p2_contribution = tf.math.pow(p2_frame_win_prob_t, p2_frames_t)
-        raw_probability = tf.math.multiply(p1_contribution, p2_contribution)
+        p1_contribution = tf.math.multiply(p1_frames_t, p1_frame_win_log_prob_t)
+        p2_contribution = tf.math.multiply(p2_frames_t, p2_frame_win_log_prob_t)
 
-        game_win_prob = tf.math.multiply(nCr_t, raw_probability)
+        pair_LL = log_nCr_t + p1_contribution + p2_contribution
 
-        return game_win_prob
+        return pair_LL
     
     def transform_tensor(self, vec):
         """
-        A function which takes a Vector and returns sum of the logs of each element. In this case, it is the negative LL
+        A function which takes a Vector of log likelihoods and returns the negative of their sum
 
         Parameters
         ----------
         vec : tf.Vector (containing dtype tf.float32)
-            This is a vector of game-win probabilities
+            This is a vector of log likelihoods for each pair of players
 
         Returns
         -------
         negative_LL : tf. Scalar
             This is a scalar showing the current negative Log Likelihood (LL) of the model
         """
-        log_vec = tf.math.log(vec)
-        overall_LL = tf.math.reduce_sum(log_vec)
+        overall_LL = tf.math.reduce_sum(vec)
         negative_LL = tf.math.scalar_mul(-1, overall_LL)
         return negative_LL
     
@@ -317,65 +441,784 @@ class ModelA:
 
         Returns
         -------
-        None
+        result : tf.Scalar
+            The negative LL of the model for the player strengths x, plus the prior penalty
         """
-        with tf.GradientTape() as tape:
-            tape.watch(x)
-
-            prob_results_tensor = self.x_to_probabilities(x, data_constants)
-            result = self.transform_tensor(prob_results_tensor)
+        LL_results_tensor = self.x_to_log_likelihoods(x, data_constants)
+        result = self.transform_tensor(LL_results_tensor) + self.prior_penalty(x)
 
         return result
+
+    def prior_penalty(self, x):
+        """
+        The negative log of the Gaussian prior on the player strengths, centred on the initial strength of 0.5
+
+        Parameters
+        ----------
+        x : tf.Variable (containing dtype tf.float32)
+            This is a vector of length (Number of Players) where each entry represents the players strength variable
+
+        Returns
+        -------
+        penalty : tf.Scalar
+            0.5 * l2_prior * sum((x - 0.5)^2)
+        """
+        return 0.5 * self.l2_prior * tf.math.reduce_sum(tf.math.square(x - 0.5))
+
+    def build_train_steps(self, x, optimizer, data_constants, compiled=True, jit_compile=False):
+        """
+        Builds the function which runs a number of optimisation steps of the player strength vector x. When compiled,
+        the steps are traced once into a tf.function, so the whole tf.while_loop of steps runs as a single graph
+        call rather than dispatching every op from Python
+
+        Parameters
+        ----------
+        x : tf.Variable (containing dtype tf.float32)
+            This is a vector of length (Number of Players) where each entry represents the players strength variable
+
+        optimizer : tf.keras.optimizers.legacy.Optimizer
+            The optimizer which applies the gradients to x
+
+        data_constants : list (of arrays)
+            This is the model-specific arrays calculated as part of the model generation stage
+
+        compiled : bool
+            Controls whether the steps are compiled into a tf.function, or run eagerly. Default to True
+
+        jit_compile : bool
+            Controls whether the tf.function is also compiled with XLA. Default to False
+
+        Returns
+        -------
+        train_steps : callable
+            Called as train_steps(steps) with a tf.int32 scalar, runs that many optimisation steps and returns the
+            negative LL and gradient norm of the last step
+        """
+        data_constants = [tf.constant(constant) for constant in data_constants]
+        grad_mask = self.build_gradient_mask()
+
+        # the optimizer slots must exist before the graph is traced, as variables cannot be created inside a loop
+        optimizer.apply_gradients([(tf.zeros_like(x), x)])
+
+        def train_step(i, loss_value, grad_norm):
+            with tf.GradientTape() as tape:
+                loss_value = self.loss(x, data_constants)
+
+            grads = tape.gradient(loss_value, x)
+            if grad_mask is not None:
+                grads = tf.math.multiply(grads, grad_mask)
+            optimizer.apply_gradients([(grads, x)])
+
+            return i + 1, loss_value, tf.norm(grads, ord='euclidean')
+
+        def train_steps(steps):
+            loop_vars = (tf.constant(0), tf.constant(float('NaN')), tf.constant(float('NaN')))
+            _, loss_value, grad_norm = tf.while_loop(lambda i, loss_value, grad_norm: i < steps, train_step, loop_vars)
+            return loss_value, grad_norm
+
+        if compiled:
+            train_steps = tf.function(train_steps, jit_compile=jit_compile)
+
+        return train_steps
     
-    def fit_model(self, iterations, lr=0.0001):
+    def fit_model(self, iterations, lr=0.0001, rel_tol=1e-7, grad_tol=1e-3, check_every=100, history_size=1_000,
+                  callback=None, compiled=True, jit_compile=False):
         """
         Function that uses the Adam tensorflow optimiser to find the optimal player-rating vector that minimises
         our loss function, given the matches data
 
+        The optimisation runs in blocks of check_every iterations. After each block the loss, norm and gradient norm
+        are recorded in the history, passed to the callback and checked for convergence. The optimisation stops
+        early once the relative decrease of the loss since the last block falls below rel_tol, or the gradient norm
+        falls below grad_tol
+
         Parameters
         ----------
+        iterations : int
+            This is the maximum number of interations which we run the optimisation for
+
         lr : float
             This is learning rate which can be tuned to change optimisation characteristics
 
-        iterations : int
-            This is the number of interations which we run the optimisation for
+        rel_tol : float
+            Relative decrease of the loss between two checks below which the optimisation is considered converged
+
+        grad_tol : float
+            Euclidean norm of the gradient below which the optimisation is considered converged
+
+        check_every : int
+            The number of iterations between each check of the convergence criteria
+
+        history_size : int
+            The number of checks to keep in the history, older checks are overwritten
+
+        callback : callable, optional
+            Called at every check as callback(iteration, loss, norm, grad_norm). If it returns True the optimisation
+            is stopped. Defaults to printing the progress every 1000 iterations
+
+        compiled : bool
+            Controls whether the optimisation steps are compiled into a tf.function, or run eagerly. Default to True
+
+        jit_compile : bool
+            Controls whether the compiled optimisation steps are also compiled with XLA. Default to False
 
         Returns
         -------
         None
         """
-        p1_ID_t, p2_ID_t, nCr_t, time_t, p1_frames_t, p2_frames_t = self.apply_model_transforms(NegBin=True)
-        data_constants = [p1_ID_t, p2_ID_t, nCr_t, time_t, p1_frames_t, p2_frames_t]
+        p1_ID_t, p2_ID_t, log_nCr_t, time_t, p1_frames_t, p2_frames_t = self.apply_model_transforms(NegBin=True)
+        data_constants = [p1_ID_t, p2_ID_t, log_nCr_t, time_t, p1_frames_t, p2_frames_t]
 
         x = tf.Variable([0.5] * len(self.player_data), trainable=True, dtype=tf.float32)
 
         optimizer = tf.keras.optimizers.legacy.Adam(learning_rate=lr)
 
-        variables = [x]
+        train_steps = self.build_train_steps(x, optimizer, data_constants, compiled=compiled, jit_compile=jit_compile)
+
+        if callback is None:
+            callback = self.print_progress
+
+        self.history = MetricHistory(history_size)
+        self.converged = False
+        previous_loss = float('NaN')
+        iteration = 0
 
         # Use the optimizer to minimize the loss
-        for _ in range(iterations):
-            with tf.GradientTape() as tape:
-                tape.watch(variables)
-                loss_value = self.loss(x, data_constants)
-                self.LL_evolution.append(loss_value)
+        while iteration < iterations:
+            steps = min(check_every, iterations - iteration)
+            loss_value, grad_norm = train_steps(tf.constant(steps))
+            iteration += steps
 
-            grads = tape.gradient(loss_value, variables)
+            loss = float(loss_value.numpy())
+            norm = float(self.track_tensor_norm(x).numpy())
+            grad_norm = float(grad_norm.numpy())
+            self.history.append(iteration, loss, norm, grad_norm)
 
-            optimizer.apply_gradients(zip(grads, variables))
+            stop = callback(iteration, loss, norm, grad_norm)
 
-            if _ % 100 == 0:
-                self.norm.append(self.track_tensor_norm(x))
+            rel_change = (previous_loss - loss) / max(abs(loss), 1.0)
+            if grad_norm < grad_tol or 0 <= rel_change < rel_tol:
+                self.converged = True
+                stop = True
 
-            if _ % 1_000 == 0:
-                norm = self.track_tensor_norm(x)
-                print('Iteration: {}, Loss: {}, Norm: {}'.format(_, loss_value.numpy(), norm.numpy()))  # , X: {}'.format(loss_value.numpy(), x.numpy()))
+            previous_loss = loss
+
+            if stop:
+                break
         
-        self.final_LL = self.LL_evolution[-1]
-        optimised_player_df = self.return_opt_player_strength_df(x.numpy())
-        optimised_player_df.to_csv('ratings')
+        self.n_iterations = iteration
+        self.final_LL = self.history.last('loss')
+        self.store_optimised_ratings(x.numpy())
+
+    def fit_model_minibatch(self, epochs, batch_size=8_192, lr=0.5, lr_decay=0.0, rel_tol=1e-10, grad_tol=1e-4,
+                            history_size=1_000, callback=None, seed=None, training_store=None):
+        """
+        Function that fits the player-rating vector on shuffled mini-batches of games, streamed out of compact
+        arrays, so neither the per-game columns of apply_model_transforms nor the pairs DataFrame are built. With a
+        training_store, the batches are gathered from its memory-mapped arrays, and only the row numbers of the
+        training games are held in memory
+
+        Every epoch starts with a full pass over the games, one batch at a time, at the current (snapshot) ratings,
+        which gives the loss, the full gradient and the curvature of each player. The epoch then takes one step per
+        mini-batch with the variance-reduced gradient, the batch gradient at the ratings minus the batch gradient at
+        the snapshot plus the full gradient, which goes to zero at the optimum, so the steps converge to the full-batch
+        optimum rather than to a noise ball around it. Each step is scaled by the inverse curvature of each player,
+        plus a correction moving all the free players together, which the per-player scaling is slow to do. The
+        ratings are Polyak averaged over the steps of the epoch, and the average is the next snapshot
+
+        Parameters
+        ----------
+        epochs : int
+            This is the maximum number of passes over the training set which we run the optimisation for
+
+        batch_size : int
+            The number of games in each mini-batch
+
+        lr : float
+            This is the initial learning rate, the fraction of the curvature-scaled step taken
+
+        lr_decay : float
+            The learning rate decays as lr / (1 + lr_decay * epoch). Default to 0, as the variance-reduced steps
+            converge at a fixed learning rate
+
+        rel_tol : float
+            Relative decrease of the loss between two epochs below which the optimisation is considered converged
+
+        grad_tol : float
+            Euclidean norm of the full gradient below which the optimisation is considered converged
+
+        history_size : int
+            The number of epochs to keep in the history, older epochs are overwritten
+
+        callback : callable, optional
+            Called after every full pass as callback(iteration, loss, norm, grad_norm). If it returns True the
+            optimisation is stopped. Defaults to printing the progress every epoch
+
+        seed : int, optional
+            Seed for the shuffling of the mini-batches
+
+        training_store : TrainingStore, optional
+            The store the games of match_df were read from, see model.training_store, to stream the batches from
+
+        Returns
+        -------
+        None
+        """
+        game_arrays, rows, player_map = self.game_batch_source(training_store)
+        n_players = len(self.player_data)
+        steps_per_epoch = int(np.ceil(len(rows) / batch_size))
 
+        free = np.ones(n_players, dtype=bool)
+        free[[self.idx_mapping[player_id] for player_id in self.reference_players]] = False
+
+        if callback is None:
+            callback = partial(self.print_progress, every=steps_per_epoch)
+
+        self.history = MetricHistory(history_size)
+        self.converged = False
+        previous_loss = float('NaN')
+        rng = np.random.default_rng(seed)
+        x = np.full(n_players, 0.5)
+
+        for epoch in range(epochs + 1):
+            # the snapshot of the epoch, at which the full gradient is taken
+            snapshot = x.copy()
+            loss, full_grad, curvature, coarse_curvature = self.evaluate_games(snapshot, game_arrays, rows, player_map,
+                                                                               batch_size, free)
+            iteration = epoch * steps_per_epoch
+            norm = float(np.linalg.norm(snapshot))
+            grad_norm = float(np.linalg.norm(full_grad))
+            self.history.append(iteration, loss, norm, grad_norm)
+
+            stop = callback(iteration, loss, norm, grad_norm)
+
+            rel_change = (previous_loss - loss) / max(abs(loss), 1.0)
+            if grad_norm < grad_tol or 0 <= rel_change < rel_tol:
+                self.converged = True
+                stop = True
+
+            previous_loss = loss
+
+            if stop or epoch == epochs:
+                break
+
+            epoch_lr = lr / (1 + lr_decay * epoch)
+            x_avg = np.zeros(n_players)
+            order = rng.permutation(len(rows))
+
+            for step, start in enumerate(range(0, len(rows), batch_size)):
+                # sorted so that memory-mapped training arrays are read front to back
+                batch = self.gather_game_batch(game_arrays, rows[np.sort(order[start:start + batch_size])], player_map)
+                scale = len(rows) / len(batch[0])
+
+                grad = (scale * (self.game_batch_gradient(x, batch)[1] - self.game_batch_gradient(snapshot, batch)[1])
+                        + full_grad + self.l2_prior * (x - snapshot))
+                grad[~free] = 0.0
+
+                player_step = np.divide(grad, curvature, out=np.zeros(n_players), where=curvature > 0)
+                if coarse_curvature > 0:
+                    player_step[free] += grad[free].sum() / coarse_curvature
+                x = x - epoch_lr * player_step
+
+                x_avg += (x - x_avg) / (step + 1)
+
+            x = x_avg
+
+        self.n_iterations = iteration
+        self.final_LL = self.history.last('loss')
+
+        # the Hessian of the ratings' uncertainty, accumulated over one more pass rather than from the pairs DataFrame
+        hessian = self.evaluate_games(snapshot, game_arrays, rows, player_map, batch_size, free, hessian=True)[-1]
+        self.store_optimised_ratings(snapshot, hessian=hessian)
+
+    def game_batch_source(self, training_store=None):
+        """
+        Function that returns the compact arrays the games of the training set are streamed from by
+        fit_model_minibatch: the arrays of the training store, or arrays of the columns of match_df
+
+        Parameters
+        ----------
+        training_store : TrainingStore, optional
+            The store the games of match_df were read from
+
+        Returns
+        -------
+        game_arrays : dict of np.Array
+            The day number, player indices and frames of each game, keyed by the column names of the training store
+        rows : np.Array
+            The rows of the arrays holding the games of the training set, in increasing order
+        player_map : np.Array
+            The index in the player strength vector of each player index of the arrays
+        """
+        if training_store is not None:
+            self.re_index_player_IDs()
+            rows = pd.Index(training_store.arrays['game_id']).get_indexer(self.match_data.index)
+            if (rows < 0).any():
+                raise ValueError(f'{(rows < 0).sum()} games of match_df are not in the training store')
+            player_map = self.player_data.index.get_indexer(training_store.player_ids)
+
+            return training_store.arrays, np.sort(rows), player_map
+
+        self.re_index_player_IDs()
+        game_arrays = {'day': (pd.to_datetime(self.match_data['date']) - pd.Timestamp(0)).dt.days.to_numpy(np.int32),
+                       'player_one_idx': self.match_data['player_one_id'].to_numpy(np.int32),
+                       'player_two_idx': self.match_data['player_two_id'].to_numpy(np.int32),
+                       'player_one_frames': self.match_data['player_one_frames'].to_numpy(np.int16),
+                       'player_two_frames': self.match_data['player_two_frames'].to_numpy(np.int16)}
+
+        return game_arrays, np.arange(len(self.match_data)), np.arange(len(self.player_data))
+
+    def gather_game_batch(self, game_arrays, rows, player_map):
+        """
+        Function that gathers a batch of games out of the game arrays, with the player strength vector index of each
+        player, the time decay weight of each game and the log nCr of its scoreline (in the Negative-Binomial case)
+
+        Returns
+        -------
+        batch : tuple of np.Array
+            The player one index, player two index, time decay, log nCr, player one frames and player two frames of
+            each game of the batch
+        """
+        p1_idx = player_map[game_arrays['player_one_idx'][rows]]
+        p2_idx = player_map[game_arrays['player_two_idx'][rows]]
+        p1_frames = game_arrays['player_one_frames'][rows].astype(np.float64)
+        p2_frames = game_arrays['player_two_frames'][rows].astype(np.float64)
+
+        # whole days before as_of, as in update_time_decay_col
+        as_of_day = (self.as_of - pd.Timestamp(0)) / pd.Timedelta(days=1)
+        time_decay = np.exp(self.decay_factor * np.floor(game_arrays['day'][rows] - as_of_day))
+        log_nCr = np.log(comb(np.maximum(p1_frames + p2_frames - 1, 0), np.maximum(p1_frames - 1, 0)))
+
+        return p1_idx, p2_idx, time_decay, log_nCr, p1_frames, p2_frames
+
+    def game_batch_gradient(self, x, batch):
+        """
+        Function that calculates the (time decay weighted) negative LL of a batch of games, without the prior, and
+        its gradient with respect to the player strength vector x
+
+        Returns
+        -------
+        negative_LL : float
+            The negative LL of the games of the batch
+        grad : np.Array
+            The gradient of the negative LL with respect to each player strength
+        p1_frame_win_prob : np.Array
+            The probability of player one winning a frame, in each game
+        """
+        p1_idx, p2_idx, time_decay, log_nCr, p1_frames, p2_frames = batch
+        n_players = len(x)
+
+        player_strength_differential = x[p1_idx] - x[p2_idx]
+        p1_frame_win_prob = expit(player_strength_differential)
+
+        negative_LL = -np.sum(time_decay * (log_nCr + p1_frames * log_expit(player_strength_differential)
+                                            + p2_frames * log_expit(-player_strength_differential)))
+
+        # d(-LL)/d(differential) of each game, which adds to player one's gradient and subtracts from player two's
+        game_grad = -time_decay * (p1_frames * (1 - p1_frame_win_prob) - p2_frames * p1_frame_win_prob)
+        grad = np.bincount(p1_idx, game_grad, minlength=n_players) - np.bincount(p2_idx, game_grad, minlength=n_players)
+
+        return negative_LL, grad, p1_frame_win_prob
+
+    def evaluate_games(self, x, game_arrays, rows, player_map, batch_size, free, hessian=False):
+        """
+        Function that makes a full pass over the games of the training set, one batch at a time, so the memory used
+        does not grow with the size of the training set
+
+        Parameters
+        ----------
+        x : np.Array
+            The player strength vector the games are evaluated at
+
+        game_arrays, rows, player_map
+            The games of the training set, see game_batch_source
+
+        batch_size : int
+            The number of games in each batch
+
+        free : np.Array
+            Boolean mask of the players which are not pinned
+
+        hessian : bool
+            Controls whether the sparse Hessian of the negative LL is also accumulated. Default to False
+
+        Returns
+        -------
+        negative_LL : float
+            The negative LL of the model over the full training set, plus the prior penalty
+
+        grad : np.Array
+            The gradient of the negative LL, zero for the pinned players
+
+        curvature : np.Array
+            The diagonal of the Hessian of the negative LL, the curvature of each player
+
+        coarse_curvature : float
+            The curvature of moving all the free players together, through their games against pinned players and
+            the prior
+
+        hessian : scipy.sparse.csc_matrix
+            The Hessian of the negative LL, without the prior, only returned if hessian is True
+        """
+        n_players = len(x)
+        negative_LL = 0.5 * self.l2_prior * np.sum(np.square(x - 0.5))
+        grad = self.l2_prior * (x - 0.5)
+        curvature = np.full(n_players, float(self.l2_prior))
+        coarse_curvature = self.l2_prior * free.sum()
+        total_hessian = None
+
+        for start in range(0, len(rows), batch_size):
+            batch = self.gather_game_batch(game_arrays, rows[start:start + batch_size], player_map)
+            p1_idx, p2_idx, time_decay, _, p1_frames, p2_frames = batch
+
+            batch_LL, batch_grad, p1_frame_win_prob = self.game_batch_gradient(x, batch)
+            negative_LL += batch_LL
+            grad += batch_grad
+
+            game_curvature = time_decay * (p1_frames + p2_frames) * p1_frame_win_prob * (1 - p1_frame_win_prob)
+            curvature += (np.bincount(p1_idx, game_curvature, minlength=n_players)
+                          + np.bincount(p2_idx, game_curvature, minlength=n_players))
+            coarse_curvature += game_curvature[free[p1_idx] != free[p2_idx]].sum()
+
+            if hessian:
+                batch_hessian = build_hessian(p1_idx, p2_idx, time_decay * (p1_frames + p2_frames), x)
+                total_hessian = batch_hessian if total_hessian is None else total_hessian + batch_hessian
+
+        grad[~free] = 0.0
+
+        if hessian:
+            if total_hessian is None:
+                total_hessian = scipy.sparse.csc_matrix((n_players, n_players))
+            return float(negative_LL), grad, curvature, float(coarse_curvature), total_hessian.tocsc()
+
+        return float(negative_LL), grad, curvature, float(coarse_curvature)
+
+    def store_optimised_ratings(self, strength_vector, hessian=None):
+        """
+        Function that stores the optimised player strengths, along with the variance of each from the Laplace
+        approximation, as the optimised_ratings attribute, and writes them to a new ratings artifact
+
+        Parameters
+        ----------
+        strength_vector : np.Array
+            This is an array of the optimised player strength values
+
+        hessian : scipy.sparse.csc_matrix, optional
+            The Hessian of the negative LL at the optimum, without the prior, see compute_rating_uncertainty
+
+        Returns
+        -------
+        None
+        """
+        optimised_player_df = self.return_opt_player_strength_df(strength_vector)
+        optimised_player_df['rating_variance'] = self.compute_rating_uncertainty(strength_vector, hessian=hessian)
         self.optimised_ratings = optimised_player_df
+        self.save_ratings_artifact()
+
+    def save_ratings_artifact(self):
+        """
+        Function that writes the optimised ratings, the fit metadata and the watermark of the training data to a new
+        versioned artifact in the ratings_path directory, see model.artifact.save_ratings_artifact
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        version : str or None
+            The version of the artifact, None if the ratings_path is None
+        """
+        if self.ratings_path is None:
+            return None
+
+        metadata = {'model': type(self).__name__,
+                    'decay_factor': self.decay_factor,
+                    'l2_prior': self.l2_prior,
+                    'as_of': self.as_of.isoformat(),
+                    'final_LL': float(self.final_LL),
+                    'n_iterations': int(self.n_iterations),
+                    'converged': bool(self.converged),
+                    'reference_players': [int(player_id) for player_id in self.reference_players],
+                    'n_players': len(self.optimised_ratings),
+                    'n_games': len(self.match_data),
+                    # the latest game in the training data, so consumers know which games the ratings include
+                    'watermark_game_id': int(self.match_data.index.max()) if len(self.match_data) else None,
+                    'watermark_date': str(pd.to_datetime(self.match_data['date']).max())}
+
+        self.ratings_version = save_ratings_artifact(self.optimised_ratings, self.ratings_path, metadata)
+
+        return self.ratings_version
+
+    def compute_rating_uncertainty(self, strength_vector, hessian=None, prior_precision=1e-6):
+        """
+        Function that computes the variance of each player's rating from the Laplace approximation, the diagonal of
+        the inverse of the (sparse) Hessian of the negative LL at the optimum. Ratings are only identified relative to
+        each other, so the reference players (or, without any, the player with the most frames) are pinned and the
+        variances are relative to them. The factorised Hessian is kept as the rating_covariance attribute
+
+        Parameters
+        ----------
+        strength_vector : np.Array
+            This is an array of the optimised player strength values
+
+        hessian : scipy.sparse.csc_matrix, optional
+            The Hessian of the negative LL at the optimum, without the prior. Defaults to building it from the
+            pair_data of the fit
+
+        prior_precision : float
+            Added to the diagonal of the Hessian, so players outside the pinned player's component get a huge
+            variance rather than making the Hessian singular
+
+        Returns
+        -------
+        variances : np.Array
+            The variance of each player's rating, in the order of the player strength vector
+        """
+        if hessian is None:
+            p1_idx = self.pair_data['player_one_id'].values.astype(np.int64)
+            p2_idx = self.pair_data['player_two_id'].values.astype(np.int64)
+            frames = (self.pair_data['player_one_frames'] + self.pair_data['player_two_frames']).values
+            hessian = build_hessian(p1_idx, p2_idx, frames, np.asarray(strength_vector, dtype=np.float64))
+
+        prior_diagonal = np.full(hessian.shape[0], max(prior_precision, self.l2_prior))
+        hessian = (hessian + scipy.sparse.diags(prior_diagonal)).tocsc()
+
+        if self.reference_players:
+            pinned_idx = [self.idx_mapping[player_id] for player_id in self.reference_players]
+        else:
+            pinned_idx = [int(np.argmax(hessian.diagonal()))]
+
+        self.rating_covariance = RatingCovariance(hessian, pinned_idx)
+
+        return self.rating_covariance.variances()
+
+    def rating_difference_variance(self, player_one_ids, player_two_ids):
+        """
+        Function that returns the variance of the difference between the ratings of pairs of players, from the
+        Laplace approximation computed for the last fit
+
+        Parameters
+        ----------
+        player_one_ids : sequence of int
+            The player ID of player one of each pair
+
+        player_two_ids : sequence of int
+            The player ID of player two of each pair
+
+        Returns
+        -------
+        difference_variances : np.Array
+            The variance of the rating difference of each pair
+        """
+        p1_idx = [self.idx_mapping[player_id] for player_id in player_one_ids]
+        p2_idx = [self.idx_mapping[player_id] for player_id in player_two_ids]
+
+        return self.rating_covariance.difference_variances(p1_idx, p2_idx)
+
+    def rating_pair_covariance(self, player_one_ids, player_two_ids):
+        """
+        Function that returns the covariance between the ratings of pairs of players, from the Laplace approximation
+        computed for the last fit. The variance of the rating difference of a pair is the sum of the two rating
+        variances less twice this, so pricing can combine it with variances that have since moved, e.g. with the
+        online updates
+
+        Parameters
+        ----------
+        player_one_ids : sequence of int
+            The player ID of player one of each pair
+
+        player_two_ids : sequence of int
+            The player ID of player two of each pair
+
+        Returns
+        -------
+        covariances : np.Array
+            The covariance of the ratings of each pair, NaN for pairs with a player who is not in the fit
+        """
+        p1_idx = np.array([self.idx_mapping.get(player_id, -1) for player_id in player_one_ids], dtype=np.int64)
+        p2_idx = np.array([self.idx_mapping.get(player_id, -1) for player_id in player_two_ids], dtype=np.int64)
+        in_fit = (p1_idx >= 0) & (p2_idx >= 0)
+
+        covariances = np.full(len(p1_idx), np.nan)
+        covariances[in_fit] = self.rating_covariance.pair_covariances(p1_idx[in_fit], p2_idx[in_fit])[2]
+
+        return covariances
+
+    def evaluate(self, game_df, n_bins=10):
+        """
+        Function that scores the optimised ratings on held-out games, see model.evaluation.evaluate_ratings
+
+        Parameters
+        ----------
+        game_df : pandas.DataFrame
+            The held-out games, with the columns of the game table
+
+        n_bins : int
+            The number of reliability bins
+
+        Returns
+        -------
+        evaluation : dict
+            The summary scores, the frame and match reliability bins and the calibration of each format
+        """
+        return evaluate_ratings(self.optimised_ratings['rating'], game_df, n_bins)
+
+    def build_gradient_mask(self):
+        """
+        Function that builds the mask applied to the gradients of the player strength vector, which is zero for the
+        reference players so their ratings stay pinned at their initial value
+
+        Returns
+        -------
+        grad_mask : tf.Vector or None
+            A vector of length (Number of Players) of ones, with zeros at the reference players, or None if there are
+            no reference players
+        """
+        if not self.reference_players:
+            return None
+
+        grad_mask = np.ones(len(self.player_data), dtype=np.float32)
+        grad_mask[[self.idx_mapping[player_id] for player_id in self.reference_players]] = 0.0
+
+        return tf.constant(grad_mask)
+
+    def find_player_components(self):
+        """
+        Function that finds the connected components of the who-played-whom graph of the training set. Ratings are
+        only identified relative to the other players of the same component, so only the players in the largest
+        component (the main tour) can be priced against each other
+
+        Returns
+        -------
+        player_components : pandas.DataFrame
+            A DataFrame indexed by player ID with the component of each player (numbered by decreasing size), the
+            component size, the number of games played, whether the player is the reference player of the
+            component (the player with the most games) and whether the player is identifiable (in the largest
+            component)
+        """
+        n_players = len(self.player_data)
+        p1_idx = self.player_data.index.get_indexer(self.raw_match_data['player_one_id'])
+        p2_idx = self.player_data.index.get_indexer(self.raw_match_data['player_two_id'])
+
+        labels = find_components(p1_idx, p2_idx, n_players)
+        games = np.bincount(p1_idx, minlength=n_players) + np.bincount(p2_idx, minlength=n_players)
+
+        player_components = pd.DataFrame({'component': labels, 'games': games}, index=self.player_data.index)
+        player_components['component_size'] = player_components.groupby('component')['component'].transform('size')
+        player_components['reference'] = False
+        player_components.loc[player_components.groupby('component')['games'].idxmax(), 'reference'] = True
+        main_component = player_components['component'].iloc[np.argmax(player_components['component_size'].to_numpy())]
+        player_components['identifiable'] = player_components['component'] == main_component
+
+        self.player_components = player_components
+
+        return player_components
+
+    def fit_components(self, processes=None, min_component_size=2, **fit_kwargs):
+        """
+        Function that fits every connected component of the player graph independently, across a pool of
+        processes, with the reference player of each component pinned. Only the ratings of the main (largest)
+        component are stored as the optimised_ratings, the players of the other components are flagged as
+        unidentifiable in player_components, listed in unidentifiable_players, and their ratings are kept apart in
+        component_ratings. The reference players are kept as the reference_players, and the pair_data and
+        rating_covariance are built over every player, as for fit_model
+
+        Parameters
+        ----------
+        processes : int, optional
+            The number of worker processes, defaults to the number of CPUs. With 1 process, or a single component to
+            fit, the fit runs in this process
+
+        min_component_size : int
+            Components with fewer players than this are not fitted
+
+        **fit_kwargs
+            Passed on to fit_model for every component, so they must be picklable
+
+        Returns
+        -------
+        None
+        """
+        player_components = self.find_player_components()
+
+        # the components are fitted with the settings of this model, so their ratings are those of one fit
+        model_kwargs = {'decay_factor': self.decay_factor, 'l2_prior': self.l2_prior, 'as_of': self.as_of}
+
+        jobs = {}
+        for component, members in player_components.groupby('component'):
+            if len(members) < min_component_size:
+                continue
+            # both players of a game are always in the same component
+            match_mask = self.raw_match_data['player_one_id'].isin(members.index)
+            reference_id = members.index[members['reference']][0]
+            jobs[component] = (self.raw_match_data.loc[match_mask].copy(), self.player_data.loc[members.index].copy(),
+                               reference_id, model_kwargs, fit_kwargs)
+
+        if processes == 1 or len(jobs) == 1:
+            results = {component: fit_component(*job) for component, job in jobs.items()}
+        else:
+            # spawn rather than fork, as tensorflow is not fork-safe once it has been initialised
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = {component: executor.submit(fit_component, *job) for component, job in jobs.items()}
+                results = {component: future.result() for component, future in futures.items()}
+
+        self.component_ratings = pd.concat([ratings.assign(component=component)
+                                            for component, (ratings, _, _, _) in results.items()])
+        self.final_LL = sum(final_LL for _, final_LL, _, _ in results.values())
+        self.n_iterations = max(n_iterations for _, _, n_iterations, _ in results.values())
+        self.converged = all(converged for _, _, _, converged in results.values())
+
+        self.unidentifiable_players = player_components.index[~player_components['identifiable']]
+
+        # the components share no games, so the Hessian over every player is block diagonal, and with the reference
+        # player of each fitted component pinned its inverse is the covariance of the ratings of every component
+        self.reference_players = [reference_id for _, _, reference_id, _, _ in jobs.values()]
+        self.apply_model_transforms(NegBin=True)
+        strength_vector = self.component_ratings['rating'].reindex(self.player_ids).fillna(0.5).to_numpy()
+        self.compute_rating_uncertainty(strength_vector)
+
+        main_component = player_components.loc[player_components['identifiable'], 'component'].iloc[0]
+        self.optimised_ratings = results[main_component][0]
+        self.save_ratings_artifact()
+
+    def print_progress(self, iteration, loss, norm, grad_norm, every=1_000):
+        """
+        The default fit_model callback, which prints the progress of the optimisation every 1000 iterations
+
+        Parameters
+        ----------
+        iteration : int
+            The current iteration of the optimisation
+
+        loss : float
+            The current negative LL
+
+        norm : float
+            The current norm of the player strength vector
+
+        grad_norm : float
+            The current norm of the gradient of the loss
+
+        every : int
+            The number of iterations between each print
+
+        Returns
+        -------
+        stop : bool
+            Always False, printing never stops the optimisation
+        """
+        if iteration % every == 0:
+            print('Iteration: {}, Loss: {}, Norm: {}, Grad Norm: {}'.format(iteration, loss, norm, grad_norm))
+        return False
+
+    @property
+    def LL_evolution(self):
+        return self.history.column('loss')
+
+    @property
+    def norm(self):
+        return self.history.column('norm')
     
     def return_opt_player_strength_df(self, strength_vector):
         """
@@ -392,10 +1235,7 @@ class ModelA:
             A pandas dataframe mapping the new strength ratings back to original player ID
         """
         
-        map_dict = self.idx_mapping
-        original_ID_and_strength = {original_ID : strength for original_ID, strength in zip(list(map_dict.keys()), list(strength_vector))}
-        df = pd.DataFrame.from_dict(data=original_ID_and_strength, orient='index', columns=['rating'])
-        df.index.name = 'player_id'
+        df = pd.DataFrame({'rating': strength_vector}, index=pd.Index(self.player_ids, name='player_id'))
 
         return df
     
@@ -419,14 +1259,16 @@ class ModelA:
         """
         Helper function to plot quantities of interest during the model optimisation
         """
-        plt.plot(np.arange(len(self.LL_evolution)), self.LL_evolution)  # we are minimizing the negative LL
+        iterations = self.history.column('iteration')
+
+        plt.plot(iterations, self.LL_evolution)  # we are minimizing the negative LL
         plt.xlabel('Iterations')
         plt.ylabel('Negative LL')
         plt.title('Evolution of the LL With Optimisation Iteration')
         plt.savefig('Neg_LL_Evolution_Snooker')
         plt.show()
 
-        plt.plot(np.arange(len(self.norm)), self.norm)  # we are minimizing the negative LL
+        plt.plot(iterations, self.norm)
         plt.xlabel('Iterations')
         plt.ylabel('Euclidean Norm')
         plt.title('Euclidean Norm Evolution With Optimisation Iteration')
@@ -0,0 +1,159 @@
+"""
+Online updates of the player ratings between the batch fits of the model, one game at a time
+"""
+import numpy as np
+import pandas as pd
+
+
+class OnlineRatingUpdater:
+    """
+    Updates player ratings one game at a time with a one-step Newton (extended Kalman) update of the two players
+    involved, so results can move prices between the daily batch fits of ModelA
+
+    Each player's rating is treated as Gaussian with a variance. For a game of n frames with r won by player one,
+    the frame model gives the gradient g = r - n p and curvature c = n p (1 - p) of the log likelihood with
+    respect to the rating difference d, where p = sigmoid(d). With s = v1 + v2, the update is
+
+        r1 += v1 g / (1 + c s),     r2 -= v2 g / (1 + c s)
+        v1 -= c v1^2 / (1 + c s),   v2 -= c v2^2 / (1 + c s)
+
+    and every player's variance grows by daily_drift for each day between their games
+
+    Parameters
+    ----------
+    rating_df : pandas.DataFrame
+        DataFrame indexed by player ID with a 'rating' column, the ratings from the last batch fit, and optionally a
+        'rating_variance' column with the variance of each rating
+    last_game_id : int
+        The largest game ID that the ratings already include. Only later games are applied
+    rating_variance : float
+        The variance of the ratings which have no variance in rating_df
+    daily_drift : float
+        The increase in the variance of a rating for each day without a game
+    minimum_variance : float
+        The smallest variance a rating starts with. The variances of ModelA are relative to the pinned reference
+        players, whose own variance is 0, so without a floor the reference players would never move, and the
+        players closely tied to them would barely move
+
+    Attributes
+    ----------
+    ratings : dict
+        The current rating of each player, keyed by player ID
+    variances : dict
+        The current variance of each player's rating, keyed by player ID
+    last_game_id : int
+        The largest game ID applied so far
+    """
+
+    def __init__(self, rating_df, last_game_id, rating_variance=0.05, daily_drift=1e-4, minimum_variance=1e-3):
+        self.ratings = rating_df['rating'].astype(float).to_dict()
+        if 'rating_variance' in rating_df:
+            variances = rating_df['rating_variance'].fillna(rating_variance).astype(float)
+            self.variances = variances.clip(lower=minimum_variance).to_dict()
+        else:
+            self.variances = dict.fromkeys(self.ratings, max(float(rating_variance), minimum_variance))
+        self.last_played = {}
+
+        self.last_game_id = last_game_id
+        self.daily_drift = daily_drift
+
+    def drift_variance(self, player_id, date):
+        """
+        Grows the variance of a player's rating for the days since their last game
+
+        Parameters
+        ----------
+        player_id : int
+            The player ID
+        date : pandas.Timestamp or None
+            The date of the game about to be applied
+        """
+        if date is None or pd.isnull(date):
+            return
+
+        last_played = self.last_played.get(player_id)
+        if last_played is not None:
+            days = max((date - last_played).days, 0)
+            self.variances[player_id] += self.daily_drift * days
+
+        self.last_played[player_id] = date
+
+    def update_game(self, player_one_id, player_two_id, player_one_frames, player_two_frames, date=None):
+        """
+        Applies the result of a single game to the ratings of its two players, in O(1)
+
+        Parameters
+        ----------
+        player_one_id : int
+            The player ID of player one
+        player_two_id : int
+            The player ID of player two
+        player_one_frames : int
+            The number of frames player one won
+        player_two_frames : int
+            The number of frames player two won
+        date : pandas.Timestamp, optional
+            The date of the game, used to grow the variances for the time since each player's last game
+
+        Returns
+        -------
+        updated : bool
+            False if the game was skipped because one of the players has no rating
+        """
+        if player_one_id not in self.ratings or player_two_id not in self.ratings:
+            return False
+
+        self.drift_variance(player_one_id, date)
+        self.drift_variance(player_two_id, date)
+
+        v1 = self.variances[player_one_id]
+        v2 = self.variances[player_two_id]
+        frames = player_one_frames + player_two_frames
+
+        p1_frame_win_prob = 1. / (1 + np.exp(-(self.ratings[player_one_id] - self.ratings[player_two_id])))
+        gradient = player_one_frames - frames * p1_frame_win_prob
+        curvature = frames * p1_frame_win_prob * (1 - p1_frame_win_prob)
+        denominator = 1 + curvature * (v1 + v2)
+
+        self.ratings[player_one_id] += v1 * gradient / denominator
+        self.ratings[player_two_id] -= v2 * gradient / denominator
+        self.variances[player_one_id] = v1 - curvature * v1 ** 2 / denominator
+        self.variances[player_two_id] = v2 - curvature * v2 ** 2 / denominator
+
+        return True
+
+    def update_games(self, game_df):
+        """
+        Applies every game after last_game_id in a game DataFrame, in game ID order. Games involving a player with
+        no rating, or without a result, are skipped; they are picked up by the next batch fit
+
+        Parameters
+        ----------
+        game_df : pandas.DataFrame
+            DataFrame of games indexed by game ID, with the columns of the game table
+
+        Returns
+        -------
+        changed_rating_df : pandas.DataFrame
+            DataFrame indexed by player ID with 'rating' and 'rating_variance' columns, holding the new ratings of
+            the players whose rating changed
+        """
+        new_game_df = game_df.loc[game_df.index > self.last_game_id].sort_index()
+        new_game_df = new_game_df.dropna(subset=['player_one_frames', 'player_two_frames'])
+
+        changed_player_ids = set()
+        for game in new_game_df.itertuples():
+            if self.update_game(game.player_one_id, game.player_two_id,
+                                game.player_one_frames, game.player_two_frames, game.date):
+                changed_player_ids.update((game.player_one_id, game.player_two_id))
+
+        if len(game_df) > 0:
+            self.last_game_id = max(self.last_game_id, game_df.index.max())
+
+        changed_player_ids = list(changed_player_ids)
+        changed_rating_df = pd.DataFrame({'rating': [self.ratings[player_id] for player_id in changed_player_ids],
+                                          'rating_variance': [self.variances[player_id]
+                                                              for player_id in changed_player_ids]},
+                                         index=pd.Index(changed_player_ids, name='player_id'))
+
+        return changed_rating_df
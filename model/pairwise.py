@@ -0,0 +1,194 @@
+"""
+Head-to-head probabilities for every pair of active players, materialised after a fit as float32 arrays that can be
+memory mapped, so pricing any fixture is an array lookup rather than a call into the model
+
+Each build writes a complete set of matrices to a new version directory, and a 'LATEST' file naming the newest
+version is replaced once the set is complete, so a reader always loads the player IDs and matrices of one build
+"""
+import os
+import shutil
+
+import numpy as np
+
+# The best of formats a match win matrix is built for
+DEFAULT_FORMATS = (7, 9, 11, 13, 17, 19, 25, 35)
+
+# The number of rows of the match win matrices computed at once, bounding the memory of calc_game_win_prob
+ROW_BLOCK_SIZE = 64
+
+LATEST_FILE = 'LATEST'
+
+# The number of versions kept, so a reader which has just read LATEST can still open the version it names
+KEEP_VERSIONS = 2
+
+
+def latest_version(directory):
+    """
+    Returns the latest version of the matrices in a directory, or None if there is none
+    """
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as latest_file:
+            return latest_file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(directory):
+    """
+    Returns every complete version of the matrices in a directory, oldest first
+    """
+    return sorted(entry for entry in os.listdir(directory)
+                  if entry.startswith('pairwise_') and os.path.isdir(os.path.join(directory, entry)))
+
+
+def build_probability_matrices(rating, directory, best_of_formats=DEFAULT_FORMATS, player_ids=None):
+    """
+    Builds the frame win probability of every player against every other by broadcasting the ratings, and the
+    match win probability for each format from it, saving them as float32 .npy files to a new version directory:
+    'player_ids.npy' (the sorted player IDs, the row and column of each player), 'frame.npy' and
+    'match_bo<best of>.npy'. Entry (i, j) is the probability that player i beats player j. The version is made the
+    latest once every file is written, and older versions are removed
+
+    Parameters
+    ----------
+    rating : pandas.Series
+        The rating of each player, indexed by player ID
+    directory : str
+        The directory the versions are saved to, created if it does not exist
+    best_of_formats : sequence of int
+        The formats to build a match win matrix for
+    player_ids : sequence of int, optional
+        The players to include, e.g. only the recently active players, as the matrices grow with the square of the
+        number of players. Players without a rating are left out. Defaults to every rated player
+
+    Returns
+    -------
+    matrices : PairwiseProbabilities
+        The saved matrices, memory mapped
+    """
+    # imported here, as calc_server loads pandas, which the lookups of PairwiseProbabilities do not need
+    import pandas as pd
+    from calc_server.probability_calcs import calc_game_win_prob
+
+    rating = rating if player_ids is None else rating[rating.index.isin(player_ids)]
+    rating = rating.sort_index()
+    rating_values = rating.to_numpy(dtype=np.float64)
+    n_players = len(rating_values)
+
+    version = f'pairwise_{pd.Timestamp.utcnow():%Y%m%dT%H%M%S%f}'
+    version_directory = os.path.join(directory, version)
+    # written under a temporary name, which list_versions does not pick up, and renamed once complete
+    temporary_directory = f'{version_directory}.tmp'
+    os.makedirs(temporary_directory)
+
+    frame_matrix = 1. / (1 + np.exp(-(rating_values[:, None] - rating_values[None, :])))
+
+    for best_of in best_of_formats:
+        match_matrix = np.empty((n_players, n_players), dtype=np.float32)
+        for start in range(0, n_players, ROW_BLOCK_SIZE):
+            block = frame_matrix[start:start + ROW_BLOCK_SIZE]
+            match_matrix[start:start + ROW_BLOCK_SIZE] = calc_game_win_prob(block.ravel(),
+                                                                            np.full(block.size, best_of)
+                                                                            ).reshape(block.shape)
+        np.save(os.path.join(temporary_directory, f'match_bo{best_of}.npy'), match_matrix)
+
+    np.save(os.path.join(temporary_directory, 'frame.npy'), frame_matrix.astype(np.float32))
+    np.save(os.path.join(temporary_directory, 'player_ids.npy'), rating.index.to_numpy(dtype=np.int64))
+    os.rename(temporary_directory, version_directory)
+
+    latest_path = os.path.join(directory, LATEST_FILE)
+    with open(f'{latest_path}.tmp', 'w') as latest_file:
+        latest_file.write(version)
+    os.replace(f'{latest_path}.tmp', latest_path)
+
+    for old_version in list_versions(directory)[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(directory, old_version), ignore_errors=True)
+
+    return PairwiseProbabilities(directory, version)
+
+
+class PairwiseProbabilities:
+    """
+    The head-to-head probability matrices saved by build_probability_matrices, memory mapped read-only
+
+    Parameters
+    ----------
+    directory : str
+        The directory the matrices were saved to
+    version : str, optional
+        The version to load, defaults to the latest
+
+    Attributes
+    ----------
+    version : str
+        The version loaded
+    player_ids : np.Array
+        The sorted player IDs, the row and column of each player in the matrices
+    frame : np.Array
+        The (Number of Players) x (Number of Players) frame win probabilities
+    match : dict of int:np.Array
+        The match win probabilities, keyed by best of
+    """
+
+    def __init__(self, directory, version=None):
+        version = latest_version(directory) if version is None else version
+        if version is None:
+            raise FileNotFoundError(f'There are no pairwise probability matrices in {directory}')
+
+        self.version = version
+        version_directory = os.path.join(directory, version)
+
+        self.player_ids = np.load(os.path.join(version_directory, 'player_ids.npy'))
+        self.frame = np.load(os.path.join(version_directory, 'frame.npy'), mmap_mode='r')
+        self.match = {int(file_name[len('match_bo'):-len('.npy')]): np.load(os.path.join(version_directory, file_name),
+                                                                             mmap_mode='r')
+                      for file_name in os.listdir(version_directory)
+                      if file_name.startswith('match_bo') and file_name.endswith('.npy')}
+
+    def index(self, player_ids):
+        """
+        Returns the row/column of each player in the matrices, -1 for players who are not in them
+
+        Parameters
+        ----------
+        player_ids : sequence of int
+            The player IDs
+
+        Returns
+        -------
+        idx : np.Array
+            The index of each player
+        """
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        # with no players in the matrices there is no last row to clip the search to
+        if len(self.player_ids) == 0:
+            return np.full(len(player_ids), -1, dtype=np.int64)
+        idx = np.searchsorted(self.player_ids, player_ids)
+        idx = np.minimum(idx, len(self.player_ids) - 1)
+        return np.where(self.player_ids[idx] == player_ids, idx, -1)
+
+    def lookup(self, matrix, player_one_ids, player_two_ids):
+        """
+        Looks up the entries of a matrix for pairs of players, NaN where either player is not in it
+        """
+        p1_idx = self.index(player_one_ids)
+        p2_idx = self.index(player_two_ids)
+        found = (p1_idx >= 0) & (p2_idx >= 0)
+
+        probabilities = np.full(len(p1_idx), np.nan, dtype=np.float32)
+        probabilities[found] = matrix[p1_idx[found], p2_idx[found]]
+
+        return probabilities
+
+    def frame_prob(self, player_one_ids, player_two_ids):
+        """
+        Returns the probability that player one wins a frame against player two, for each pair of players
+        """
+        return self.lookup(self.frame, player_one_ids, player_two_ids)
+
+    def match_prob(self, player_one_ids, player_two_ids, best_of):
+        """
+        Returns the probability that player one wins a match of a given best of against player two, for each pair of
+        players. Raises a KeyError if no matrix was built for the format
+        """
+        return self.lookup(self.match[int(best_of)], player_one_ids, player_two_ids)
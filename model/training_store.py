@@ -0,0 +1,308 @@
+"""
+Compact binary store of the played games, the training data of ModelA. Each column is a contiguous raw array on disk
+(int32 player indices and day numbers, int8 frame counts, int16 best of) that new games are appended to, and that is
+memory mapped on load, so building a training set needs neither the database nor object-typed DataFrames
+"""
+import hashlib
+import json
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from database_engine.filters import minimum_games_fixed_point
+
+# The columns of the store and their dtypes, each kept in <column>.bin
+STORE_ARRAYS = {'game_id': np.int32,
+                'day': np.int32,
+                'player_one_idx': np.int32,
+                'player_two_idx': np.int32,
+                'player_one_frames': np.int8,
+                'player_two_frames': np.int8,
+                'best_of': np.int16}
+
+# The player ID of each player index, in the order the players were first seen
+PLAYER_IDS_FILE = 'player_ids.bin'
+PLAYER_IDS_DTYPE = np.int64
+
+# The number of games and players committed to the store, the watermark of the game table and the fingerprint of the
+# URLs of the store's players
+META_FILE = 'store.json'
+
+# Games still without a result this many days after their date are taken to be never played (e.g. cancelled), so the
+# watermark moves past them rather than waiting for them
+UNPLAYED_CUTOFF_DAYS = 30
+
+# best_of of the games played to an unknown format
+UNKNOWN_BEST_OF = 0
+
+
+def player_fingerprint(player_ids, player_url):
+    """
+    Returns a checksum of the URL of each of a number of players, which changes if any of the player IDs is given to
+    another player, e.g. by a player refresh, or is no longer in the player table
+    """
+    player_urls = player_url.reindex(player_ids).astype(object)
+    text = '\n'.join(f'{player_id} {url}' for player_id, url in zip(player_ids, player_urls))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def read_raw_array(path, dtype, length):
+    """
+    Memory maps the first length entries of a raw array file, read-only
+    """
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+
+def append_raw_array(path, values, length):
+    """
+    Appends values to a raw array file after its first length entries, dropping anything after them left by an
+    append that was never committed
+    """
+    with open(path, 'ab') as array_file:
+        array_file.truncate(length * values.dtype.itemsize)
+        values.tofile(array_file)
+
+
+class TrainingStore:
+    """
+    The played games of the game table as compact arrays on disk. Games are appended incrementally with append, and
+    only committed by rewriting the store metadata once every array has been written, so a reader (or a crashed
+    writer) never sees a partly appended game
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the store, created empty if it does not exist
+    player_url : pandas.Series, optional
+        The URL of each player of the player table, indexed by player ID. If any player of the store now has another
+        URL, the player IDs have changed (e.g. after a player refresh) and the store is emptied, to be rebuilt from
+        the whole game table on the next append. New players do not change the store's players
+
+    Attributes
+    ----------
+    n_games : int
+        The number of games in the store
+    player_ids : np.Array
+        The player ID of each player index
+    watermark_game_id : int
+        Every game of the game table with a game ID up to the watermark has been appended, if it was played. Later
+        games are read from the database on the next append
+    player_fingerprint : str or None
+        The fingerprint of the URLs of the store's players (see player_fingerprint), None if it has not been given
+        the player URLs
+    """
+
+    def __init__(self, directory, player_url=None):
+        self.directory = directory
+        self.player_url = player_url
+        os.makedirs(directory, exist_ok=True)
+
+        self.load()
+        if player_url is not None and self.player_fingerprint != player_fingerprint(self.player_ids, player_url):
+            self.reset()
+
+    def reset(self):
+        """
+        Empties the store, so it is rebuilt from the whole game table on the next append. The arrays past the
+        committed lengths are dropped by the next append
+        """
+        fingerprint = None if self.player_url is None else player_fingerprint(self.player_ids[:0], self.player_url)
+        self.commit(0, 0, 0, fingerprint)
+
+    def game_summary(self):
+        """
+        Returns the number of games of the store up to the watermark, and the sum of the CRC32 checksums of their
+        'game_id|player_one_id|player_two_id|player_one_frames|player_two_frames', as
+        database_engine.get_played_game_summary computes them for the played games of the game table
+
+        Returns
+        -------
+        summary : dict
+            The 'row_count' and 'checksum' of the games
+        """
+        up_to_watermark = self.arrays['game_id'] <= self.watermark_game_id
+        game_rows = zip(self.arrays['game_id'][up_to_watermark].tolist(),
+                        self.player_ids[self.arrays['player_one_idx'][up_to_watermark]].tolist(),
+                        self.player_ids[self.arrays['player_two_idx'][up_to_watermark]].tolist(),
+                        self.arrays['player_one_frames'][up_to_watermark].tolist(),
+                        self.arrays['player_two_frames'][up_to_watermark].tolist())
+        checksum = sum(zlib.crc32('|'.join(map(str, game_row)).encode()) for game_row in game_rows)
+        return {'row_count': int(up_to_watermark.sum()), 'checksum': checksum}
+
+    def check_games(self, game_summary):
+        """
+        Empties the store if its games up to the watermark are not the played games of the game table up to the
+        watermark, e.g. because a raw refresh renumbered the games, so the store is never built from a mix of the
+        old and new games
+
+        Parameters
+        ----------
+        game_summary : dict
+            The 'row_count' and 'checksum' of the played games of the game table up to the watermark, from
+            database_engine.get_played_game_summary(store.watermark_game_id)
+
+        Returns
+        -------
+        unchanged : bool
+            Whether the games matched, and the store was kept
+        """
+        unchanged = game_summary == self.game_summary()
+        if not unchanged:
+            self.reset()
+        return unchanged
+
+    def load(self):
+        """
+        Reads the store metadata and memory maps the committed part of every array
+        """
+        directory = self.directory
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+        else:
+            meta = {'n_games': 0, 'n_players': 0, 'watermark_game_id': 0}
+
+        self.n_games = meta['n_games']
+        self.watermark_game_id = meta['watermark_game_id']
+        self.player_fingerprint = meta.get('player_fingerprint')
+        self.player_ids = read_raw_array(os.path.join(directory, PLAYER_IDS_FILE), PLAYER_IDS_DTYPE, meta['n_players'])
+        self.arrays = {column: read_raw_array(os.path.join(directory, f'{column}.bin'), dtype, self.n_games)
+                       for column, dtype in STORE_ARRAYS.items()}
+
+    def append(self, game_df, unplayed_cutoff=None):
+        """
+        Appends the played games of a game DataFrame that are not yet in the store, e.g. the games read with
+        database_engine.read_game_after(store.watermark_game_id), and moves the watermark on. The watermark stops
+        before the first game without a result dated on/after the unplayed cutoff, so that game is read again, and
+        appended once it has been played. Games without a result dated before the cutoff, or without a date, are
+        skipped
+
+        Parameters
+        ----------
+        game_df : pandas.DataFrame
+            DataFrame of games indexed by game ID, with the columns of the game table
+        unplayed_cutoff : str or pandas.Timestamp, optional
+            The date before which games without a result are taken to be never played. Defaults to
+            UNPLAYED_CUTOFF_DAYS before today
+
+        Returns
+        -------
+        n_appended : int
+            The number of games appended
+        """
+        unplayed = game_df[['date', 'player_one_frames', 'player_two_frames']].isnull().any(axis=1)
+        played_df = game_df.loc[~unplayed & ~game_df.index.isin(self.arrays['game_id'])]
+
+        columns = {'game_id': played_df.index.to_numpy(),
+                   'day': (pd.to_datetime(played_df['date']) - pd.Timestamp(0)).dt.days.to_numpy(),
+                   'player_one_frames': played_df['player_one_frames'].to_numpy(),
+                   'player_two_frames': played_df['player_two_frames'].to_numpy(),
+                   'best_of': played_df['best_of'].fillna(UNKNOWN_BEST_OF).to_numpy()}
+        for column, values in columns.items():
+            dtype_info = np.iinfo(STORE_ARRAYS[column])
+            if len(values) and (values.min() < dtype_info.min or values.max() > dtype_info.max):
+                raise ValueError(f'{column} does not fit in {np.dtype(STORE_ARRAYS[column]).name}')
+
+        # players are given the next free index the first time they are seen, so existing indices never change
+        player_index = pd.Index(self.player_ids)
+        game_player_ids = np.concatenate([played_df['player_one_id'].to_numpy(dtype=PLAYER_IDS_DTYPE),
+                                          played_df['player_two_id'].to_numpy(dtype=PLAYER_IDS_DTYPE)])
+        new_player_ids = pd.unique(game_player_ids[player_index.get_indexer(game_player_ids) < 0])
+        player_ids = np.concatenate([self.player_ids, new_player_ids]).astype(PLAYER_IDS_DTYPE)
+        player_idx = pd.Index(player_ids).get_indexer(game_player_ids)
+        columns['player_one_idx'] = player_idx[:len(played_df)]
+        columns['player_two_idx'] = player_idx[len(played_df):]
+
+        append_raw_array(os.path.join(self.directory, PLAYER_IDS_FILE), new_player_ids.astype(PLAYER_IDS_DTYPE),
+                         len(self.player_ids))
+        for column, dtype in STORE_ARRAYS.items():
+            append_raw_array(os.path.join(self.directory, f'{column}.bin'), columns[column].astype(dtype),
+                             self.n_games)
+
+        if unplayed_cutoff is None:
+            unplayed_cutoff = pd.Timestamp.today().normalize() - pd.Timedelta(days=UNPLAYED_CUTOFF_DAYS)
+        pending = unplayed & (pd.to_datetime(game_df['date']) >= pd.Timestamp(unplayed_cutoff))
+
+        watermark_game_id = self.watermark_game_id
+        if len(game_df) > 0:
+            if pending.any():
+                watermark_game_id = max(watermark_game_id, int(game_df.index[pending].min()) - 1)
+            else:
+                watermark_game_id = max(watermark_game_id, int(game_df.index.max()))
+
+        fingerprint = self.player_fingerprint if self.player_url is None else player_fingerprint(player_ids,
+                                                                                                 self.player_url)
+        self.commit(self.n_games + len(played_df), len(player_ids), watermark_game_id, fingerprint)
+
+        return len(played_df)
+
+    def commit(self, n_games, n_players, watermark_game_id, player_fingerprint):
+        """
+        Atomically rewrites the store metadata, then re-maps the arrays up to the new number of games
+        """
+        meta_path = os.path.join(self.directory, META_FILE)
+        with open(f'{meta_path}.tmp', 'w') as meta_file:
+            json.dump({'n_games': n_games, 'n_players': n_players, 'watermark_game_id': watermark_game_id,
+                       'player_fingerprint': player_fingerprint}, meta_file)
+        os.replace(f'{meta_path}.tmp', meta_path)
+
+        self.load()
+
+    def training_set(self, last_played_filter="2010-01-01", game_date_filter="2010-01-01", minimum_games_filter=10):
+        """
+        Builds the training set of ModelA from the store, with the filters of
+        database_engine.read_game_player_filtered: players must have last played on/after the last played filter
+        and have played at least the minimum number of games on/after the game date filter against each other (see
+        minimum_games_fixed_point), and games are those on/after the game date filter between two such players
+
+        Parameters
+        ----------
+        last_played_filter : str
+            The date which all the players must have played on/after
+        game_date_filter : str
+            The date which all games must occur on/after
+        minimum_games_filter : int
+            The minimum number of games the player must play in
+
+        Returns
+        -------
+        player_df : pandas.DataFrame
+            The players of the training set indexed by player ID, with their 'last_played' date and 'total_games'
+        game_df : pandas.DataFrame
+            The games of the training set indexed by game ID, with the date, player IDs, frames and best of (NaN
+            where it is unknown)
+        """
+        day = self.arrays['day']
+        p1_idx = self.arrays['player_one_idx']
+        p2_idx = self.arrays['player_two_idx']
+        n_players = len(self.player_ids)
+
+        last_played = np.full(n_players, np.iinfo(np.int32).min, dtype=np.int64)
+        np.maximum.at(last_played, p1_idx, day)
+        np.maximum.at(last_played, p2_idx, day)
+        recent_player = last_played >= (pd.Timestamp(last_played_filter) - pd.Timestamp(0)).days
+
+        game_mask = (day >= (pd.Timestamp(game_date_filter) - pd.Timestamp(0)).days) & recent_player[p1_idx] \
+            & recent_player[p2_idx]
+        player_mask, game_mask, total_games = minimum_games_fixed_point(p1_idx, p2_idx, recent_player, game_mask,
+                                                                         minimum_games_filter)
+
+        player_df = pd.DataFrame({'last_played': pd.to_datetime(last_played[player_mask], unit='D'),
+                                  'total_games': total_games[player_mask]},
+                                 index=pd.Index(self.player_ids[player_mask], name='player_id'))
+
+        best_of = self.arrays['best_of'][game_mask].astype(np.float64)
+        game_df = pd.DataFrame({'date': pd.to_datetime(day[game_mask], unit='D'),
+                                'player_one_id': self.player_ids[p1_idx[game_mask]],
+                                'player_two_id': self.player_ids[p2_idx[game_mask]],
+                                'player_one_frames': self.arrays['player_one_frames'][game_mask],
+                                'player_two_frames': self.arrays['player_two_frames'][game_mask],
+                                'best_of': np.where(best_of == UNKNOWN_BEST_OF, np.nan, best_of)},
+                               index=pd.Index(self.arrays['game_id'][game_mask], name='game_id'))
+
+        return player_df, game_df
@@ -0,0 +1,304 @@
+"""
+Hyperparameter search for ModelA. Every configuration of the time decay, L2 prior and data filters is fitted at a
+series of rolling origins, on the games before each origin, and scored by the log loss of the frames played in the
+following horizon. Configurations are scored in parallel worker processes, which share a single read-only,
+memory-mapped copy of the game arrays
+"""
+import itertools
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from database_engine.filters import minimum_games_fixed_point
+
+# The columns of the game table shared with the worker processes, and their dtypes
+GAME_ARRAYS = {'day': np.int32,
+               'player_one_id': np.int32,
+               'player_two_id': np.int32,
+               'player_one_frames': np.int16,
+               'player_two_frames': np.int16}
+
+DEFAULT_GRID = {'decay_factor': [1 / 365, 1 / 725, 1 / 1450],
+                'l2_prior': [0.0, 0.01, 0.1],
+                'game_date_filter': ['2008-01-01', '2012-01-01'],
+                'minimum_games_filter': [10, 25, 50]}
+
+DEFAULT_FIT_KWARGS = {'iterations': 20_000, 'lr': 0.01}
+
+# The game arrays in a worker process, loaded once by load_shared_games
+SHARED_GAMES = None
+
+# The rating the test games are scored with for the players a configuration does not rate, an average player
+UNRATED_RATING = 0.5
+
+
+def game_df_to_arrays(game_df):
+    """
+    Converts a game DataFrame to the compact arrays shared with the worker processes, dropping unplayed games
+
+    Parameters
+    ----------
+    game_df : pandas.DataFrame
+        DataFrame with the columns of the game table
+
+    Returns
+    -------
+    games : dict of str:np.Array
+        The game arrays, with dates as the number of days since 1970-01-01
+    """
+    game_df = game_df.dropna(subset=['date', 'player_one_frames', 'player_two_frames'])
+    day = (pd.to_datetime(game_df['date']) - pd.Timestamp(0)).dt.days
+    columns = {'day': day, **{column: game_df[column] for column in GAME_ARRAYS if column != 'day'}}
+    return {column: columns[column].to_numpy(dtype=dtype) for column, dtype in GAME_ARRAYS.items()}
+
+
+def load_shared_games(directory):
+    """
+    Worker process initialiser, memory maps the game arrays saved in a directory so every worker shares the same
+    read-only pages
+
+    Parameters
+    ----------
+    directory : str
+        The directory the game arrays were saved to with numpy.save
+    """
+    global SHARED_GAMES
+    SHARED_GAMES = {column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r') for column in GAME_ARRAYS}
+
+
+def to_day(date):
+    """
+    Returns the number of days between 1970-01-01 and a date
+    """
+    return (pd.Timestamp(date) - pd.Timestamp(0)).days
+
+
+def rolling_origins(games, n_origins=4, horizon_days=182):
+    """
+    Returns the origins of the rolling-origin validation: n_origins dates, horizon_days apart, with the last
+    horizon ending on the date of the latest game
+
+    Parameters
+    ----------
+    games : dict of str:np.Array
+        The game arrays
+    n_origins : int
+        The number of origins
+    horizon_days : int
+        The number of days of games scored after each origin
+
+    Returns
+    -------
+    origins : list of int
+        The origins, as days since 1970-01-01
+    """
+    last_day = int(games['day'].max()) + 1
+    return [last_day - horizon_days * k for k in range(n_origins, 0, -1)]
+
+
+def training_set(games, origin, config):
+    """
+    Builds the training set as of an origin, with the filters of database_engine.read_game_player_filtered applied
+    to the games before the origin (with the last played filter equal to the game date filter). Players must have
+    played at least the minimum number of games on/after the game date filter against each other, see
+    database_engine.filters.minimum_games_fixed_point
+
+    Parameters
+    ----------
+    games : dict of str:np.Array
+        The game arrays
+    origin : int
+        The origin, as days since 1970-01-01
+    config : dict
+        The configuration, with 'game_date_filter' and 'minimum_games_filter' keys
+
+    Returns
+    -------
+    player_df : pandas.DataFrame
+        The players of the training set, indexed by player ID
+    game_df : pandas.DataFrame
+        The games of the training set
+    """
+    game_mask = (games['day'] >= to_day(config['game_date_filter'])) & (games['day'] < origin)
+    p1_ids = games['player_one_id'][game_mask]
+    p2_ids = games['player_two_id'][game_mask]
+
+    player_ids, player_idx = np.unique(np.concatenate([p1_ids, p2_ids]), return_inverse=True)
+    player_mask, kept_game_mask, _ = minimum_games_fixed_point(player_idx[:len(p1_ids)], player_idx[len(p1_ids):],
+                                                               np.ones(len(player_ids), dtype=bool),
+                                                               np.ones(len(p1_ids), dtype=bool),
+                                                               config['minimum_games_filter'])
+    player_ids = player_ids[player_mask]
+
+    game_mask[game_mask] = kept_game_mask
+
+    game_df = pd.DataFrame({'date': pd.to_datetime(games['day'][game_mask], unit='D'),
+                            **{column: games[column][game_mask] for column in GAME_ARRAYS if column != 'day'}})
+    player_df = pd.DataFrame(index=pd.Index(player_ids, name='player_id'))
+
+    return player_df, game_df
+
+
+def frame_log_loss(rating, games, test_mask, unrated_rating=UNRATED_RATING):
+    """
+    The log loss per frame of the games selected by a mask, under the frame model with the given ratings. Every
+    game is scored, with the players without a rating given a fixed prior rating, so every configuration is scored
+    on the same frames whichever players its filters kept
+
+    Parameters
+    ----------
+    rating : pandas.Series
+        The rating of each player, indexed by player ID
+    games : dict of str:np.Array
+        The game arrays
+    test_mask : np.Array
+        Boolean mask selecting the games to score
+    unrated_rating : float
+        The rating of the players without one. Ratings are only identified up to a shift, so they are first
+        shifted to a mean of 0.5, the initial strength of ModelA
+
+    Returns
+    -------
+    log_loss : float
+        The negative log likelihood of the frames of the scored games, divided by the number of frames
+    frames : int
+        The number of frames scored
+    """
+    p1_idx = rating.index.get_indexer(games['player_one_id'][test_mask])
+    p2_idx = rating.index.get_indexer(games['player_two_id'][test_mask])
+
+    rating_values = rating.to_numpy(dtype=np.float64)
+    rating_values = np.append(rating_values - rating_values.mean() + 0.5, unrated_rating)
+    p1_frames = games['player_one_frames'][test_mask].astype(np.float64)
+    p2_frames = games['player_two_frames'][test_mask].astype(np.float64)
+    # get_indexer gives -1 for a player without a rating, the unrated rating appended last
+    player_strength_differential = rating_values[p1_idx] - rating_values[p2_idx]
+
+    # log(sigmoid(d)) = -log(1 + exp(-d)), computed without overflow
+    negative_LL = (p1_frames * np.logaddexp(0, -player_strength_differential)
+                   + p2_frames * np.logaddexp(0, player_strength_differential)).sum()
+    frames = p1_frames.sum() + p2_frames.sum()
+
+    return negative_LL / max(frames, 1), int(frames)
+
+
+def score_configuration(config, origins, horizon_days, fit_kwargs):
+    """
+    Scores a configuration by fitting ModelA at each origin and taking the log loss per frame of the games in the
+    following horizon. Every played game of the horizon is scored, so all the configurations are compared on the same
+    games, see frame_log_loss. Runs in a worker process, on the shared game arrays
+
+    Parameters
+    ----------
+    config : dict
+        The configuration, with 'decay_factor', 'l2_prior', 'game_date_filter' and 'minimum_games_filter' keys
+    origins : list of int
+        The origins, as days since 1970-01-01
+    horizon_days : int
+        The number of days of games scored after each origin
+    fit_kwargs : dict
+        Passed on to ModelA.fit_model
+
+    Returns
+    -------
+    score : dict
+        The configuration, the log loss at each origin and the frame-weighted mean log loss over all origins
+    """
+    from .modelA import ModelA
+
+    games = SHARED_GAMES
+    score = dict(config)
+    total_negative_LL = 0.0
+    total_frames = 0
+
+    for origin in origins:
+        player_df, game_df = training_set(games, origin, config)
+        snooker_model = ModelA(game_df, player_df, decay_factor=config['decay_factor'], l2_prior=config['l2_prior'],
+                               as_of=pd.to_datetime(origin, unit='D'))
+        snooker_model.ratings_path = None
+        snooker_model.fit_model(callback=lambda *args: False, **fit_kwargs)
+
+        test_mask = (games['day'] >= origin) & (games['day'] < origin + horizon_days)
+        log_loss, frames = frame_log_loss(snooker_model.optimised_ratings['rating'], games, test_mask)
+
+        score[f'log_loss_{pd.to_datetime(origin, unit="D").date()}'] = log_loss
+        total_negative_LL += log_loss * frames
+        total_frames += frames
+
+    score['log_loss'] = total_negative_LL / max(total_frames, 1)
+
+    return score
+
+
+def grid_configurations(grid):
+    """
+    Returns every combination of the values in a grid
+
+    Parameters
+    ----------
+    grid : dict of str:list
+        The values to try for each hyperparameter
+
+    Returns
+    -------
+    configs : list of dict
+        One dict per combination
+    """
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def tune(game_df, grid=None, n_origins=4, horizon_days=182, processes=None, fit_kwargs=None):
+    """
+    Runs the hyperparameter search over a grid of configurations, scoring each one on rolling-origin out-of-sample
+    log loss across a pool of worker processes
+
+    Parameters
+    ----------
+    game_df : pandas.DataFrame
+        Every game the training sets may be drawn from, with the columns of the game table, e.g. from
+        database_engine.read_game()
+    grid : dict of str:list, optional
+        The values to try for 'decay_factor', 'l2_prior', 'game_date_filter' and 'minimum_games_filter'. Defaults
+        to DEFAULT_GRID
+    n_origins : int
+        The number of rolling origins
+    horizon_days : int
+        The number of days of games scored after each origin
+    processes : int, optional
+        The number of worker processes, defaults to the number of CPUs
+    fit_kwargs : dict, optional
+        Passed on to ModelA.fit_model. Defaults to DEFAULT_FIT_KWARGS
+
+    Returns
+    -------
+    results_df : pandas.DataFrame
+        One row per configuration, with the log loss at each origin and overall, best configuration first
+    """
+    grid = DEFAULT_GRID if grid is None else grid
+    fit_kwargs = DEFAULT_FIT_KWARGS if fit_kwargs is None else fit_kwargs
+
+    games = game_df_to_arrays(game_df)
+    origins = rolling_origins(games, n_origins, horizon_days)
+    configs = grid_configurations(grid)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for column, values in games.items():
+            np.save(os.path.join(directory, f'{column}.npy'), values)
+
+        # spawn rather than fork, as tensorflow is not fork-safe once it has been initialised
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=load_shared_games, initargs=(directory,)) as executor:
+            futures = [executor.submit(score_configuration, config, origins, horizon_days, fit_kwargs)
+                       for config in configs]
+            scores = []
+            for config_number, future in enumerate(futures, start=1):
+                scores.append(future.result())
+                print(f'Scored configuration {config_number}/{len(configs)}: {scores[-1]}')
+
+    results_df = pd.DataFrame(scores).sort_values('log_loss').reset_index(drop=True)
+
+    return results_df
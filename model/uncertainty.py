@@ -0,0 +1,171 @@
+"""
+Laplace approximation of the uncertainty of the player ratings. At the optimum, the Hessian of the negative LL of
+the frame model is a weighted graph Laplacian of the who-played-whom graph, so it is sparse and cheap to factorise
+"""
+import numpy as np
+import scipy.sparse
+from scipy.sparse.linalg import splu
+
+# The number of columns of the inverse Hessian solved for at once
+SOLVE_BLOCK_SIZE = 256
+
+
+def build_hessian(p1_idx, p2_idx, frames, strength_vector, prior_precision=0.0):
+    """
+    Builds the sparse Hessian of the negative LL with respect to the player strengths. Each pair of players adds
+    c = n p (1 - p) to the diagonal entries of both players and -c to the two off-diagonal entries, where n is the
+    (weighted) number of frames between them and p the frame win probability
+
+    Parameters
+    ----------
+    p1_idx : np.Array
+        The index of player one of each pair
+    p2_idx : np.Array
+        The index of player two of each pair
+    frames : np.Array
+        The (time decay weighted) number of frames played between each pair
+    strength_vector : np.Array
+        The player strengths at which the Hessian is evaluated
+    prior_precision : float
+        Added to the diagonal, so players without games do not make the Hessian singular
+
+    Returns
+    -------
+    hessian : scipy.sparse.csc_matrix
+        The (Number of Players) x (Number of Players) Hessian
+    """
+    n_players = len(strength_vector)
+
+    p1_frame_win_prob = 1. / (1 + np.exp(-(strength_vector[p1_idx] - strength_vector[p2_idx])))
+    curvature = frames * p1_frame_win_prob * (1 - p1_frame_win_prob)
+
+    off_diagonal = scipy.sparse.coo_matrix((-curvature, (p1_idx, p2_idx)), shape=(n_players, n_players))
+    diagonal = (np.bincount(p1_idx, curvature, minlength=n_players)
+                + np.bincount(p2_idx, curvature, minlength=n_players) + prior_precision)
+
+    hessian = off_diagonal + off_diagonal.T + scipy.sparse.diags(diagonal)
+
+    return hessian.tocsc()
+
+
+class RatingCovariance:
+    """
+    The covariance of the player ratings under the Laplace approximation, the inverse of the Hessian with the
+    pinned players removed. The Hessian is factorised once, and only the entries of the inverse that are asked for
+    are solved for
+
+    Parameters
+    ----------
+    hessian : scipy.sparse.csc_matrix
+        The Hessian of the negative LL at the optimum
+    pinned_idx : sequence of int
+        The indexes of the players whose ratings are pinned, and so have no variance
+    """
+
+    def __init__(self, hessian, pinned_idx):
+        self.n_players = hessian.shape[0]
+        self.free_idx = np.setdiff1d(np.arange(self.n_players), np.asarray(pinned_idx, dtype=np.int64))
+
+        # position of each player in the free players, -1 for pinned players
+        self.free_position = np.full(self.n_players, -1, dtype=np.int64)
+        self.free_position[self.free_idx] = np.arange(len(self.free_idx))
+
+        self.factor = splu(hessian[self.free_idx][:, self.free_idx].tocsc(), permc_spec='MMD_AT_PLUS_A')
+
+    def columns(self, player_idx):
+        """
+        Solves for the columns of the covariance matrix of some players
+
+        Parameters
+        ----------
+        player_idx : np.Array
+            The indexes of the players
+
+        Returns
+        -------
+        columns : np.Array
+            Array of shape (Number of Players, len(player_idx)), the covariance of every player with each of the
+            given players
+        """
+        player_idx = np.asarray(player_idx, dtype=np.int64)
+        columns = np.zeros((self.n_players, len(player_idx)))
+
+        free = self.free_position[player_idx] >= 0
+        rhs = np.zeros((len(self.free_idx), free.sum()))
+        rhs[self.free_position[player_idx[free]], np.arange(free.sum())] = 1.0
+        if rhs.shape[1] > 0:
+            columns[np.ix_(self.free_idx, np.flatnonzero(free))] = self.factor.solve(rhs)
+
+        return columns
+
+    def variances(self):
+        """
+        The variance of every player's rating, the diagonal of the covariance matrix, solved block by block
+
+        Returns
+        -------
+        variances : np.Array
+            The variance of each player's rating, zero for pinned players
+        """
+        variances = np.zeros(self.n_players)
+        for start in range(0, self.n_players, SOLVE_BLOCK_SIZE):
+            block_idx = np.arange(start, min(start + SOLVE_BLOCK_SIZE, self.n_players))
+            variances[block_idx] = self.columns(block_idx)[block_idx, np.arange(len(block_idx))]
+
+        return variances
+
+    def pair_covariances(self, p1_idx, p2_idx):
+        """
+        The variances of the ratings of pairs of players and the covariance between them
+
+        Parameters
+        ----------
+        p1_idx : np.Array
+            The index of player one of each pair
+        p2_idx : np.Array
+            The index of player two of each pair
+
+        Returns
+        -------
+        p1_variances : np.Array
+            The variance of the rating of player one of each pair
+        p2_variances : np.Array
+            The variance of the rating of player two of each pair
+        covariances : np.Array
+            The covariance of the ratings of each pair
+        """
+        p1_idx = np.asarray(p1_idx, dtype=np.int64)
+        p2_idx = np.asarray(p2_idx, dtype=np.int64)
+
+        p1_variances, p2_variances, covariances = np.zeros((3, len(p1_idx)))
+        for start in range(0, len(p1_idx), SOLVE_BLOCK_SIZE):
+            block = slice(start, start + SOLVE_BLOCK_SIZE)
+            # covariance of every player with the player one and player two of each pair in the block
+            p1_columns = self.columns(p1_idx[block])
+            p2_columns = self.columns(p2_idx[block])
+            pair = np.arange(p1_columns.shape[1])
+            p1_variances[block] = p1_columns[p1_idx[block], pair]
+            p2_variances[block] = p2_columns[p2_idx[block], pair]
+            covariances[block] = p1_columns[p2_idx[block], pair]
+
+        return p1_variances, p2_variances, covariances
+
+    def difference_variances(self, p1_idx, p2_idx):
+        """
+        The variance of the rating difference of pairs of players, var(x1) + var(x2) - 2 cov(x1, x2)
+
+        Parameters
+        ----------
+        p1_idx : np.Array
+            The index of player one of each pair
+        p2_idx : np.Array
+            The index of player two of each pair
+
+        Returns
+        -------
+        difference_variances : np.Array
+            The variance of the rating difference of each pair
+        """
+        p1_variances, p2_variances, covariances = self.pair_covariances(p1_idx, p2_idx)
+
+        return p1_variances + p2_variances - 2 * covariances
@@ -0,0 +1,22 @@
+import pandas as pd
+
+import database_engine
+from database_engine.engine_config import get_engine, set_engine
+
+
+def test_raw_writes_invalidate_the_cached_table(tmp_path, monkeypatch):
+    monkeypatch.setenv('SNOOKER_DATABASE_CACHE_DIRECTORY', str(tmp_path / 'cache'))
+    monkeypatch.setenv('SNOOKER_DATABASE_CACHE_MAX_AGE', '3600')
+    set_engine(f'sqlite:///{tmp_path / "snooker.db"}')
+    pd.DataFrame({'round': 'Final', 'player_one_frames': 1},
+                 index=pd.Index(range(1, 6), name='game_id')).to_sql('raw_game', get_engine())
+    assert len(database_engine.read_raw_game()) == 5
+
+    get_engine().execute('DELETE FROM raw_game WHERE game_id = 1')
+    assert len(database_engine.read_raw_game()) == 4
+
+    with get_engine().connect() as connection:
+        transaction = connection.begin()
+        connection.exec_driver_sql('DELETE FROM raw_game')
+        transaction.rollback()
+    assert len(database_engine.read_raw_game()) == 4
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from model.evaluation import evaluate_ratings
+
+
+def make_game_df(best_of):
+    return pd.DataFrame({'date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+                         'player_one_id': [1, 2, 1],
+                         'player_two_id': [2, 3, 3],
+                         'player_one_frames': [4, 5, 3],
+                         'player_two_frames': [2, 4, 4],
+                         'best_of': best_of},
+                        index=pd.Index([10, 11, 12], name='game_id'))
+
+
+def test_unknown_format_scored_as_played_to_the_winning_score():
+    rating = pd.Series([0.8, 0.5, 0.3], index=pd.Index([1, 2, 3], name='player_id'))
+
+    known = evaluate_ratings(rating, make_game_df([7, 9, 7]))['summary']
+    zero_best_of = evaluate_ratings(rating, make_game_df([7, 9, 0]))['summary']
+    null_best_of = evaluate_ratings(rating, make_game_df([7, 9, np.nan]))['summary']
+
+    pd.testing.assert_series_equal(zero_best_of, known)
+    pd.testing.assert_series_equal(null_best_of, known)
+    assert zero_best_of['match_log_loss'] < 1
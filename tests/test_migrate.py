@@ -0,0 +1,20 @@
+import sqlalchemy
+
+import database_engine
+from database_engine.engine_config import get_engine, set_engine
+
+
+def test_migrate_adds_rating_variance_before_indexing_it(tmp_path, monkeypatch):
+    monkeypatch.setenv('SNOOKER_DATABASE_CACHE_DIRECTORY', '')
+    set_engine(f'sqlite:///{tmp_path / "snooker.db"}')
+    with get_engine().begin() as connection:
+        # the rating table as it was before the rating variances were stored
+        connection.exec_driver_sql('CREATE TABLE rating (player_id INTEGER PRIMARY KEY, rating FLOAT)')
+        connection.exec_driver_sql('INSERT INTO rating VALUES (1, 0.5)')
+
+    database_engine.migrate()
+
+    inspector = sqlalchemy.inspect(get_engine())
+    assert 'rating_variance' in [column['name'] for column in inspector.get_columns('rating')]
+    assert 'ix_rating_player' in [index['name'] for index in inspector.get_indexes('rating')]
+    assert database_engine.read_rating(fresh=True).loc[1, 'rating'] == 0.5
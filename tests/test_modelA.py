@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from scipy.special import comb, log_expit
+
+from model import ModelA
+from model.training_store import TrainingStore
+
+
+def make_games(n_players=60, n_games=3000, seed=0):
+    """
+    Simulates frame by frame the games of players with random strengths, over the five years before 2024
+    """
+    rng = np.random.default_rng(seed)
+    strength = rng.normal(0.0, 0.7, n_players)
+
+    p1_idx = rng.integers(0, n_players, n_games)
+    p2_idx = rng.integers(0, n_players - 1, n_games)
+    p2_idx = np.where(p2_idx >= p1_idx, p2_idx + 1, p2_idx)
+    best_of = rng.choice([7, 9, 11, 19], n_games)
+    p1_frame_win_prob = 1 / (1 + np.exp(-(strength[p1_idx] - strength[p2_idx])))
+
+    p1_frames = np.zeros(n_games, dtype=np.int64)
+    p2_frames = np.zeros(n_games, dtype=np.int64)
+    for game in range(n_games):
+        while max(p1_frames[game], p2_frames[game]) <= best_of[game] // 2:
+            if rng.random() < p1_frame_win_prob[game]:
+                p1_frames[game] += 1
+            else:
+                p2_frames[game] += 1
+
+    player_ids = np.arange(100, 100 + n_players)
+    game_df = pd.DataFrame({'date': pd.Timestamp('2024-01-01') - pd.to_timedelta(rng.integers(0, 1800, n_games), unit='D'),
+                            'player_one_id': player_ids[p1_idx],
+                            'player_two_id': player_ids[p2_idx],
+                            'player_one_frames': p1_frames,
+                            'player_two_frames': p2_frames,
+                            'best_of': best_of.astype(np.float64)},
+                           index=pd.Index(np.arange(1, n_games + 1), name='game_id'))
+    player_df = pd.DataFrame({'total_games': 1}, index=pd.Index(player_ids, name='player_id'))
+
+    return game_df, player_df
+
+
+def fitted_model(game_df, player_df, fit, **fit_kwargs):
+    model = ModelA(game_df, player_df, as_of='2024-01-01')
+    model.ratings_path = None
+    model.reference_players = [player_df.index[0]]
+    getattr(model, fit)(callback=lambda *args: False, **fit_kwargs)
+    return model
+
+
+def test_minibatch_fit_matches_full_batch_fit():
+    game_df, player_df = make_games()
+
+    full_batch = fitted_model(game_df, player_df, 'fit_model', iterations=20_000, lr=0.05)
+    minibatch = fitted_model(game_df, player_df, 'fit_model_minibatch', epochs=50, batch_size=256, seed=0)
+
+    assert minibatch.converged
+    deviation = (minibatch.optimised_ratings['rating'] - full_batch.optimised_ratings['rating']).abs().max()
+    assert deviation < 1e-3
+    assert abs(minibatch.final_LL - full_batch.final_LL) < 1e-5 * abs(full_batch.final_LL)
+    np.testing.assert_allclose(minibatch.optimised_ratings['rating_variance'],
+                               full_batch.optimised_ratings['rating_variance'], rtol=1e-2, atol=1e-6)
+
+
+def test_minibatch_fit_streams_from_training_store(tmp_path):
+    game_df, player_df = make_games(n_players=20, n_games=500)
+    training_store = TrainingStore(str(tmp_path))
+    training_store.append(game_df)
+    player_df, game_df = training_store.training_set(last_played_filter='2000-01-01',
+                                                     game_date_filter='2000-01-01',
+                                                     minimum_games_filter=1)
+
+    from_store = fitted_model(game_df, player_df, 'fit_model_minibatch', epochs=50, batch_size=64, seed=0,
+                              training_store=training_store)
+    from_frame = fitted_model(game_df, player_df, 'fit_model_minibatch', epochs=50, batch_size=64, seed=0)
+
+    np.testing.assert_allclose(from_store.optimised_ratings['rating'], from_frame.optimised_ratings['rating'])
+
+
+def make_two_components():
+    """
+    Simulates the games of a main component of 30 players and a minor component of 8 players that never meet
+    """
+    game_df, player_df = make_games(n_players=30, n_games=1000)
+    minor_game_df, minor_player_df = make_games(n_players=8, n_games=100, seed=1)
+    minor_game_df.index += 10_000
+    minor_game_df[['player_one_id', 'player_two_id']] += 1_000
+    minor_player_df.index += 1_000
+
+    return (game_df, player_df), (minor_game_df, minor_player_df)
+
+
+def test_fit_components_keeps_rating_covariance():
+    (game_df, player_df), (minor_game_df, minor_player_df) = make_two_components()
+
+    model = ModelA(pd.concat([game_df, minor_game_df]), pd.concat([player_df, minor_player_df]), as_of='2024-01-01')
+    model.ratings_path = None
+    model.fit_components(processes=1, iterations=20_000, lr=0.05, callback=lambda *args: False)
+
+    assert len(model.reference_players) == 2
+    main_variances = model.optimised_ratings['rating_variance']
+    np.testing.assert_allclose(model.rating_covariance.variances()[model.player_data.index.get_indexer(main_variances.index)],
+                               main_variances, rtol=1e-6)
+    assert (model.rating_difference_variance([101, 102], [103, 104]) > 0).all()
+
+
+def test_fit_components_matches_a_fit_of_each_component():
+    components = make_two_components()
+    # the minor component comes first, so the main component is not simply the first one found
+    game_df = pd.concat([components[1][0], components[0][0]])
+    player_df = pd.concat([components[1][1], components[0][1]])
+
+    model = ModelA(game_df, player_df, as_of='2024-01-01')
+    model.ratings_path = None
+    fit_kwargs = {'iterations': 20_000, 'lr': 0.05, 'callback': lambda *args: False}
+    model.fit_components(processes=1, **fit_kwargs)
+    first_ratings = model.component_ratings.copy()
+    # the transforms rebuild match_data from the games, so a second fit on the same instance is the same
+    model.fit_components(processes=1, **fit_kwargs)
+    pd.testing.assert_frame_equal(model.component_ratings, first_ratings)
+
+    main_ids, minor_ids = components[0][1].index, components[1][1].index
+    assert model.optimised_ratings.index.sort_values().equals(main_ids)
+    assert model.unidentifiable_players.sort_values().equals(minor_ids)
+
+    for component_game_df, component_player_df in components:
+        direct = ModelA(component_game_df, component_player_df, as_of='2024-01-01')
+        direct.ratings_path = None
+        direct.reference_players = [reference_id for reference_id in model.reference_players
+                                    if reference_id in component_player_df.index]
+        direct.fit_model(**fit_kwargs)
+
+        component_ratings = model.component_ratings.loc[component_player_df.index, 'rating']
+        direct_ratings = direct.optimised_ratings.loc[component_player_df.index, 'rating']
+        np.testing.assert_allclose(component_ratings, direct_ratings, atol=1e-6)
+
+
+def test_aggregated_pair_loss_matches_per_game_loss():
+    game_df, player_df = make_games(n_players=6, n_games=200, seed=2)
+    model = ModelA(game_df, player_df, decay_factor=1 / 365, l2_prior=0.1, as_of='2024-01-01')
+    data_constants = model.apply_model_transforms(NegBin=True)
+    # several games per pair, played either way round, are collapsed into each pair
+    assert len(model.pair_data) < len(game_df)
+
+    strength = np.random.default_rng(0).normal(0.5, 0.5, len(player_df))
+    pair_loss = float(model.loss(strength.astype(np.float32), data_constants))
+
+    p1_strength = strength[player_df.index.get_indexer(game_df['player_one_id'])]
+    p2_strength = strength[player_df.index.get_indexer(game_df['player_two_id'])]
+    p1_frames = game_df['player_one_frames'].to_numpy(dtype=np.float64)
+    p2_frames = game_df['player_two_frames'].to_numpy(dtype=np.float64)
+    time_decay = np.exp((game_df['date'] - pd.Timestamp('2024-01-01')).dt.days.to_numpy() / 365)
+    # the negative binomial offset of update_nCr_col, which is 1 for a whitewash of player one
+    log_nCr = np.log(comb(np.maximum(p1_frames + p2_frames - 1, 0), np.maximum(p1_frames - 1, 0)))
+    game_LL = time_decay * (log_nCr + p1_frames * log_expit(p1_strength - p2_strength)
+                            + p2_frames * log_expit(p2_strength - p1_strength))
+    game_loss = -game_LL.sum() + 0.5 * 0.1 * ((strength - 0.5) ** 2).sum()
+
+    np.testing.assert_allclose(pair_loss, game_loss, rtol=1e-5)
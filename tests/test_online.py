@@ -0,0 +1,16 @@
+import pandas as pd
+
+from model import OnlineRatingUpdater
+
+
+def test_pinned_reference_player_moves_after_a_game():
+    # the reference player of a fit has a rating variance of 0, relative to itself
+    rating_df = pd.DataFrame({'rating': [0.0, 0.2], 'rating_variance': [0.0, 0.004]},
+                             index=pd.Index([1, 2], name='player_id'))
+    updater = OnlineRatingUpdater(rating_df, last_game_id=0)
+
+    updater.update_game(1, 2, 6, 0)
+
+    assert updater.ratings[1] > 0.0
+    assert updater.variances[1] > 0.0
+    assert updater.ratings[2] < 0.2
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from database_engine.transformers.cuetracker.player_transform import reindex_transform
+
+
+def test_refreshed_players_keep_their_player_ids():
+    existing_player_df = pd.DataFrame({'first_name': ['Ronnie', 'Judd'],
+                                       'last_name': ['O\'Sullivan', 'Trump'],
+                                       'url': ['/players/ronnie', '/players/judd']},
+                                      index=pd.Index([0, 1], name='player_id'))
+    player_df = pd.DataFrame({'first_name': ['Judd', 'Mark', 'Ronnie'],
+                              'last_name': ['Trump', 'Allen', 'O\'Sullivan'],
+                              'url': ['/players/judd', '/players/mark', '/players/ronnie']})
+
+    refreshed_player_df = reindex_transform(player_df, existing_player_df)
+
+    assert refreshed_player_df.set_index('url').index.tolist() == ['/players/mark', '/players/ronnie', '/players/judd']
+    assert refreshed_player_df.index.tolist() == [2, 0, 1]
+    assert reindex_transform(player_df).index.tolist() == [0, 1, 2]
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from model.training_store import TrainingStore
+
+
+def make_game_df(game_ids, dates, played):
+    n_games = len(game_ids)
+    return pd.DataFrame({'date': pd.to_datetime(dates),
+                         'player_one_id': np.arange(n_games) + 1,
+                         'player_two_id': np.arange(n_games) + 2,
+                         'player_one_frames': np.where(played, 4, np.nan),
+                         'player_two_frames': np.where(played, 2, np.nan),
+                         'best_of': 7.0},
+                        index=pd.Index(game_ids, name='game_id'))
+
+
+def test_watermark_passes_games_unplayed_before_the_cutoff(tmp_path):
+    training_store = TrainingStore(str(tmp_path))
+    game_df = make_game_df([1, 2, 3, 4, 5],
+                           ['2023-01-01', '2023-01-02', '2023-01-03', '2023-03-01', '2023-03-02'],
+                           [True, False, True, False, True])
+
+    assert training_store.append(game_df, unplayed_cutoff='2023-02-01') == 3
+    # game 2 was never played, game 4 may still be
+    assert training_store.watermark_game_id == 3
+
+    game_df.loc[4, ['player_one_frames', 'player_two_frames']] = [4, 3]
+    assert training_store.append(game_df.loc[4:], unplayed_cutoff='2023-02-01') == 1
+    assert training_store.watermark_game_id == 5
+
+
+def test_store_is_emptied_when_the_player_ids_change(tmp_path):
+    game_df = make_game_df([1, 2], ['2023-01-01', '2023-01-02'], [True, True])
+    player_url = pd.Series([f'/players/{player_id}' for player_id in range(1, 4)], index=range(1, 4))
+    training_store = TrainingStore(str(tmp_path), player_url=player_url)
+    training_store.append(game_df)
+
+    # a new player does not change the players of the store
+    player_url[4] = '/players/4'
+    assert TrainingStore(str(tmp_path), player_url=player_url).n_games == 2
+
+    player_url[2] = '/players/5'
+    training_store = TrainingStore(str(tmp_path), player_url=player_url)
+    assert (training_store.n_games, len(training_store.player_ids), training_store.watermark_game_id) == (0, 0, 0)
+    training_store.append(game_df.assign(player_one_id=[4, 1]))
+    assert list(training_store.player_ids) == [4, 1, 2, 3]
+    assert TrainingStore(str(tmp_path), player_url=player_url).n_games == 2
+
+
+def test_store_is_emptied_when_the_games_are_renumbered(tmp_path, monkeypatch):
+    import database_engine
+    from database_engine.engine_config import get_engine, set_engine
+
+    monkeypatch.setenv('SNOOKER_DATABASE_CACHE_DIRECTORY', '')
+    set_engine(f'sqlite:///{tmp_path / "snooker.db"}')
+    game_df = make_game_df([1, 2, 3, 4], ['2023-01-01', '2023-01-02', '2023-01-03', '2023-01-04'],
+                           [True, False, True, True])
+    # the frames are integer columns of the game table
+    game_df = game_df.astype({'player_one_frames': 'Int8', 'player_two_frames': 'Int8'})
+    game_df.to_sql('game', get_engine())
+
+    training_store = TrainingStore(str(tmp_path / 'store'))
+    training_store.append(database_engine.read_game_after(0), unplayed_cutoff='2022-01-01')
+    assert training_store.watermark_game_id == 1
+    assert training_store.check_games(database_engine.get_played_game_summary(training_store.watermark_game_id))
+
+    training_store.append(database_engine.read_game_after(0), unplayed_cutoff='2023-02-01')
+    assert training_store.watermark_game_id == 4
+    assert training_store.check_games(database_engine.get_played_game_summary(training_store.watermark_game_id))
+
+    # a raw refresh numbers the games from 0, so every game ID is given to another game
+    game_df.index -= 1
+    game_df.to_sql('game', get_engine(), if_exists='replace')
+    assert not training_store.check_games(database_engine.get_played_game_summary(training_store.watermark_game_id))
+    assert (training_store.n_games, training_store.watermark_game_id) == (0, 0)
+
+    training_store.append(database_engine.read_game_after(-1), unplayed_cutoff='2023-02-01')
+    assert list(training_store.arrays['game_id']) == [0, 2, 3]
+    assert training_store.check_games(database_engine.get_played_game_summary(training_store.watermark_game_id))
@@ -0,0 +1,18 @@
+import pandas as pd
+
+from database_engine.engine_config import get_engine, set_engine
+from database_engine.write import append_to_database, write_rows
+
+
+def test_upserting_existing_keys_updates_the_rows(tmp_path, monkeypatch):
+    monkeypatch.setenv('SNOOKER_DATABASE_CACHE_DIRECTORY', '')
+    set_engine(f'sqlite:///{tmp_path / "snooker.db"}')
+    get_engine().execute('CREATE TABLE rating (player_id INTEGER PRIMARY KEY, rating FLOAT)')
+    write_rows(pd.DataFrame({'rating': [0.1, 0.2, 0.3]}, index=pd.Index([1, 2, 3], name='player_id')), 'rating')
+
+    write_rows(pd.DataFrame({'rating': [0.4, 0.5]}, index=pd.Index([2, 4], name='player_id')), 'rating', upsert=True)
+    append_to_database(pd.DataFrame({'rating': [0.6]}, index=pd.Index([3], name='player_id')), 'rating')
+
+    rating_df = pd.read_sql('SELECT * FROM rating ORDER BY player_id', get_engine(), index_col='player_id')
+    assert rating_df.index.tolist() == [1, 2, 3, 4]
+    assert rating_df['rating'].tolist() == [0.1, 0.4, 0.6, 0.5]